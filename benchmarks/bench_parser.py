@@ -0,0 +1,174 @@
+"""Benchmark of MoinParser and formatter throughput on synthetic pages.
+
+Usage:
+    python benchmarks/bench_parser.py [--lines N] [--repeat N] [--kinds KIND ...] [--format]
+        [PAGE_FILE ...]
+
+Without PAGE_FILE, synthetic pages of N lines are generated for each kind of content
+(prose, code-heavy, tables and lists), since the cost of parsing depends on the markup.
+Give pages of a real wiki (e.g. data/pages/*/revisions/*) to see how many lines are plain
+text which skip scanning markups.
+"""
+
+import argparse
+import time
+from typing import Any
+from unittest.mock import patch
+
+from moin2hugo.formatter import HugoFormatter
+from moin2x.moin_parser import MoinParser
+
+PROSE = """\
+== Section %(i)d ==
+This is a '''paragraph''' with ''some'' markup, a link to OtherPage and [[Some Page|a link]].
+It also has `inline code`, a URL https://example.com/%(i)d and plain text without markup.
+Most lines of a wiki are prose like this one, which has no markup in it at all.
+
+"""
+
+CODE = """\
+Example %(i)d:
+{{{#!python
+def func_%(i)d(x):
+    # comment with '''quotes''' and [[brackets]] which are not markup
+    if x > %(i)d:
+        return x * %(i)d
+    return {"key": [x, x + 1], "other": {"nested": x}}
+}}}
+{{{{
+nested {{{ preformatted }}} text %(i)d
+}}}}
+
+"""
+
+TABLE = """\
+||<tablewidth="100%%">'''Name'''||'''Value %(i)d'''||
+||foo||bar %(i)d||
+||<-2> spanned cell with OtherPage||
+
+"""
+
+LIST = """\
+ * item %(i)d
+  * nested item with ''emphasis''
+ 1. numbered item
+ term:: definition %(i)d
+
+"""
+
+KINDS = {"prose": PROSE, "code": CODE, "table": TABLE, "list": LIST}
+
+
+def generate_page(template: str, num_lines: int) -> str:
+    lines: list[str] = []
+    i = 0
+    while len(lines) < num_lines:
+        lines.extend((template % {"i": i}).splitlines(keepends=True))
+        i += 1
+    return "".join(lines[:num_lines])
+
+
+def count_matches(text: str) -> int:
+    """Count markups matched and processed by the parser."""
+    matches = 0
+    process_markup = MoinParser._process_markup  # type: ignore
+
+    def counter(self: MoinParser, match: Any):
+        nonlocal matches
+        matches += 1
+        process_markup(self, match)
+
+    with patch.object(MoinParser, "_process_markup", counter):
+        MoinParser.parse(text, "BenchPage")
+    return matches
+
+
+def count_plain_lines(text: str) -> int:
+    """Count lines parsed as plain text without scanning markups."""
+    plain_lines = 0
+    plain_text = MoinParser._plain_text  # type: ignore
+    parse_line = MoinParser._parse_line  # type: ignore
+    in_parse_line = False
+
+    def parse_line_counter(self: MoinParser, line: str):
+        nonlocal in_parse_line
+        in_parse_line = True
+        try:
+            parse_line(self, line)
+        finally:
+            in_parse_line = False
+
+    def plain_text_counter(self: MoinParser, text: str):
+        nonlocal plain_lines
+        if not in_parse_line:
+            plain_lines += 1
+        plain_text(self, text)
+
+    with patch.object(MoinParser, "_parse_line", parse_line_counter), patch.object(
+        MoinParser, "_plain_text", plain_text_counter
+    ):
+        MoinParser.parse(text, "BenchPage")
+    return plain_lines
+
+
+def bench(text: str, repeat: int, format: bool) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        page = MoinParser.parse(text, "BenchPage")
+        if format:
+            HugoFormatter.format(page, pagename="BenchPage")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("page_files", nargs="*")
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--kinds", nargs="+", choices=list(KINDS), default=list(KINDS))
+    parser.add_argument("--format", action="store_true", help="format parsed pages too")
+    args = parser.parse_args()
+
+    pages: dict[str, str] = {}
+    for page_file in args.page_files:
+        with open(page_file, "r") as f:
+            pages[page_file] = f.read()
+    if not pages:
+        for kind in args.kinds:
+            pages[kind] = generate_page(KINDS[kind], args.lines)
+
+    print(
+        "%-20s %8s %8s %8s %10s %12s %12s"
+        % ("page", "lines", "plain", "matches", "best", "lines/sec", "matches/sec")
+    )
+    total_lines = total_plain_lines = 0
+    for name, text in pages.items():
+        num_lines = len(text.splitlines())
+        plain_lines = count_plain_lines(text)
+        matches = count_matches(text)
+        elapsed = bench(text, args.repeat, args.format)
+        print(
+            "%-20s %8d %7.1f%% %8d %9.3fs %12.1f %12.1f"
+            % (
+                name,
+                num_lines,
+                plain_lines / max(num_lines, 1) * 100,
+                matches,
+                elapsed,
+                num_lines / elapsed,
+                matches / elapsed,
+            )
+        )
+        total_lines += num_lines
+        total_plain_lines += plain_lines
+    if len(pages) > 1:
+        print(
+            "%-20s %8d %7.1f%%"
+            % ("total", total_lines, total_plain_lines / max(total_lines, 1) * 100)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark of MoinSiteScanner throughput against the number of scan workers.
+
+Usage:
+    python benchmarks/bench_site_scanner.py [--pages N] [--latency-ms MS] [PAGE_DIR]
+
+Without PAGE_DIR, a synthetic wiki having N pages is generated in a temporary directory.
+`--latency-ms` adds a delay to each file operation of the scanner to emulate a network
+filesystem such as NFS.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+from typing import Any, Callable
+from unittest.mock import patch
+
+import moin2x.moin_site_scanner
+from moin2x.moin_site_scanner import MoinSiteScanner
+
+
+def generate_site(page_dir: str, num_pages: int):
+    for i in range(num_pages):
+        pagedir = os.path.join(page_dir, "Page%05d(2f)Sub" % i)
+        os.makedirs(os.path.join(pagedir, "revisions"))
+        with open(os.path.join(pagedir, "current"), "w") as f:
+            f.write("00000002\n")
+        with open(os.path.join(pagedir, "revisions", "00000002"), "w") as f:
+            f.write("= Page %d =\n" % i)
+        with open(os.path.join(pagedir, "edit-log"), "w") as f:
+            for rev in range(1, 3):
+                f.write(
+                    "%d\t%08d\tSAVE\tPage%05d\t192.0.2.1\t192.0.2.1\t1.2.3\t\t\n"
+                    % (1558498577699187 + rev, rev, i)
+                )
+        if i % 10 == 0:
+            os.makedirs(os.path.join(pagedir, "attachments"))
+            with open(os.path.join(pagedir, "attachments", "image.png"), "wb") as f:
+                f.write(b"\x89PNG")
+
+
+def with_latency(func: Callable[..., Any], latency: float) -> Callable[..., Any]:
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        time.sleep(latency)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def bench(page_dir: str, workers: int, latency: float) -> tuple[int, float]:
+    scanner = MoinSiteScanner(page_dir, workers=workers)
+    with ExitStack() as stack:
+        if latency > 0:
+            module = moin2x.moin_site_scanner
+            stack.enter_context(
+                patch.object(
+                    module, "read_last_line", with_latency(module.read_last_line, latency)
+                )
+            )
+            stack.enter_context(
+                patch.object(module, "open", with_latency(open, latency), create=True)
+            )
+            stack.enter_context(
+                patch.object(module.os.path, "isfile", with_latency(os.path.isfile, latency))
+            )
+            stack.enter_context(
+                patch.object(module.os.path, "isdir", with_latency(os.path.isdir, latency))
+            )
+        start = time.perf_counter()
+        num_pages = sum(1 for _ in scanner.scan_pages())
+        elapsed = time.perf_counter() - start
+    return num_pages, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("page_dir", nargs="?", default=None)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        page_dir = args.page_dir
+        if page_dir is None:
+            page_dir = tmpdir
+            generate_site(page_dir, args.pages)
+
+        latency = args.latency_ms / 1000
+        print("page_dir=%s latency=%.1fms" % (page_dir, args.latency_ms))
+        print("%8s %8s %10s %12s" % ("workers", "pages", "elapsed", "pages/sec"))
+        for workers in args.workers:
+            num_pages, elapsed = bench(page_dir, workers, latency)
+            print("%8d %8d %9.2fs %12.1f" % (workers, num_pages, elapsed, num_pages / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import logging
 import os
-import shutil
 from datetime import datetime
+from functools import partial
 from typing import Literal, Optional, assert_never
 
 import attr
@@ -10,9 +10,16 @@ import jinja2
 from moin2hugo.config import Config
 from moin2hugo.formatter import HugoFormatter
 from moin2hugo.path_builder import HugoPathBuilder
+from moin2x.attachment_store import AttachmentStore
+from moin2x.formatter.base import BlockCache
 from moin2x.moin2x import Moin2XConverter
 from moin2x.moin_parser import MoinParser
-from moin2x.moin_site_scanner import MoinAttachment, MoinPageInfo, MoinSiteScanner
+from moin2x.moin_site_scanner import MoinAttachment, MoinPageInfo
+from moin2x.page_tree import Codeblock, PageRoot
+from moin2x.revision_cache import RevisionCache
+from moin2x.sink import DirectorySink, OutputSink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import MoinSource, open_source
 from moin2x.utils import safe_path_join
 
 logger = logging.getLogger(__name__)
@@ -30,19 +37,43 @@ class HugoPageInfo:
 
 PAGE_TYPE = Literal[1] | Literal[2]
 
+# leaf bundle holding the attachment store (see AttachmentStore)
+STORE_INDEX = """---
+_build:
+  render: never
+  list: never
+  publishResources: true
+---
+"""
+
 
 class Moin2Hugo(Moin2XConverter, object):
     BRANCH_BUNDLE = 1
     LEAF_BUNDLE = 2
 
-    def __init__(self, src_dir: str, dst_dir: str, config: Optional[Config] = None):
+    def __init__(
+        self,
+        src_dir: str | MoinSource,
+        dst_dir: str | OutputSink,
+        config: Optional[Config] = None,
+        site_index: Optional[MoinSiteIndex] = None,
+        attachment_store: Optional[AttachmentStore] = None,
+    ):
         if config is not None:
             self.config = config
         else:
             self.config = Config()
         self.src_dir = src_dir
-        self.dst_dir = dst_dir
+        if isinstance(dst_dir, OutputSink):
+            self.sink = dst_dir
+        else:
+            self.sink = DirectorySink(dst_dir)
+        self.dst_dir = self.sink.root
+        self.attachment_store = attachment_store
+        self._site_index = site_index
+        self._source: Optional[MoinSource] = None
         self._hugo_site_structure: Optional[dict[str, PAGE_TYPE]] = None
+        self._hugo_bundle_pages: dict[str, str] = {}
 
         self.path_builder = HugoPathBuilder(
             page_front_page=self.config.moin_site_config.page_front_page,
@@ -50,6 +81,7 @@ class Moin2Hugo(Moin2XConverter, object):
             disable_path_to_lower=self.config.hugo_config.disable_path_to_lower,
             remove_path_accents=self.config.hugo_config.remove_path_accents,
         )
+        self.path_builder.attachment_store = attachment_store
 
         if self.config.template_file:
             tmpl_dir, tmpl_file = os.path.split(self.config.template_file)
@@ -60,18 +92,39 @@ class Moin2Hugo(Moin2XConverter, object):
 
         self.page_tmpl = env.get_template(tmpl_file)
 
+    def __reduce__(self):
+        # rebuild template and path builder on unpickling (e.g. in worker processes)
+        return (
+            self.__class__,
+            (self.src_dir, self.sink, self.config, self._site_index, self.attachment_store),
+        )
+
+    @property
+    def source(self) -> MoinSource:
+        if self._source is None:
+            if isinstance(self.src_dir, MoinSource):
+                self._source = self.src_dir
+            else:
+                self._source = open_source(self.src_dir)
+        return self._source
+
+    @property
+    def site_index(self) -> MoinSiteIndex:
+        if self._site_index is None:
+            self._site_index = MoinSiteIndex.scan(self.source)
+        return self._site_index
+
     @property
     def hugo_site_structure(self) -> dict[str, PAGE_TYPE]:
         if self._hugo_site_structure is not None:
             return self._hugo_site_structure
 
         self._hugo_site_structure = {}
-        moin_site_scanner = MoinSiteScanner(self.src_dir)
-        for page in moin_site_scanner.scan_pages():
+        self._hugo_bundle_pages = {}
+        for page in self.site_index:
             hugo_bundle_path = self.path_builder.page_filepath(page.name)
-            elems = hugo_bundle_path.split("/")
-            for i in range(len(elems) - 1):
-                branch_path = "/".join(elems[: i + 1])
+            self._hugo_bundle_pages[hugo_bundle_path] = page.name
+            for branch_path in self._ancestor_bundle_paths(hugo_bundle_path):
                 self._hugo_site_structure[branch_path] = self.BRANCH_BUNDLE
             if hugo_bundle_path not in self._hugo_site_structure:
                 self._hugo_site_structure[hugo_bundle_path] = self.LEAF_BUNDLE
@@ -81,42 +134,129 @@ class Moin2Hugo(Moin2XConverter, object):
             self._hugo_site_structure[""] = self.BRANCH_BUNDLE
         return self._hugo_site_structure
 
+    @staticmethod
+    def _ancestor_bundle_paths(hugo_bundle_path: str) -> list[str]:
+        elems = hugo_bundle_path.split("/")
+        return ["/".join(elems[: i + 1]) for i in range(len(elems) - 1)]
+
+    def update_site(self, site_index: MoinSiteIndex, pagenames: set[str]) -> set[str]:
+        """Follow added, modified or removed pages without scanning whole site again.
+
+        Returns other pages whose bundle type (leaf or branch) is changed by them.
+        """
+        structure = self.hugo_site_structure  # built from the previous site index
+        self._site_index = site_index
+
+        old_types: dict[str, Optional[PAGE_TYPE]] = {}
+        for pagename in pagenames:
+            hugo_bundle_path = self.path_builder.page_filepath(pagename)
+            paths = [hugo_bundle_path] + self._ancestor_bundle_paths(hugo_bundle_path)
+            for path in paths:
+                old_types.setdefault(path, structure.get(path))
+            if pagename in site_index:
+                self._hugo_bundle_pages[hugo_bundle_path] = pagename
+            elif self._hugo_bundle_pages.get(hugo_bundle_path) == pagename:
+                del self._hugo_bundle_pages[hugo_bundle_path]
+
+        # decide bundle types from deeper paths
+        for path in sorted(old_types, key=lambda p: p.count("/"), reverse=True):
+            prefix = path + "/"
+            if path == "" and path in self._hugo_bundle_pages:
+                # top page is always branch bundle
+                structure[path] = self.BRANCH_BUNDLE
+            elif path != "" and any(key.startswith(prefix) for key in structure):
+                structure[path] = self.BRANCH_BUNDLE
+            elif path in self._hugo_bundle_pages:
+                structure[path] = self.LEAF_BUNDLE
+            else:
+                structure.pop(path, None)
+
+        affected: set[str] = set()
+        for path, old_type in old_types.items():
+            pagename = self._hugo_bundle_pages.get(path)
+            if pagename is None or pagename in pagenames:
+                continue
+            if structure.get(path) != old_type:
+                logger.info("++ bundle type changed: %s" % pagename)
+                affected.add(pagename)
+        return affected
+
     def render_page(self, page: HugoPageInfo, content: str) -> str:
         ret = self.page_tmpl.render(page=page, content=content)
         return ret
 
-    def convert_page(self, page: MoinPageInfo):
+    def page_output_path(self, pagename: str) -> str:
+        hugo_bundle_path = self.path_builder.page_filepath(pagename)
+        match self.hugo_site_structure[hugo_bundle_path]:
+            case self.LEAF_BUNDLE:
+                return safe_path_join(hugo_bundle_path, "index.md")
+            case self.BRANCH_BUNDLE:
+                return safe_path_join(hugo_bundle_path, "_index.md")
+            case _ as unreachable:  # type: ignore
+                assert_never(unreachable)
+
+    def _in_attachment_store(self, pagename: str, filename: str) -> bool:
+        if self.attachment_store is None:
+            return False
+        return self.attachment_store.filepath(pagename, filename) is not None
+
+    def convert_attachment_store(self) -> list[str]:
+        if self.attachment_store is None:
+            return []
+        outputs = self.attachment_store.write(self.sink, self.source)
+        # publish files in the store without rendering the bundle page itself
+        index_path = safe_path_join(self.attachment_store.store_dir, "index.md")
+        self.sink.write_text(index_path, STORE_INDEX)
+        outputs.append(index_path)
+        return outputs
+
+    def convert_page(self, page: MoinPageInfo) -> list[str]:
         logger.debug("++ filepath: %s" % page.filepath)
-        with open(page.filepath, "r") as f:
-            content = f.read()
+        content = self.source.read_text(page.filepath)
+        return self._write_page(page, self._convert_content(page.name, content))
+
+    def convert_revision(self, page: MoinPageInfo, cache: RevisionCache) -> list[str]:
+        logger.debug("++ filepath: %s" % page.filepath)
+        content = self.source.read_text(page.filepath)
+        converted = cache.convert(page.name, content, partial(self._convert_content, page.name))
+        return self._write_page(page, converted)
+
+    def _convert_content(
+        self, pagename: str, content: str, block_cache: Optional[BlockCache] = None
+    ) -> str:
         page_obj = MoinParser.parse(
             content,
-            page.name,
+            pagename,
             site_config=self.config.moin_site_config,
             strict_mode=self.config.strict_mode,
         )
 
         logger.debug("++ translate")
+        return HugoFormatter.format(
+            page_obj,
+            pagename=pagename,
+            path_builder=self.path_builder,
+            config=self.config.hugo_config,
+            block_cache=block_cache,
+        )
+
+    def convert_page_raw(self, page: MoinPageInfo) -> list[str]:
+        """Convert page into its source text in a code block, without parsing it."""
+        content = self.source.read_text(page.filepath)
+        page_obj = PageRoot()
+        page_obj.add_child(Codeblock(content=content.rstrip("\n")))
         converted = HugoFormatter.format(
             page_obj,
             pagename=page.name,
             path_builder=self.path_builder,
             config=self.config.hugo_config,
         )
+        return self._write_page(page, converted)
 
-        hugo_bundle_path = self.path_builder.page_filepath(page.name)
-        dst_bundle_path = safe_path_join(self.dst_dir, hugo_bundle_path)
-        os.makedirs(dst_bundle_path, exist_ok=True)
-
-        is_branch = False
-        match self.hugo_site_structure[hugo_bundle_path]:
-            case self.LEAF_BUNDLE:
-                dst_filepath = safe_path_join(dst_bundle_path, "index.md")
-            case self.BRANCH_BUNDLE:
-                dst_filepath = safe_path_join(dst_bundle_path, "_index.md")
-                is_branch = True
-            case _ as unreachable:  # type: ignore
-                assert_never(unreachable)
+    def _write_page(self, page: MoinPageInfo, converted: str) -> list[str]:
+        page_output_path = self.page_output_path(page.name)
+        dst_filepath = self.sink.join(page_output_path)
+        is_branch = os.path.basename(page_output_path) == "_index.md"
 
         title = page.name.split("/")[-1]
         hugo_page = HugoPageInfo(
@@ -129,12 +269,15 @@ class Moin2Hugo(Moin2XConverter, object):
         )
 
         logger.info("++ output: %s" % dst_filepath)
-        with open(dst_filepath, "w") as f:
-            f.write(self.render_page(hugo_page, converted))
+        self.sink.write_text(page_output_path, self.render_page(hugo_page, converted))
+        outputs = [page_output_path]
 
         if page.attachments:
             logger.info("++ copy attachments")
             for attachment in page.attachments:
+                if self._in_attachment_store(page.name, attachment.name):
+                    continue
                 attach_filepath = self.path_builder.attachment_filepath(page.name, attachment.name)
-                dst_path = safe_path_join(self.dst_dir, attach_filepath)
-                shutil.copy(attachment.filepath, dst_path)
+                self.sink.copy_file(self.source, attachment.filepath, attach_filepath)
+                outputs.append(attach_filepath)
+        return outputs
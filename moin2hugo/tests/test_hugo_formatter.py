@@ -6,6 +6,7 @@ import pytest
 from moin2hugo.config import HugoConfig
 from moin2hugo.formatter import HugoFormatter
 from moin2hugo.path_builder import HugoPathBuilder
+from moin2x.moin_parser import MoinParser
 from moin2x.page_tree import Pagelink, PageRoot, Paragraph, ParsedText, Remark, Strong, Text
 
 
@@ -202,3 +203,57 @@ def test_root_path():
         pagelink, pagename="PageName", config=config, path_builder=hugo_path_builder
     )
     assert ret == "[](/hugo/SomePage)"
+
+
+def test_format_with_block_cache():
+    revisions = [
+        """\
+        = Heading =
+        first paragraph
+        with '''strong''' text
+
+         * item 1
+         * item 2
+
+        ||a||b||
+        {{{
+        code
+        }}}
+        last paragraph
+        """,
+        # a paragraph is modified
+        """\
+        = Heading =
+        first paragraph
+        with '''bold''' text
+
+         * item 1
+         * item 2
+
+        ||a||b||
+        {{{
+        code
+        }}}
+        last paragraph
+        """,
+        # blocks are reordered
+        """\
+        ||a||b||
+        = Heading =
+        last paragraph
+        {{{
+        code
+        }}}
+
+         * item 1
+         * item 2
+        """,
+    ]
+    block_cache: dict[Any, str] = {}
+    for revision in revisions:
+        data = textwrap.dedent(revision)
+        expected = HugoFormatter.format(MoinParser.parse(data, "PageName"), pagename="PageName")
+        page = MoinParser.parse(data, "PageName")
+        ret = HugoFormatter.format(page, pagename="PageName", block_cache=block_cache)
+        assert ret == expected
+        assert len(block_cache) == len(page.children)
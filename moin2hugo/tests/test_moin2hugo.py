@@ -1,7 +1,16 @@
 import difflib
 import filecmp
+import io
+import json
+import logging
 import os
+import shutil
+import subprocess
+import tarfile
 import tempfile
+import threading
+import time
+import zipfile
 from typing import Iterator, TypeAlias
 from unittest.mock import patch
 
@@ -9,7 +18,20 @@ import pytest
 
 from moin2hugo.cli import print_version
 from moin2hugo.moin2hugo import Moin2Hugo
-from moin2x.moin2x import convert_site
+from moin2x.attachment_store import AttachmentStore
+from moin2x.budget import PageBudget
+from moin2x.estimate import estimate_site
+from moin2x.history import convert_history
+from moin2x.journal import JOURNAL_FILENAME
+from moin2x.manifest import MANIFEST_FILENAME
+from moin2x.moin2x import convert_site, watch_site
+from moin2x.moin_site_scanner import MoinPageInfo, MoinSiteScanner
+from moin2x.moinutils import quoteWikinameFS
+from moin2x.shard import Shard
+from moin2x.sink import NullSink, open_sink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import open_source
+from moin2x.staging import CLEANUP_THREAD_NAME
 
 from .conftest import HugoSitedirFixture, MoinSitedirFixture
 
@@ -75,6 +97,426 @@ def test_convert(moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixt
         assert_equal_directory(dcmp)
 
 
+def test_convert_with_site_index(
+    moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture
+):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir, site_index=site_index)
+        with patch.object(MoinSiteScanner, "scan_pages", side_effect=RuntimeError("rescan")):
+            convert_site(moin_sitedir, dstdir, moin2hugo, site_index=site_index)
+        dcmp = filecmp.dircmp(dstdir, hugo_sitedir)
+        assert_equal_directory(dcmp)
+
+
+def test_convert_with_glob_pagename(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir, patterns=["テスト/*"])
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir, site_index=site_index)
+        convert_site(moin_sitedir, dstdir, moin2hugo, pagename="テスト/*", site_index=site_index)
+        assert os.path.exists(os.path.join(dstdir, "テスト/attachments_test/index.md"))
+        assert os.path.exists(os.path.join(dstdir, "テスト/page_test/ページ/index.md"))
+        assert not os.path.exists(os.path.join(dstdir, "FrontPage"))
+
+
+def test_convert_parallel(moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture):
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir)
+        convert_site(moin_sitedir, dstdir, moin2hugo, jobs=2)
+        dcmp = filecmp.dircmp(dstdir, hugo_sitedir)
+        assert_equal_directory(dcmp)
+
+
+def test_convert_archive(moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture):
+    with tempfile.TemporaryDirectory() as d:
+        archive_path = os.path.join(d, "pages.tar.gz")
+        with tarfile.open(archive_path, "w:gz") as f:
+            f.add(moin_sitedir, arcname="data/pages")
+        dstdir = os.path.join(d, "output")
+        with open_source(archive_path) as source:
+            moin2hugo = Moin2Hugo(source, dstdir)
+            convert_site(archive_path, dstdir, moin2hugo, jobs=2, site_index=moin2hugo.site_index)
+        dcmp = filecmp.dircmp(dstdir, hugo_sitedir)
+        assert_equal_directory(dcmp)
+
+
+@pytest.mark.parametrize(("suffix", "jobs"), [(".tar.gz", 1), (".zip", 2)])
+def test_convert_into_archive(
+    moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture, suffix: str, jobs: int
+):
+    with tempfile.TemporaryDirectory() as d:
+        archive_path = os.path.join(d, "output" + suffix)
+        with open_sink(archive_path) as sink:
+            moin2hugo = Moin2Hugo(moin_sitedir, sink)
+            convert_site(moin_sitedir, archive_path, moin2hugo, jobs=jobs)
+        dstdir = os.path.join(d, "output")
+        if suffix == ".zip":
+            with zipfile.ZipFile(archive_path) as f:
+                f.extractall(dstdir)
+        else:
+            with tarfile.open(archive_path) as f:
+                f.extractall(dstdir, filter="data")
+        dcmp = filecmp.dircmp(dstdir, hugo_sitedir)
+        assert_equal_directory(dcmp)
+
+
+def test_convert_into_staging_dir(
+    moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture
+):
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        os.makedirs(dstdir)
+        with open(os.path.join(dstdir, "live.md"), "w") as f:
+            f.write("live")
+
+        # live directory is kept until the conversion fails
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir)
+        with patch.object(moin2hugo, "convert_page", side_effect=RuntimeError("fail")):
+            with pytest.raises(RuntimeError):
+                convert_site(moin_sitedir, dstdir, moin2hugo)
+        assert os.listdir(dstdir) == ["live.md"]
+        assert len(os.listdir(d)) == 2  # staging directory is kept to resume
+
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir)
+        convert_page = moin2hugo.convert_page
+        live_dir_seen: list[bool] = []
+
+        def convert_page_seeing_live_dir(page: MoinPageInfo) -> list[str]:
+            live_dir_seen.append(os.path.exists(os.path.join(dstdir, "live.md")))
+            return convert_page(page)
+
+        with patch.object(moin2hugo, "convert_page", side_effect=convert_page_seeing_live_dir):
+            convert_site(moin_sitedir, dstdir, moin2hugo)
+        assert live_dir_seen and all(live_dir_seen)
+        for thread in threading.enumerate():
+            if thread.name == CLEANUP_THREAD_NAME:
+                thread.join()
+        assert_equal_directory(filecmp.dircmp(dstdir, hugo_sitedir))
+        assert not os.path.exists(os.path.join(dstdir, "live.md"))
+        assert sorted(os.listdir(d)) == ["output"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_convert_twice_skips_identical_attachments(
+    moin_sitedir: MoinSitedirFixture,
+    hugo_sitedir: HugoSitedirFixture,
+    caplog: pytest.LogCaptureFixture,
+    jobs: int,
+):
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        convert_site(moin_sitedir, dstdir, Moin2Hugo(moin_sitedir, dstdir), jobs=jobs)
+        caplog.clear()
+        with caplog.at_level(logging.INFO, logger="moin2x.moin2x"):
+            convert_site(moin_sitedir, dstdir, Moin2Hugo(moin_sitedir, dstdir), jobs=jobs)
+        for thread in threading.enumerate():
+            if thread.name == CLEANUP_THREAD_NAME:
+                thread.join()
+        assert "Attachments: 0 files (0 bytes) copied, 3 identical files" in caplog.text
+        assert_equal_directory(filecmp.dircmp(dstdir, hugo_sitedir))
+
+
+@pytest.mark.parametrize("jobs,incremental", [(1, False), (1, True), (2, False)])
+def test_convert_resume(
+    moin_sitedir: MoinSitedirFixture,
+    hugo_sitedir: HugoSitedirFixture,
+    caplog: pytest.LogCaptureFixture,
+    jobs: int,
+    incremental: bool,
+):
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+
+        # interrupted at the last page
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir)
+        convert_page = moin2hugo.convert_page
+
+        def convert_page_interrupted(page: MoinPageInfo) -> list[str]:
+            if page.name == "テスト/page_test/ページ":
+                raise KeyboardInterrupt()
+            return convert_page(page)
+
+        with patch.object(moin2hugo, "convert_page", side_effect=convert_page_interrupted):
+            with pytest.raises(KeyboardInterrupt):
+                convert_site(moin_sitedir, dstdir, moin2hugo, incremental=incremental)
+        assert not os.path.exists(dstdir)
+
+        caplog.clear()
+        with caplog.at_level(logging.INFO, logger="moin2x.moin2x"):
+            convert_site(
+                moin_sitedir,
+                dstdir,
+                Moin2Hugo(moin_sitedir, dstdir),
+                jobs=jobs,
+                incremental=incremental,
+                resume=True,
+            )
+        converted = [
+            r.getMessage()[len("+ Convert Page: ") :]
+            for r in caplog.records
+            if r.getMessage().startswith("+ Convert Page: ")
+        ]
+        assert sorted(converted) == ["FrontPage", "テスト/page_test/ページ"]
+        for thread in threading.enumerate():
+            if thread.name == CLEANUP_THREAD_NAME:
+                thread.join()
+        assert sorted(os.listdir(d)) == ["output"]
+        assert not os.path.exists(os.path.join(dstdir, JOURNAL_FILENAME))
+        if incremental:
+            os.remove(os.path.join(dstdir, MANIFEST_FILENAME))
+        assert_equal_directory(filecmp.dircmp(dstdir, hugo_sitedir))
+
+
+@pytest.mark.parametrize("raw_fallback", [True, False])
+def test_convert_page_over_budget(moin_sitedir: MoinSitedirFixture, raw_fallback: bool):
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir)
+        convert_page = moin2hugo.convert_page
+
+        def convert_page_stalled(page: MoinPageInfo) -> list[str]:
+            if page.name == "FrontPage":
+                start = time.process_time()
+                while time.process_time() - start < 10:
+                    pass
+            return convert_page(page)
+
+        budget = PageBudget(cpu_time=0.1, raw_fallback=raw_fallback)
+        with patch.object(moin2hugo, "convert_page", side_effect=convert_page_stalled):
+            convert_site(moin_sitedir, dstdir, moin2hugo, budget=budget)
+
+        assert os.path.exists(os.path.join(dstdir, "テスト", "_index.md"))
+        if not raw_fallback:
+            assert not os.path.exists(os.path.join(dstdir, "_index.md"))
+            return
+        with open(os.path.join(dstdir, "_index.md")) as f:
+            content = f.read()
+        assert 'title: "FrontPage"' in content
+        assert "```\n## Please edit system and help pages ONLY in the master wiki!\n" in content
+
+
+def test_convert_shards(moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture):
+    with tempfile.TemporaryDirectory() as d:
+        structure_file = os.path.join(d, "structure.json")
+        with open_source(moin_sitedir) as source:
+            MoinSiteIndex.scan(source).save(structure_file, source)
+
+        merged_dir = os.path.join(d, "merged")
+        for i in [1, 2]:
+            dstdir = os.path.join(d, "shard%d" % i)
+            with open_source(moin_sitedir) as source:
+                site_index = MoinSiteIndex.load(structure_file, source)
+                moin2hugo = Moin2Hugo(source, dstdir, site_index=site_index)
+                convert_site(
+                    moin_sitedir, dstdir, moin2hugo, site_index=site_index, shard=Shard(i, 2)
+                )
+            shutil.copytree(dstdir, merged_dir, dirs_exist_ok=True)
+        # FrontPage is converted by the second shard
+        assert not os.path.exists(os.path.join(d, "shard1", "_index.md"))
+        assert_equal_directory(filecmp.dircmp(merged_dir, hugo_sitedir))
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_convert_changes_file(moin_sitedir: MoinSitedirFixture, incremental: bool):
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        changes_file = os.path.join(d, "changes.json")
+        convert_site(
+            moin_sitedir,
+            dstdir,
+            Moin2Hugo(moin_sitedir, dstdir),
+            incremental=incremental,
+            changes_file=changes_file,
+        )
+        with open(changes_file) as f:
+            changes = json.load(f)
+        assert "_index.md" in changes["added"]
+        assert "テスト/attachments_test/index.md" in changes["added"]
+        assert changes["modified"] == changes["deleted"] == []
+
+        # unchanged outputs are not rewritten, and files not converted from pages are removed
+        # unless they are kept in place by incremental conversion
+        front_page = os.path.join(dstdir, "_index.md")
+        os.utime(front_page, ns=(0, 1000**3))
+        os.makedirs(os.path.join(dstdir, "old"))
+        with open(os.path.join(dstdir, "old", "index.md"), "w") as f:
+            f.write("old")
+        for thread in threading.enumerate():
+            if thread.name == CLEANUP_THREAD_NAME:
+                thread.join()
+        convert_site(
+            moin_sitedir,
+            dstdir,
+            Moin2Hugo(moin_sitedir, dstdir),
+            incremental=incremental,
+            changes_file=changes_file,
+        )
+        assert os.stat(front_page).st_mtime_ns == 1000**3
+        with open(changes_file) as f:
+            changes = json.load(f)
+        deleted = [] if incremental else ["old/index.md"]
+        assert changes == {"added": [], "modified": [], "deleted": deleted}
+
+
+def test_convert_dry_run(moin_sitedir: MoinSitedirFixture):
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        sink = NullSink(dstdir)
+        convert_site(moin_sitedir, dstdir, Moin2Hugo(moin_sitedir, sink))
+        assert sink.files > 0
+        assert not os.path.exists(dstdir)
+        with pytest.raises(ValueError):
+            convert_site(moin_sitedir, dstdir, Moin2Hugo(moin_sitedir, sink), incremental=True)
+
+
+def test_estimate_site(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    with tempfile.TemporaryDirectory() as d:
+        sink = NullSink(d)
+        estimate = estimate_site(Moin2Hugo(moin_sitedir, sink), site_index, samples=2)
+        assert not os.listdir(d)
+    assert len(estimate.pages) == 4
+    assert estimate.revisions == 9
+    assert estimate.attachments == 3
+    assert estimate.largest_pages(1)[0].name == "テスト/page_test/ページ"
+    assert estimate.sampled_pages == 2
+    # only sampled pages are converted
+    assert 2 <= sink.files < len(site_index) + estimate.attachments
+
+    # sizes are read from the site index without walking revisions
+    with tempfile.TemporaryDirectory() as d:
+        index_file = os.path.join(d, "index.db")
+        site_index = MoinSiteIndex.scan(moin_sitedir, index_file=index_file)
+        with patch("moin2x.estimate._page_size", side_effect=AssertionError("stat")):
+            indexed = estimate_site(
+                Moin2Hugo(moin_sitedir, NullSink(d)),
+                site_index,
+                samples=2,
+                index_file=index_file,
+            )
+    assert indexed.pages == estimate.pages
+    assert (indexed.attachments, indexed.attachment_bytes) == (
+        estimate.attachments,
+        estimate.attachment_bytes,
+    )
+
+
+def test_convert_history(moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    stream = io.BytesIO()
+    with tempfile.TemporaryDirectory() as d:
+        convert_history(Moin2Hugo(moin_sitedir, NullSink(d)), site_index, stream, prefix="content")
+    history = stream.getvalue()
+    assert history.count(b"\ncommit refs/heads/main\n") == 8
+    # the attachment shared by pages is written once
+    assert history.count(b"\nblob\n") == 10
+
+    if shutil.which("git") is None:
+        pytest.skip("git is not installed")
+    with tempfile.TemporaryDirectory() as d:
+        subprocess.run(["git", "init", "-q", d], check=True)
+        subprocess.run(["git", "-C", d, "fast-import", "--quiet"], input=history, check=True)
+        subprocess.run(["git", "-C", d, "checkout", "-q", "main"], check=True)
+        log = subprocess.run(
+            ["git", "-C", d, "log", "--format=%at", "main"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.splitlines()
+        assert len(log) == 8
+        assert log == sorted(log, key=int, reverse=True)
+        # the latest revisions are same as the current pages
+        assert_equal_directory(filecmp.dircmp(os.path.join(d, "content"), hugo_sitedir))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_convert_with_attachment_store(moin_sitedir: MoinSitedirFixture, jobs: int):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    with tempfile.TemporaryDirectory() as d:
+        dstdir = os.path.join(d, "output")
+        with open_source(moin_sitedir) as source:
+            store = AttachmentStore.build(site_index, source)
+            moin2hugo = Moin2Hugo(source, dstdir, site_index=site_index, attachment_store=store)
+            convert_site(moin_sitedir, dstdir, moin2hugo, jobs=jobs, incremental=True)
+        jpg = store.filepath("テスト", "file_example_JPG_100kB.jpg")
+        assert jpg is not None
+        assert os.path.exists(os.path.join(dstdir, jpg))
+        assert os.path.exists(os.path.join(dstdir, "_attachments", "index.md"))
+        assert not os.path.exists(os.path.join(dstdir, "テスト", "file_example_JPG_100kB.jpg"))
+        with open(os.path.join(dstdir, "テスト", "attachments_test", "index.md")) as f:
+            assert "/" + jpg in f.read()
+
+        # store is kept by the next run
+        moin2hugo = Moin2Hugo(moin_sitedir, dstdir, site_index=site_index, attachment_store=store)
+        convert_site(moin_sitedir, dstdir, moin2hugo, incremental=True)
+        assert os.path.exists(os.path.join(dstdir, jpg))
+
+
+def test_convert_incremental(
+    moin_sitedir: MoinSitedirFixture,
+    hugo_sitedir: HugoSitedirFixture,
+    caplog: pytest.LogCaptureFixture,
+):
+    with tempfile.TemporaryDirectory() as d:
+        srcdir = os.path.join(d, "src")
+        shutil.copytree(moin_sitedir, srcdir)
+        dstdir = os.path.join(d, "output")
+
+        convert_site(srcdir, dstdir, Moin2Hugo(srcdir, dstdir), incremental=True)
+        assert_equal_directory(filecmp.dircmp(dstdir, hugo_sitedir))
+        assert os.path.exists(os.path.join(dstdir, ".moin2x-manifest.json"))
+
+        caplog.clear()
+        with caplog.at_level("INFO", logger="moin2x"):
+            convert_site(srcdir, dstdir, Moin2Hugo(srcdir, dstdir), incremental=True)
+        assert "Convert Page" not in caplog.text, caplog.text
+        assert_equal_directory(filecmp.dircmp(dstdir, hugo_sitedir))
+
+        # remove page and its parent turns into leaf bundle
+        shutil.rmtree(os.path.join(srcdir, "(e38386e382b9e383882f)attachments_test"))
+        shutil.rmtree(
+            os.path.join(srcdir, "(e38386e382b9e383882f)page_test(2fe3839ae383bce382b8)")
+        )
+        caplog.clear()
+        with caplog.at_level("INFO", logger="moin2x"):
+            convert_site(srcdir, dstdir, Moin2Hugo(srcdir, dstdir), incremental=True)
+        assert "Convert Page: テスト" in caplog.text, caplog.text
+        assert "Convert Page: FrontPage" not in caplog.text, caplog.text
+        assert sorted(os.listdir(os.path.join(dstdir, "テスト"))) == [
+            "file_example_JPG_100kB.jpg",
+            "index.md",
+        ]
+
+
+def test_watch(moin_sitedir: MoinSitedirFixture, hugo_sitedir: HugoSitedirFixture):
+    with tempfile.TemporaryDirectory() as d:
+        srcdir = os.path.join(d, "src")
+        shutil.copytree(moin_sitedir, srcdir)
+        dstdir = os.path.join(d, "output")
+        site_index = MoinSiteIndex.scan(srcdir)
+        moin2hugo = Moin2Hugo(srcdir, dstdir, site_index=site_index)
+        convert_site(srcdir, dstdir, moin2hugo, incremental=True, site_index=site_index)
+
+        # new subpage turns its parent into branch bundle
+        parent_dir = os.path.join(dstdir, "テスト", "attachments_test")
+        new_entry = quoteWikinameFS("テスト/attachments_test/New")
+        shutil.copytree(os.path.join(srcdir, "FrontPage"), os.path.join(srcdir, new_entry))
+        with patch.object(MoinSiteScanner, "scan_pages", side_effect=RuntimeError("rescan")):
+            watch_site(dstdir, moin2hugo, site_index, [set([new_entry])])
+        assert moin2hugo.hugo_site_structure["テスト/attachments_test"] == moin2hugo.BRANCH_BUNDLE
+        assert os.path.exists(os.path.join(parent_dir, "New", "index.md"))
+        assert os.path.exists(os.path.join(parent_dir, "_index.md"))
+        assert not os.path.exists(os.path.join(parent_dir, "index.md"))
+
+        # and removing it turns the parent back
+        shutil.rmtree(os.path.join(srcdir, new_entry))
+        watch_site(dstdir, moin2hugo, moin2hugo.site_index, [set([new_entry])])
+        assert_equal_directory(filecmp.dircmp(dstdir, hugo_sitedir))
+
+
 def test_convert_assertion_error(
     moin_sitedir: MoinSitedirFixture,
     hugo_sitedir: HugoSitedirFixture,
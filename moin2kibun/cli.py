@@ -1,88 +1,32 @@
-import logging
-from typing import Optional
+from typing import Any, Optional
 
 import click
 import yaml
 
 from moin2kibun.config import Config, load_config
 from moin2kibun.moin2kibun import Moin2Kibun
-from moin2x import __version__
-from moin2x.moin2x import convert_site as moin2x_convert_site
-from moin2x.utils import set_console_handlers
+from moin2x.attachment_store import AttachmentStore
+from moin2x.cli import config_logger, convert_site_options, print_version, run_convert_site
+from moin2x.sink import OutputSink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import MoinSource
 
-
-def config_logger(verbose: bool, debug: bool):
-    app_logger = logging.getLogger("moin2kibun")
-    app_logger.propagate = False
-    for handler in app_logger.handlers:
-        app_logger.removeHandler(handler)
-    set_console_handlers(app_logger, verbose, debug)
-
-    app_logger = logging.getLogger("moin2x")
-    app_logger.propagate = False
-    for handler in app_logger.handlers:
-        app_logger.removeHandler(handler)
-    set_console_handlers(app_logger, verbose, debug)
-
-    cssutils_logger = logging.getLogger("CSSUTILS")
-    cssutils_logger.propagate = False
-    for handler in cssutils_logger.handlers:
-        cssutils_logger.removeHandler(handler)
-    set_console_handlers(cssutils_logger, verbose, debug)
-
-
-def print_version():
-    click.echo(__version__)
-
-
-def cmd_print_version(ctx: click.Context, param: click.Parameter, value: str):
-    if not value or ctx.resilient_parsing:
-        return
-    print_version()
-    ctx.exit()
+__all__ = ["convert_site", "print_version"]
 
 
 @click.command()
-@click.argument("src", type=click.Path(exists=True))
-@click.argument("dst", type=click.Path())
-@click.option(
-    "--pagename",
-    "-p",
-    "pagename",
-    metavar="PAGENAME",
-    help="Pagename to be converted",
-    default=None,
-)
-@click.option("--config", "-c", "configfile", type=click.Path(exists=True), default=None)
-@click.option("--verbose", "-v", "verbose", type=bool, default=False, is_flag=True)
-@click.option("--debug", "-d", "debug", type=bool, default=False, is_flag=True)
-@click.option(
-    "--version",
-    "-V",
-    "version",
-    help="Show version and exit.",
-    is_flag=True,
-    callback=cmd_print_version,
-    is_eager=True,
-    expose_value=False,
-)
-def convert_site(
-    src: str,
-    dst: str,
-    configfile: Optional[str],
-    pagename: Optional[str],
-    verbose: bool,
-    debug: bool,
-):
+@convert_site_options
+def convert_site(configfile: Optional[str], verbose: bool, debug: bool, **options: Any):
     """Convert MoinMoin pages directory to Kibun content directory.
 
     \b
-    SRC is the MoinMoin pages directory to convert (e.g. yourwiki/data/pages)
-    DST is the output directory
+    SRC is the MoinMoin pages directory to convert (e.g. yourwiki/data/pages),
+    or tar/zip archive of it
+    DST is the output directory, or tar/zip archive (e.g. content.tar.gz) to create
     """
     if debug:
         verbose = True
-    config_logger(verbose, debug)
+    config_logger("moin2kibun", verbose, debug)
     if configfile:
         with open(configfile, "r") as f:
             config_data = f.read()
@@ -90,5 +34,13 @@ def convert_site(
         config = load_config(config_dict)
     else:
         config = Config()
-    moin2kibun = Moin2Kibun(src, dst, config=config)
-    moin2x_convert_site(src, dst, moin2kibun, pagename=pagename)
+
+    def make_converter(
+        source: MoinSource,
+        sink: OutputSink,
+        site_index: MoinSiteIndex,
+        attachment_store: Optional[AttachmentStore],
+    ) -> Moin2Kibun:
+        return Moin2Kibun(source, sink, config=config, attachment_store=attachment_store)
+
+    run_convert_site(make_converter, **options)
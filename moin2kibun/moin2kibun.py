@@ -1,7 +1,7 @@
 import logging
 import os
-import shutil
 from datetime import datetime
+from functools import partial
 from typing import Optional
 
 import attr
@@ -10,10 +10,16 @@ import jinja2
 from moin2kibun.config import Config
 from moin2kibun.formatter import KibunFormatter
 from moin2kibun.path_builder import KibunPathBuilder
+from moin2x.attachment_store import AttachmentStore
+from moin2x.formatter.base import BlockCache
 from moin2x.moin2x import Moin2XConverter
 from moin2x.moin_parser import MoinParser
 from moin2x.moin_site_scanner import MoinAttachment, MoinPageInfo
-from moin2x.utils import safe_path_join
+from moin2x.page_tree import Codeblock, PageRoot
+from moin2x.revision_cache import RevisionCache
+from moin2x.sink import DirectorySink, OutputSink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import MoinSource, open_source
 
 logger = logging.getLogger(__name__)
 
@@ -34,13 +40,25 @@ class KibunPageInfo:
 
 
 class Moin2Kibun(Moin2XConverter, object):
-    def __init__(self, src_dir: str, dst_dir: str, config: Optional[Config] = None):
+    def __init__(
+        self,
+        src_dir: str | MoinSource,
+        dst_dir: str | OutputSink,
+        config: Optional[Config] = None,
+        attachment_store: Optional[AttachmentStore] = None,
+    ):
         if config is not None:
             self.config = config
         else:
             self.config = Config()
         self.src_dir = src_dir
-        self.dst_dir = dst_dir
+        if isinstance(dst_dir, OutputSink):
+            self.sink = dst_dir
+        else:
+            self.sink = DirectorySink(dst_dir)
+        self.dst_dir = self.sink.root
+        self.attachment_store = attachment_store
+        self._source: Optional[MoinSource] = None
 
         self.path_builder = KibunPathBuilder(
             page_front_page=self.config.moin_site_config.page_front_page,
@@ -48,6 +66,7 @@ class Moin2Kibun(Moin2XConverter, object):
             disable_path_to_lower=self.config.format_config.disable_path_to_lower,
             remove_path_accents=self.config.format_config.remove_path_accents,
         )
+        self.path_builder.attachment_store = attachment_store
 
         if self.config.template_file:
             tmpl_dir, tmpl_file = os.path.split(self.config.template_file)
@@ -59,32 +78,86 @@ class Moin2Kibun(Moin2XConverter, object):
         env.filters["isoformat"] = jinja2_isoformat  # type: ignore
         self.page_tmpl = env.get_template(tmpl_file)
 
+    def __reduce__(self):
+        # rebuild template and path builder on unpickling (e.g. in worker processes)
+        return (self.__class__, (self.src_dir, self.sink, self.config, self.attachment_store))
+
+    @property
+    def source(self) -> MoinSource:
+        if self._source is None:
+            if isinstance(self.src_dir, MoinSource):
+                self._source = self.src_dir
+            else:
+                self._source = open_source(self.src_dir)
+        return self._source
+
     def render_page(self, page: KibunPageInfo, content: str) -> str:
         ret = self.page_tmpl.render(page=page, content=content)
         return ret
 
-    def convert_page(self, page: MoinPageInfo):
+    def page_output_path(self, pagename: str) -> str:
+        return self.path_builder.page_filepath(pagename)
+
+    def update_site(self, site_index: MoinSiteIndex, pagenames: set[str]) -> set[str]:
+        # output paths of pages don't depend on other pages
+        return set()
+
+    def _in_attachment_store(self, pagename: str, filename: str) -> bool:
+        if self.attachment_store is None:
+            return False
+        return self.attachment_store.filepath(pagename, filename) is not None
+
+    def convert_attachment_store(self) -> list[str]:
+        if self.attachment_store is None:
+            return []
+        return self.attachment_store.write(self.sink, self.source)
+
+    def convert_page(self, page: MoinPageInfo) -> list[str]:
         logger.debug("++ filepath: %s" % page.filepath)
-        with open(page.filepath, "r") as f:
-            content = f.read()
+        content = self.source.read_text(page.filepath)
+        return self._write_page(page, self._convert_content(page.name, content))
+
+    def convert_revision(self, page: MoinPageInfo, cache: RevisionCache) -> list[str]:
+        logger.debug("++ filepath: %s" % page.filepath)
+        content = self.source.read_text(page.filepath)
+        converted = cache.convert(page.name, content, partial(self._convert_content, page.name))
+        return self._write_page(page, converted)
+
+    def _convert_content(
+        self, pagename: str, content: str, block_cache: Optional[BlockCache] = None
+    ) -> str:
         page_obj = MoinParser.parse(
             content,
-            page.name,
+            pagename,
             site_config=self.config.moin_site_config,
             strict_mode=self.config.strict_mode,
         )
 
         logger.debug("++ translate")
+        return KibunFormatter.format(
+            page_obj,
+            pagename=pagename,
+            path_builder=self.path_builder,
+            config=self.config.format_config,
+            block_cache=block_cache,
+        )
+
+    def convert_page_raw(self, page: MoinPageInfo) -> list[str]:
+        """Convert page into its source text in a code block, without parsing it."""
+        content = self.source.read_text(page.filepath)
+        page_obj = PageRoot()
+        page_obj.add_child(Codeblock(content=content.rstrip("\n")))
         converted = KibunFormatter.format(
             page_obj,
             pagename=page.name,
             path_builder=self.path_builder,
             config=self.config.format_config,
         )
+        return self._write_page(page, converted)
 
-        page_filepath = self.path_builder.page_filepath(page.name)
-        dst_filepath = safe_path_join(self.dst_dir, page_filepath)
-        os.makedirs(os.path.dirname(dst_filepath), exist_ok=True)
+    def _write_page(self, page: MoinPageInfo, converted: str) -> list[str]:
+        page_output_path = self.page_output_path(page.name)
+        dst_filepath = self.sink.join(page_output_path)
 
         title = page.name.split("/")[-1]
         kibun_page = KibunPageInfo(
@@ -96,13 +169,15 @@ class Moin2Kibun(Moin2XConverter, object):
         )
 
         logger.info("++ output: %s" % dst_filepath)
-        with open(dst_filepath, "w") as f:
-            f.write(self.render_page(kibun_page, converted))
+        self.sink.write_text(page_output_path, self.render_page(kibun_page, converted))
+        outputs = [page_output_path]
 
         if page.attachments:
             logger.info("++ copy attachments")
             for attachment in page.attachments:
+                if self._in_attachment_store(page.name, attachment.name):
+                    continue
                 attach_filepath = self.path_builder.attachment_filepath(page.name, attachment.name)
-                dst_path = safe_path_join(self.dst_dir, attach_filepath)
-                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                shutil.copy(attachment.filepath, dst_path)
+                self.sink.copy_file(self.source, attachment.filepath, attach_filepath)
+                outputs.append(attach_filepath)
+        return outputs
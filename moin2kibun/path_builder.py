@@ -51,6 +51,9 @@ class KibunPathBuilder(MarkdownPathBuilder):
     def attachment_url(
         self, pagename: Optional[str], filename: str, relative_base: Optional[str] = None
     ) -> str:
+        store_url = self._attachment_store_url(pagename, filename, relative_base)
+        if store_url is not None:
+            return store_url
         filename = self._sanitize_attachment_filename(filename)
         if pagename is not None:
             pagename = self._sanitize_pagename(pagename)
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any, Iterable, Optional
+
+import attr
+
+from moin2x.moin_site_scanner import MoinAttachment, MoinPageInfo
+from moin2x.sink import OutputSink
+from moin2x.source import MoinSource
+from moin2x.utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+HASH_CACHE_VERSION = 1
+
+
+class AttachmentHashCache(object):
+    """Digests of attachment files keyed by (path, size, mtime), kept between runs."""
+
+    def __init__(self, cache_file: Optional[str] = None):
+        self.cache_file = cache_file
+        self.entries: dict[str, tuple[int, int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        if cache_file is not None:
+            self._load(cache_file)
+
+    def _load(self, cache_file: str):
+        try:
+            with open(cache_file, "r") as f:
+                data: dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("broken hash cache file: %s" % cache_file)
+            return
+        if data.get("version") != HASH_CACHE_VERSION:
+            return
+        for path, (size, mtime_ns, digest) in data.get("files", {}).items():
+            self.entries[path] = (size, mtime_ns, digest)
+
+    def digest(self, source: MoinSource, attachment: MoinAttachment) -> str:
+        size, mtime_ns = attachment.size, attachment.mtime_ns
+        if size is None or mtime_ns is None:
+            st = source.stat(attachment.filepath)
+            size, mtime_ns = st.size, st.mtime_ns
+        entry = self.entries.get(attachment.filepath)
+        if entry is not None and entry[:2] == (size, mtime_ns):
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        with source.open(attachment.filepath) as f:
+            digest = file_sha256(f).hex()
+        self.entries[attachment.filepath] = (size, mtime_ns, digest)
+        return digest
+
+    def save(self):
+        if self.cache_file is None:
+            return
+        data = {
+            "version": HASH_CACHE_VERSION,
+            "files": dict([(path, list(entry)) for path, entry in sorted(self.entries.items())]),
+        }
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, self.cache_file)
+
+
+@attr.s(frozen=True)
+class AttachmentStore:
+    """Content-addressed store of attachments shared by pages.
+
+    Identical attachments are stored once at store_dir/<xx>/<sha256><ext> in the output,
+    and path builders refer to the stored file instead of the attachment in page bundle.
+    """
+
+    # (pagename, filename) -> path in the store
+    paths: dict[tuple[str, str], str] = attr.ib()
+    # path in the store -> attachment to be stored
+    files: dict[str, MoinAttachment] = attr.ib()
+    store_dir: str = attr.ib(default="_attachments")
+
+    @classmethod
+    def build(
+        cls,
+        pages: Iterable[MoinPageInfo],
+        source: MoinSource,
+        cache: Optional[AttachmentHashCache] = None,
+        store_dir: str = "_attachments",
+    ) -> AttachmentStore:
+        logger.info("+ Hash Attachments")
+        if cache is None:
+            cache = AttachmentHashCache()
+        paths: dict[tuple[str, str], str] = {}
+        files: dict[str, MoinAttachment] = {}
+        for page in sorted(pages, key=lambda p: p.name):
+            for attachment in sorted(page.attachments, key=lambda a: a.name):
+                digest = cache.digest(source, attachment)
+                _, ext = os.path.splitext(attachment.name)
+                path = "%s/%s/%s%s" % (store_dir, digest[:2], digest, ext.lower())
+                paths[(page.name, attachment.name)] = path
+                # the first attachment in stable order represents the content
+                files.setdefault(path, attachment)
+        cache.save()
+        logger.info(
+            "++ %d attachments, %d unique (hashed: %d, cached: %d)"
+            % (len(paths), len(files), cache.misses, cache.hits)
+        )
+        return cls(paths=paths, files=files, store_dir=store_dir)
+
+    def filepath(self, pagename: str, filename: str) -> Optional[str]:
+        """Return the path of the attachment in the store relative to output root."""
+        return self.paths.get((pagename, filename))
+
+    def write(self, sink: OutputSink, source: MoinSource) -> list[str]:
+        """Store unique attachments into the sink and return their paths."""
+        logger.info("+ Store Attachments: %s" % self.store_dir)
+        for path, attachment in sorted(self.files.items()):
+            sink.copy_file(source, attachment.filepath, path)
+        return sorted(self.files)
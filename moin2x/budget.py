@@ -0,0 +1,107 @@
+import contextlib
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Any, Generator, Optional
+
+import attr
+
+try:
+    import resource
+except ImportError:  # not on Unix
+    resource = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class PageBudgetExceeded(Exception):
+    def __init__(self, resource_name: str, limit: str):
+        super().__init__("%s limit (%s) exceeded" % (resource_name, limit))
+        self.resource_name = resource_name
+        self.limit = limit
+
+
+@attr.s(frozen=True)
+class PageBudget:
+    """Limits of resources to convert a page.
+
+    CPU time is limited by the profiling timer (`ITIMER_PROF`), and memory by the address
+    space limit (`RLIMIT_AS`) above the current usage. Both are available only on Unix and
+    only in the main thread.
+    """
+
+    cpu_time: Optional[float] = attr.ib(default=None)  # seconds
+    memory: Optional[int] = attr.ib(default=None)  # bytes
+    raw_fallback: bool = attr.ib(default=False)  # output raw source of pages over the budget
+
+
+@attr.define
+class PageUsage:
+    cpu_time: float = 0.0
+
+
+def _address_space_size() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _raise_cpu_time_exceeded(limit: float):
+    def handler(signum: int, frame: Any):
+        raise PageBudgetExceeded("cpu time", "%s sec" % limit)
+
+    return handler
+
+
+@contextlib.contextmanager
+def page_budget(
+    budget: PageBudget, usage: Optional[PageUsage] = None
+) -> Generator[PageUsage, None, None]:
+    """Enforce the budget on the code in the context.
+
+    Raises PageBudgetExceeded if the code runs out of the budget. The resources used are
+    recorded to usage, which the caller may create beforehand to read it after the exception.
+    """
+    if usage is None:
+        usage = PageUsage()
+    enforceable = threading.current_thread() is threading.main_thread()
+    use_timer = enforceable and budget.cpu_time is not None and hasattr(signal, "setitimer")
+    old_handler = signal.getsignal(signal.SIGPROF) if use_timer else None
+    old_memory_limit: Optional[tuple[int, int]] = None
+    start = time.process_time()
+    try:
+        # arm the limits in the try block, so that they are lifted even if the timer fires
+        # before the code in the context starts
+        if use_timer:
+            assert budget.cpu_time is not None
+            signal.signal(signal.SIGPROF, _raise_cpu_time_exceeded(budget.cpu_time))
+            signal.setitimer(signal.ITIMER_PROF, budget.cpu_time)
+        if enforceable and budget.memory is not None and resource is not None:
+            current_size = _address_space_size()
+            if current_size is not None:
+                old_memory_limit = resource.getrlimit(resource.RLIMIT_AS)
+                soft_limit = current_size + budget.memory
+                if old_memory_limit[1] != resource.RLIM_INFINITY:
+                    soft_limit = min(soft_limit, old_memory_limit[1])
+                resource.setrlimit(resource.RLIMIT_AS, (soft_limit, old_memory_limit[1]))
+        yield usage
+    except MemoryError:
+        if old_memory_limit is None:
+            raise
+        raise PageBudgetExceeded("memory", "%d bytes" % budget.memory) from None
+    finally:
+        try:
+            if use_timer:
+                signal.setitimer(signal.ITIMER_PROF, 0)
+                if old_handler is not None:
+                    signal.signal(signal.SIGPROF, old_handler)
+        finally:
+            # the timer may have fired just before it is disarmed
+            if old_memory_limit is not None:
+                assert resource is not None
+                resource.setrlimit(resource.RLIMIT_AS, old_memory_limit)
+            usage.cpu_time = time.process_time() - start
@@ -0,0 +1,439 @@
+"""Command line interface shared by the converters (e.g. moin2hugo and moin2kibun).
+
+Each converter defines its command with convert_site_options, loads its own configuration
+and passes a factory of its converter to run_convert_site.
+"""
+
+import logging
+from typing import Any, Callable, Optional, TypeVar
+
+import click
+
+from moin2x import __version__
+from moin2x.attachment_store import AttachmentHashCache, AttachmentStore
+from moin2x.budget import PageBudget
+from moin2x.estimate import estimate_site
+from moin2x.history import MoinUserDirectory, convert_history
+from moin2x.moin2x import Moin2XConverter
+from moin2x.moin2x import convert_site as moin2x_convert_site
+from moin2x.moin2x import watch_site
+from moin2x.shard import Shard
+from moin2x.sink import TRANSFER_MODES, NullSink, OutputSink, TransferMode, open_sink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import DirectorySource, MoinSource, open_source
+from moin2x.utils import set_console_handlers
+from moin2x.watcher import open_watcher
+
+# (source, sink, site_index, attachment_store) -> converter
+ConverterFactory = Callable[
+    [MoinSource, OutputSink, MoinSiteIndex, Optional[AttachmentStore]], Moin2XConverter
+]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def config_logger(app_name: str, verbose: bool, debug: bool):
+    for logger_name in [app_name, "moin2x", "CSSUTILS"]:
+        app_logger = logging.getLogger(logger_name)
+        app_logger.propagate = False
+        for handler in app_logger.handlers:
+            app_logger.removeHandler(handler)
+        set_console_handlers(app_logger, verbose, debug)
+
+
+def print_version():
+    click.echo(__version__)
+
+
+def parse_shard(ctx: click.Context, param: click.Parameter, value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return Shard.parse(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def cmd_print_version(ctx: click.Context, param: click.Parameter, value: str):
+    if not value or ctx.resilient_parsing:
+        return
+    print_version()
+    ctx.exit()
+
+
+# arguments and options of the convert_site command in the order of help
+_CONVERT_SITE_PARAMS: list[Callable[[Any], Any]] = [
+    click.argument("src", type=click.Path(exists=True)),
+    click.argument("dst", type=click.Path()),
+    click.option(
+        "--pagename",
+        "-p",
+        "pagename",
+        metavar="PAGENAME",
+        help="Pagename to be converted (glob pattern like 'Team/*' is also accepted)",
+        default=None,
+    ),
+    click.option(
+        "--jobs",
+        "-j",
+        "jobs",
+        metavar="N",
+        help="Number of worker processes to convert pages in parallel",
+        type=click.IntRange(min=1),
+        default=1,
+    ),
+    click.option(
+        "--scan-workers",
+        "scan_workers",
+        metavar="N",
+        help="Number of threads to scan page metadata (for network filesystems)",
+        type=click.IntRange(min=1),
+        default=1,
+    ),
+    click.option(
+        "--index-file",
+        "index_file",
+        metavar="PATH",
+        help="SQLite file to keep site index between runs",
+        type=click.Path(dir_okay=False),
+        default=None,
+    ),
+    click.option(
+        "--shard",
+        "shard",
+        metavar="I/N",
+        help="Convert only I-th of N shards of pages (e.g. 2/4), split by hash of pagename",
+        type=str,
+        default=None,
+        callback=parse_shard,
+    ),
+    click.option(
+        "--site-structure",
+        "site_structure",
+        metavar="PATH",
+        help="Load site structure saved by --export-site-structure instead of scanning SRC",
+        type=click.Path(exists=True, dir_okay=False),
+        default=None,
+    ),
+    click.option(
+        "--export-site-structure",
+        "export_site_structure",
+        metavar="PATH",
+        help="Save scanned site structure into PATH (e.g. for --shard) and exit",
+        type=click.Path(dir_okay=False),
+        default=None,
+    ),
+    click.option(
+        "--incremental",
+        "-i",
+        "incremental",
+        help="Convert only changed pages since the last run",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--resume",
+        "resume",
+        help="Resume the conversion interrupted in the previous run (skip pages already done)",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--watch",
+        "-w",
+        "watch",
+        help="Keep watching SRC directory and reconvert changed pages (implies --incremental)",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--watch-interval",
+        "watch_interval",
+        metavar="SECONDS",
+        help="Polling interval of --watch where inotify is not available",
+        type=click.FloatRange(min=0.1),
+        default=2.0,
+        show_default=True,
+    ),
+    click.option(
+        "--attachment-transfer",
+        "attachment_transfer",
+        metavar="MODE",
+        help="How to transfer attachments into output directory (copy, hardlink or reflink)",
+        type=click.Choice(TRANSFER_MODES),
+        default="copy",
+        show_default=True,
+    ),
+    click.option(
+        "--verify-attachment-hash",
+        "verify_attachment_hash",
+        help="Compare contents (not size and mtime) to skip identical attachments",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--dedup-attachments",
+        "dedup_attachments",
+        help="Store identical attachments once in shared directory and refer them from pages",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--attachment-hash-cache",
+        "attachment_hash_cache",
+        metavar="PATH",
+        help="JSON file to keep attachment hashes between runs (with --dedup-attachments)",
+        type=click.Path(dir_okay=False),
+        default=None,
+    ),
+    click.option(
+        "--changes-file",
+        "changes_file",
+        metavar="PATH",
+        help="JSON file to write output paths added, modified and deleted by this run",
+        type=click.Path(dir_okay=False),
+        default=None,
+    ),
+    click.option(
+        "--page-time-limit",
+        "page_time_limit",
+        metavar="SECONDS",
+        help="Abort conversion of a page using more CPU time than this",
+        type=click.FloatRange(min=0, min_open=True),
+        default=None,
+    ),
+    click.option(
+        "--page-memory-limit",
+        "page_memory_limit",
+        metavar="MB",
+        help="Abort conversion of a page allocating more memory than this",
+        type=click.IntRange(min=1),
+        default=None,
+    ),
+    click.option(
+        "--raw-fallback",
+        "raw_fallback",
+        help="Output source text of pages aborted by the limits as code block",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--history",
+        "history",
+        help="Convert all revisions into git fast-import stream written to DST",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--history-ref",
+        "history_ref",
+        metavar="REF",
+        help="Branch to commit revisions with --history",
+        type=str,
+        default="refs/heads/main",
+        show_default=True,
+    ),
+    click.option(
+        "--history-prefix",
+        "history_prefix",
+        metavar="PATH",
+        help="Directory to put converted pages in the repository with --history (e.g. content)",
+        type=str,
+        default="",
+    ),
+    click.option(
+        "--user-dir",
+        "user_dir",
+        metavar="PATH",
+        help="MoinMoin user directory to find names of authors with --history [default: SRC/../user]",
+        type=click.Path(exists=True, file_okay=False),
+        default=None,
+    ),
+    click.option(
+        "--estimate",
+        "estimate",
+        help="Report size of the site and projected conversion time without writing DST",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option(
+        "--estimate-samples",
+        "estimate_samples",
+        metavar="N",
+        help="Number of pages converted to calibrate the projected time with --estimate",
+        type=click.IntRange(min=1),
+        default=20,
+        show_default=True,
+    ),
+    click.option(
+        "--dry-run",
+        "dry_run",
+        help="Convert pages but discard outputs (e.g. for benchmarking)",
+        type=bool,
+        default=False,
+        is_flag=True,
+    ),
+    click.option("--config", "-c", "configfile", type=click.Path(exists=True), default=None),
+    click.option("--verbose", "-v", "verbose", type=bool, default=False, is_flag=True),
+    click.option("--debug", "-d", "debug", type=bool, default=False, is_flag=True),
+    click.option(
+        "--version",
+        "-V",
+        "version",
+        help="Show version and exit.",
+        is_flag=True,
+        callback=cmd_print_version,
+        is_eager=True,
+        expose_value=False,
+    ),
+]
+
+
+def convert_site_options(f: F) -> F:
+    """Add arguments and options of the convert_site command to f.
+
+    Besides the keyword arguments of run_convert_site, f takes configfile, verbose and debug.
+    """
+    for decorator in reversed(_CONVERT_SITE_PARAMS):
+        f = decorator(f)
+    return f
+
+
+def run_convert_site(
+    make_converter: ConverterFactory,
+    src: str,
+    dst: str,
+    pagename: Optional[str],
+    jobs: int,
+    scan_workers: int,
+    index_file: Optional[str],
+    shard: Optional[Shard],
+    site_structure: Optional[str],
+    export_site_structure: Optional[str],
+    incremental: bool,
+    resume: bool,
+    watch: bool,
+    watch_interval: float,
+    attachment_transfer: TransferMode,
+    verify_attachment_hash: bool,
+    dedup_attachments: bool,
+    attachment_hash_cache: Optional[str],
+    changes_file: Optional[str],
+    page_time_limit: Optional[float],
+    page_memory_limit: Optional[int],
+    raw_fallback: bool,
+    history: bool,
+    history_ref: str,
+    history_prefix: str,
+    user_dir: Optional[str],
+    estimate: bool,
+    estimate_samples: int,
+    dry_run: bool,
+    scan_subpages: bool = False,
+):
+    """Validate the options of the convert_site command and run it.
+
+    If scan_subpages is True, sub pages of pagename are scanned too (e.g. to decide whether
+    the page is a branch bundle or not).
+    """
+    patterns = None
+    if pagename:
+        patterns = [pagename, pagename + "/*"] if scan_subpages else [pagename]
+    budget = None
+    if raw_fallback and page_time_limit is None and page_memory_limit is None:
+        raise click.UsageError("--raw-fallback needs --page-time-limit or --page-memory-limit")
+    if page_time_limit is not None or page_memory_limit is not None:
+        budget = PageBudget(
+            cpu_time=page_time_limit,
+            memory=page_memory_limit * 1024 * 1024 if page_memory_limit is not None else None,
+            raw_fallback=raw_fallback,
+        )
+    if history and (incremental or watch or shard is not None or dedup_attachments or dry_run):
+        raise click.UsageError(
+            "--history can't be used with --incremental, --watch, --shard,"
+            " --dedup-attachments or --dry-run"
+        )
+    if watch:
+        if dry_run:
+            raise click.UsageError("--watch can't be used with --dry-run")
+        if shard is not None:
+            raise click.UsageError("--watch can't be used with --shard")
+        incremental = True
+    with open_source(src) as source:
+        if watch and not isinstance(source, DirectorySource):
+            raise click.UsageError("--watch needs pages directory as SRC")
+        if site_structure is not None:
+            site_index = MoinSiteIndex.load(site_structure, source)
+        else:
+            site_index = MoinSiteIndex.scan(
+                source, workers=scan_workers, index_file=index_file, patterns=patterns
+            )
+        if export_site_structure is not None:
+            site_index.save(export_site_structure, source)
+            return
+        if estimate:
+            converter = make_converter(source, NullSink(dst), site_index, None)
+            result = estimate_site(
+                converter,
+                site_index,
+                samples=estimate_samples,
+                index_file=index_file if site_structure is None else None,
+            )
+            click.echo(result.report(jobs=jobs))
+            return
+        if history:
+            users = MoinUserDirectory(user_dir) if user_dir else MoinUserDirectory.find(src)
+            converter = make_converter(source, NullSink(dst), site_index, None)
+            with open(dst, "wb") as stream:
+                convert_history(
+                    converter,
+                    site_index,
+                    stream,
+                    ref=history_ref,
+                    prefix=history_prefix,
+                    users=users,
+                )
+            return
+        attachment_store = None
+        if dedup_attachments:
+            attachment_store = AttachmentStore.build(
+                site_index, source, cache=AttachmentHashCache(attachment_hash_cache)
+            )
+        if dry_run:
+            sink: OutputSink = NullSink(dst)
+        else:
+            sink = open_sink(dst, transfer=attachment_transfer, verify_hash=verify_attachment_hash)
+        with sink:
+            converter = make_converter(source, sink, site_index, attachment_store)
+            moin2x_convert_site(
+                src,
+                dst,
+                converter,
+                pagename=pagename,
+                jobs=jobs,
+                incremental=incremental,
+                site_index=site_index,
+                resume=resume,
+                budget=budget,
+                shard=shard,
+                changes_file=changes_file,
+            )
+            if watch:
+                with open_watcher(src, interval=watch_interval) as watcher:
+                    watch_site(
+                        dst,
+                        converter,
+                        site_index,
+                        watcher.changes(),
+                        pagename=pagename,
+                        jobs=jobs,
+                        budget=budget,
+                    )
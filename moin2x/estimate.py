@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Optional
+
+import attr
+
+from moin2x.moin_site_scanner import MoinPageInfo
+from moin2x.site_index import MoinSiteIndex
+from moin2x.site_index_db import MoinSiteIndexDB
+from moin2x.source import MoinSource
+
+if TYPE_CHECKING:
+    from moin2x.moin2x import Moin2XConverter
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(frozen=True)
+class PageSize:
+    name: str = attr.ib()
+    current_bytes: int = attr.ib()  # size of the current revision
+    revisions: int = attr.ib()
+    revision_bytes: int = attr.ib()  # total size of all revisions
+
+
+@attr.define
+class SiteEstimate:
+    """Size of the site and projected time to convert it."""
+
+    pages: list[PageSize] = attr.ib(factory=list)
+    attachments: int = 0
+    attachment_bytes: int = 0
+    sampled_pages: int = 0
+    sampled_bytes: int = 0
+    sampled_seconds: float = 0.0
+
+    @property
+    def current_bytes(self) -> int:
+        return sum([p.current_bytes for p in self.pages])
+
+    @property
+    def revisions(self) -> int:
+        return sum([p.revisions for p in self.pages])
+
+    @property
+    def revision_bytes(self) -> int:
+        return sum([p.revision_bytes for p in self.pages])
+
+    def largest_pages(self, n: int = 10) -> list[PageSize]:
+        return sorted(self.pages, key=lambda p: (-p.current_bytes, p.name))[:n]
+
+    @property
+    def projected_seconds(self) -> float:
+        """Conversion time of all pages, assuming it is proportional to the page size."""
+        if self.sampled_pages == 0:
+            return 0.0
+        if self.sampled_bytes == 0:
+            return self.sampled_seconds / self.sampled_pages * len(self.pages)
+        return self.sampled_seconds / self.sampled_bytes * self.current_bytes
+
+    def report(self, jobs: int = 1, largest: int = 10) -> str:
+        lines = [
+            "pages: %d" % len(self.pages),
+            "revisions: %d (%s)" % (self.revisions, _format_bytes(self.revision_bytes)),
+            "current revisions: %s" % _format_bytes(self.current_bytes),
+            "attachments: %d (%s)" % (self.attachments, _format_bytes(self.attachment_bytes)),
+            "largest pages:",
+        ]
+        for page in self.largest_pages(largest):
+            lines.append("  %s: %s" % (page.name, _format_bytes(page.current_bytes)))
+        lines.append(
+            "sampled conversion: %d pages (%s) in %.2f sec"
+            % (self.sampled_pages, _format_bytes(self.sampled_bytes), self.sampled_seconds)
+        )
+        projected = "projected conversion time: %s" % _format_seconds(self.projected_seconds)
+        if jobs > 1:
+            projected += " (%s with %d jobs)" % (
+                _format_seconds(self.projected_seconds / jobs),
+                jobs,
+            )
+        lines.append(projected)
+        return "\n".join(lines)
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    return ("%d %s" if unit == "B" else "%.1f %s") % (size, unit)
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
+
+
+def _page_size(source: MoinSource, page: MoinPageInfo) -> PageSize:
+    revisions_dir = os.path.dirname(page.filepath)
+    revisions = 0
+    revision_bytes = 0
+    for name in source.listdir(revisions_dir):
+        path = os.path.join(revisions_dir, name)
+        if not source.isfile(path):
+            continue
+        revisions += 1
+        revision_bytes += source.stat(path).size
+    return PageSize(
+        name=page.name,
+        current_bytes=source.stat(page.filepath).size,
+        revisions=revisions,
+        revision_bytes=revision_bytes,
+    )
+
+
+def _indexed_page_size(page: MoinPageInfo, revision_sizes: dict[str, int]) -> PageSize:
+    return PageSize(
+        name=page.name,
+        current_bytes=revision_sizes.get(os.path.basename(page.filepath), 0),
+        revisions=len(revision_sizes),
+        revision_bytes=sum(revision_sizes.values()),
+    )
+
+
+def estimate_site(
+    converter: Moin2XConverter,
+    site_index: MoinSiteIndex,
+    samples: int = 20,
+    seed: int = 0,
+    index_file: Optional[str] = None,
+) -> SiteEstimate:
+    """Measure the size of the site from metadata and convert sampled pages to calibrate.
+
+    If index_file (refreshed by MoinSiteIndex.scan) is given, sizes of revisions and
+    attachments are read from it instead of the pages directory.
+    Only sampled pages are converted (into the sink of the converter, e.g. NullSink).
+    """
+    source = converter.source
+    logger.info("+ Estimate Site: %d pages" % len(site_index))
+    revision_sizes: dict[str, dict[str, int]] = {}
+    attachment_stats: dict[str, dict[str, tuple[int, int]]] = {}
+    if index_file is not None:
+        with MoinSiteIndexDB(index_file, source) as index_db:
+            revision_sizes = index_db.revision_sizes()
+            attachment_stats = index_db.attachment_stats()
+    estimate = SiteEstimate()
+    sizes: dict[str, PageSize] = {}
+    for page in site_index:
+        if page.name in revision_sizes:
+            sizes[page.name] = _indexed_page_size(page, revision_sizes[page.name])
+        else:
+            sizes[page.name] = _page_size(source, page)
+        estimate.pages.append(sizes[page.name])
+        for attachment in page.attachments:
+            estimate.attachments += 1
+            stats = attachment_stats.get(page.name, {}).get(attachment.name)
+            if stats is not None:
+                estimate.attachment_bytes += stats[0]
+            elif attachment.size is not None:
+                estimate.attachment_bytes += attachment.size
+            else:
+                estimate.attachment_bytes += source.stat(attachment.filepath).size
+
+    pages = list(site_index)
+    sampled = random.Random(seed).sample(pages, min(samples, len(pages)))
+    for page in sampled:
+        logger.info("+ Convert Sample Page: %s" % page.name)
+        start = time.perf_counter()
+        try:
+            converter.convert_page(page)
+        except AssertionError as e:
+            logger.error("fail to convert: %s." % page.name)
+            logger.exception(e)
+            continue
+        estimate.sampled_seconds += time.perf_counter() - start
+        estimate.sampled_pages += 1
+        estimate.sampled_bytes += sizes[page.name].current_bytes
+    return estimate
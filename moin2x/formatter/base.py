@@ -1,6 +1,6 @@
 import logging
 from abc import ABCMeta, abstractmethod
-from typing import Any, Callable, Optional, Type
+from typing import Any, Callable, Hashable, Optional, Type
 
 from moin2x.moin_parser_extensions import get_fallback_parser, get_parser
 from moin2x.page_tree import (
@@ -51,7 +51,14 @@ from moin2x.page_tree import (
 logger = logging.getLogger(__name__)
 
 
+# formatted top-level blocks of a page keyed by their structure and the preceding output
+BlockCache = dict[Hashable, str]
+
+
 class FormatterBase(metaclass=ABCMeta):
+    # blocks formatted last time, which are reused for the same page (e.g. its next revision)
+    block_cache: Optional[BlockCache] = None
+
     @abstractmethod
     def __init__(
         self,
@@ -69,8 +76,10 @@ class FormatterBase(metaclass=ABCMeta):
         config: Optional[Any] = None,
         pagename: Optional[str] = None,
         path_builder: Optional[Any] = None,
+        block_cache: Optional[BlockCache] = None,
     ) -> str:
         formatter = cls(config=config, pagename=pagename, path_builder=path_builder)
+        formatter.block_cache = block_cache
         return formatter.do_format(e)
 
     def do_format(self, e: PageElement) -> str:
@@ -10,7 +10,7 @@ from typing import Callable, Dict, Optional
 import attr
 
 import moin2x.moinutils as wikiutils
-from moin2x.formatter.base import FormatterBase
+from moin2x.formatter.base import BlockCache, FormatterBase
 from moin2x.formatter.utils.markdown import (
     MarkdownEscapedText,
     adjust_surrounding_space_of_asterisk_text,
@@ -197,8 +197,38 @@ class MarkdownFormatter(FormatterBase):
     def page_root(self, e: PageRoot) -> str:
         logger.debug("+ Consolidate page structure...")
         new_e = self._consolidate(e)
+        assert isinstance(new_e, PageRoot)
         logger.debug("+ Format page...")
-        return self.format_children(new_e)
+        if self.block_cache is None:
+            return self.format_children(new_e)
+        return self._format_blocks(new_e, self.block_cache)
+
+    def _format_blocks(self, e: PageRoot, block_cache: BlockCache) -> str:
+        """Format top-level blocks reusing the cached outputs of the same blocks.
+
+        A top-level block is formatted depending only on itself and the last line of the
+        preceding block (see _newline_if_needed), so both of them make the cache key.
+        """
+        ret = ""
+        blocks: BlockCache = {}
+        prev: Optional[PageElement] = None
+        for c in e.children:
+            prev_lastline = ""
+            if prev is not None:
+                prev_lines = self.do_format(prev).splitlines(keepends=True)
+                prev_lastline = prev_lines[-1] if prev_lines else ""
+            key = (c.structure_key, type(prev).__name__, prev_lastline)
+            formatted = block_cache.get(key)
+            if formatted is None:
+                formatted = self.do_format(c)
+            else:
+                self._formatted[id(c)] = formatted
+            blocks[key] = formatted
+            ret += formatted
+            prev = c
+        block_cache.clear()
+        block_cache.update(blocks)
+        return ret
 
     def raw(self, e: Raw) -> str:
         return self.escape(e.content, in_html=self._is_in_raw_html(e))
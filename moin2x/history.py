@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from typing import IO, TYPE_CHECKING, Iterator, Optional
+
+import attr
+
+from moin2x.moin_site_scanner import MoinEditLogEntry, MoinPageInfo
+from moin2x.revision_cache import RevisionCache
+from moin2x.sink import BufferSink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import MoinSource
+
+if TYPE_CHECKING:
+    from moin2x.moin2x import Moin2XConverter
+
+logger = logging.getLogger(__name__)
+
+# revision number of edit-log entries for attachments (ATTNEW, ATTDEL, ATTDRW)
+ATTACHMENT_REVISION = "99999999"
+
+
+@attr.s(frozen=True)
+class RevisionEvent:
+    """A saved revision of page in edit-log."""
+
+    page: MoinPageInfo = attr.ib()  # page info pointing the revision file
+    edit: MoinEditLogEntry = attr.ib()
+    hostname: str = attr.ib(default="")
+    comment: str = attr.ib(default="")
+    deleted: bool = attr.ib(default=False)
+
+
+def read_revision_events(source: MoinSource, page: MoinPageInfo) -> Iterator[RevisionEvent]:
+    """Read saved revisions of the page from its edit-log."""
+    page_dir = os.path.dirname(os.path.dirname(page.filepath))
+    with source.open(os.path.join(page_dir, "edit-log")) as f:
+        lines = f.read().decode("utf-8", errors="replace").splitlines()
+    for line in lines:
+        if not line.strip():
+            continue
+        # timestamp, revision, action, pagename, addr, hostname, userid, extra, comment
+        fields = line.split("\t")
+        edit = MoinEditLogEntry.from_line(line)
+        if not edit.action.startswith("SAVE") or edit.revision == ATTACHMENT_REVISION:
+            continue
+        revision_file = os.path.join(page_dir, "revisions", edit.revision)
+        deleted = edit.action.endswith("DELETE") or not source.isfile(revision_file)
+        yield RevisionEvent(
+            page=attr.evolve(page, filepath=revision_file, updated=edit.timestamp, last_edit=edit),
+            edit=edit,
+            hostname=fields[5] if len(fields) > 5 else "",
+            comment=fields[8] if len(fields) > 8 else "",
+            deleted=deleted,
+        )
+
+
+class MoinUserDirectory(object):
+    """Names and emails of users in MoinMoin user directory (e.g. yourwiki/data/user)."""
+
+    def __init__(self, user_dir: Optional[str] = None):
+        self.user_dir = user_dir
+        self._users: dict[str, tuple[str, str]] = {}
+
+    @classmethod
+    def find(cls, page_dir: str) -> MoinUserDirectory:
+        """Return user directory next to the pages directory if it exists."""
+        user_dir = os.path.join(os.path.dirname(os.path.normpath(page_dir)), "user")
+        return cls(user_dir if os.path.isdir(user_dir) else None)
+
+    def lookup(self, user_id: str) -> Optional[tuple[str, str]]:
+        if self.user_dir is None:
+            return None
+        if user_id not in self._users:
+            name, email = "", ""
+            try:
+                with open(os.path.join(self.user_dir, user_id), "r", errors="replace") as f:
+                    for line in f:
+                        key, _, value = line.rstrip("\r\n").partition("=")
+                        if key == "name":
+                            name = value
+                        elif key == "email":
+                            email = value
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+            self._users[user_id] = (name, email)
+        name, email = self._users[user_id]
+        return (name, email) if name else None
+
+    def author(self, event: RevisionEvent) -> str:
+        """Return git author identity (`Name <email>`) of the event."""
+        name, email = "", ""
+        if event.edit.author_id:
+            name, email = self.lookup(event.edit.author_id) or (event.edit.author_id, "")
+        else:
+            name = event.hostname or "Anonymous"
+        # angle brackets and newlines are not allowed in identity
+        name = name.translate(str.maketrans("", "", "<>\n"))
+        email = email.translate(str.maketrans("", "", "<>\n"))
+        return "%s <%s>" % (name, email)
+
+
+class FastImportWriter(object):
+    """Write git fast-import stream.
+
+    Identical contents are written once as a blob and referred by its mark.
+    """
+
+    def __init__(self, stream: IO[bytes]):
+        self.stream = stream
+        self._next_mark = 1
+        self._blob_marks: dict[bytes, int] = {}
+        self.blobs = 0
+        self.commits = 0
+        self.stream.write(b"feature done\n")
+
+    def _mark(self) -> int:
+        mark = self._next_mark
+        self._next_mark += 1
+        return mark
+
+    def _data(self, data: bytes):
+        self.stream.write(b"data %d\n" % len(data))
+        self.stream.write(data)
+        self.stream.write(b"\n")
+
+    def blob(self, data: bytes) -> int:
+        digest = hashlib.sha1(data).digest()
+        mark = self._blob_marks.get(digest)
+        if mark is not None:
+            return mark
+        mark = self._mark()
+        self.stream.write(b"blob\nmark :%d\n" % mark)
+        self._data(data)
+        self._blob_marks[digest] = mark
+        self.blobs += 1
+        return mark
+
+    def commit(
+        self,
+        ref: str,
+        author: str,
+        timestamp: int,
+        message: str,
+        modified: dict[str, int],
+        deleted: list[str],
+    ):
+        """Commit files modified (path -> blob mark) and deleted onto the ref."""
+        ident = ("%s %d +0000" % (author, timestamp)).encode("utf-8")
+        self.stream.write(b"commit %s\nmark :%d\n" % (ref.encode("utf-8"), self._mark()))
+        self.stream.write(b"author %s\ncommitter %s\n" % (ident, ident))
+        self._data(message.encode("utf-8"))
+        for path in deleted:
+            self.stream.write(b"D %s\n" % _quote_path(path))
+        for path, mark in modified.items():
+            self.stream.write(b"M 100644 :%d %s\n" % (mark, _quote_path(path)))
+        self.stream.write(b"\n")
+        self.commits += 1
+
+    def close(self):
+        self.stream.write(b"done\n")
+        self.stream.flush()
+
+
+def _quote_path(path: str) -> bytes:
+    if path.startswith('"') or "\n" in path:
+        escaped = path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return ('"%s"' % escaped).encode("utf-8")
+    return path.encode("utf-8")
+
+
+def _commit_message(event: RevisionEvent) -> str:
+    pagename = event.page.name
+    if event.deleted:
+        message = "Delete %s" % pagename
+    elif event.edit.action == "SAVENEW":
+        message = "Create %s" % pagename
+    elif event.edit.action == "SAVE/REVERT":
+        message = "Revert %s" % pagename
+    elif event.edit.action == "SAVE/RENAME":
+        message = "Rename to %s" % pagename
+    else:
+        message = "Update %s" % pagename
+    message += " (revision %s)\n" % event.edit.revision
+    if event.comment:
+        message += "\n%s\n" % event.comment
+    return message
+
+
+def convert_history(
+    converter: Moin2XConverter,
+    site_index: MoinSiteIndex,
+    stream: IO[bytes],
+    ref: str = "refs/heads/main",
+    prefix: str = "",
+    users: Optional[MoinUserDirectory] = None,
+):
+    """Convert all saved revisions of pages into git fast-import stream.
+
+    Revisions are converted and committed one by one in the order of edit-log over the site,
+    with authors and timestamps of edit-log. Outputs are placed under prefix in the tree.
+    The site structure (e.g. leaf or branch bundles) and attachments are the current ones,
+    since MoinMoin doesn't keep history of them.
+    """
+    if users is None:
+        users = MoinUserDirectory()
+    if prefix.strip("/"):
+        prefix = prefix.strip("/") + "/"
+    events: list[RevisionEvent] = []
+    for page in site_index:
+        events.extend(read_revision_events(converter.source, page))
+    events.sort(key=lambda e: (e.edit.timestamp, e.page.name, e.edit.revision))
+    logger.info("+ Convert %d revisions of %d pages" % (len(events), len(site_index)))
+
+    writer = FastImportWriter(stream)
+    output_sink = converter.sink
+    buffer = BufferSink(output_sink.root)
+    converter.sink = buffer
+    cache = RevisionCache()
+    tree: dict[str, int] = {}  # path -> blob mark
+    page_outputs: dict[str, set[str]] = {}
+    attachment_marks: dict[str, int] = {}  # attachments are read once
+    try:
+        for event in events:
+            page = event.page
+            logger.info("+ Convert Revision: %s (%s)" % (page.name, event.edit.revision))
+            outputs: dict[str, int] = {}
+            if not event.deleted:
+                try:
+                    converter.convert_revision(page, cache)
+                except AssertionError as e:
+                    logger.error("fail to convert: %s." % page.name)
+                    logger.exception(e)
+                    buffer.pop_ops()
+                    continue
+                for op, path, arg in buffer.pop_ops():
+                    if op == "text":
+                        outputs[prefix + path] = writer.blob(arg.encode("utf-8"))
+                        continue
+                    if arg not in attachment_marks:
+                        with converter.source.open(arg) as f:
+                            attachment_marks[arg] = writer.blob(f.read())
+                    outputs[prefix + path] = attachment_marks[arg]
+
+            old_paths = page_outputs.pop(page.name, set())
+            page_outputs[page.name] = set(outputs)
+            deleted = sorted(old_paths - set(outputs))
+            modified = dict([(p, m) for p, m in sorted(outputs.items()) if tree.get(p) != m])
+            for path in deleted:
+                tree.pop(path, None)
+            tree.update(modified)
+            writer.commit(
+                ref,
+                author=users.author(event),
+                timestamp=int(event.edit.timestamp.timestamp()),
+                message=_commit_message(event),
+                modified=modified,
+                deleted=deleted,
+            )
+    finally:
+        converter.sink = output_sink
+    writer.close()
+    logger.info("+ Wrote %d commits with %d blobs" % (writer.commits, writer.blobs))
+    logger.info("+ Reused conversions of %d identical revisions" % cache.hits)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import IO, Any, Optional
+
+from moin2x.utils import file_sha256, safe_path_join
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILENAME = ".moin2x-journal.jsonl"
+JOURNAL_VERSION = 1
+
+
+def file_checksum(filepath: str) -> str:
+    with open(filepath, "rb") as f:
+        return file_sha256(f).hex()
+
+
+def output_checksums(root: str, outputs: list[str]) -> dict[str, str]:
+    """Return checksums of output files by their paths relative to root."""
+    return dict([(output, file_checksum(safe_path_join(root, output))) for output in outputs])
+
+
+class ConversionJournal(object):
+    """Append-only record of pages converted into the output directory.
+
+    Each line is a JSON object of a completed page and checksums of its outputs, written
+    as soon as the page is done, so that an interrupted conversion can be resumed.
+    A line cut by the interruption is ignored.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.journal_file = os.path.join(root, JOURNAL_FILENAME)
+        self._file: Optional[IO[str]] = None
+
+    def completed(self) -> dict[str, list[str]]:
+        """Return outputs of pages recorded in the journal and still intact."""
+        entries: dict[str, dict[str, str]] = {}
+        try:
+            with open(self.journal_file, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return {}
+        for i, line in enumerate(lines):
+            try:
+                data: dict[str, Any] = json.loads(line)
+            except ValueError:
+                logger.debug("++ ignore broken journal line: %d" % (i + 1))
+                continue
+            if i == 0:
+                if data.get("version") != JOURNAL_VERSION:
+                    logger.warning("unsupported journal version: %s" % data.get("version"))
+                    return {}
+                continue
+            entries[data["page"]] = data["outputs"]
+
+        ret: dict[str, list[str]] = {}
+        for pagename, checksums in entries.items():
+            try:
+                intact = output_checksums(self.root, list(checksums)) == checksums
+            except FileNotFoundError:
+                intact = False
+            if intact:
+                ret[pagename] = sorted(checksums)
+            else:
+                logger.debug("++ outputs changed since recorded: %s" % pagename)
+        return ret
+
+    def record(self, pagename: str, checksums: dict[str, str]):
+        if self._file is None:
+            size = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+            self._file = open(self.journal_file, "a")
+            if size == 0:
+                self._write({"version": JOURNAL_VERSION})
+            else:
+                # terminate the line possibly cut by the interruption
+                self._file.write("\n")
+        self._write({"page": pagename, "outputs": checksums})
+
+    def _write(self, data: dict[str, Any]):
+        assert self._file is not None
+        self._file.write(json.dumps(data, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.journal_file)
+        except FileNotFoundError:
+            pass
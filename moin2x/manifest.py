@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any, Optional
+
+import attr
+
+from moin2x.moin_site_scanner import MoinPageInfo
+from moin2x.utils import safe_path_join
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = ".moin2x-manifest.json"
+MANIFEST_VERSION = 1
+# prefix of files kept by moin2x in the output directory (manifest, journal, etc.)
+METADATA_PREFIX = ".moin2x-"
+
+OutputSnapshot = dict[str, tuple[int, int]]  # path -> (size, mtime_ns)
+
+
+@attr.define
+class PageRecord:
+    """Inputs and outputs of a converted page."""
+
+    revision: str = attr.ib()
+    updated: Optional[str] = attr.ib()
+    attachments: dict[str, list[int]] = attr.ib()
+    page_output_path: str = attr.ib()
+    outputs: list[str] = attr.ib(factory=list)
+
+    @classmethod
+    def from_page(cls, page: MoinPageInfo, page_output_path: str) -> PageRecord:
+        attachments: dict[str, list[int]] = {}
+        for attachment in page.attachments:
+            if attachment.size is None or attachment.mtime_ns is None:
+                st = os.stat(attachment.filepath)
+                attachments[attachment.name] = [st.st_size, st.st_mtime_ns]
+            else:
+                attachments[attachment.name] = [attachment.size, attachment.mtime_ns]
+        return cls(
+            revision=os.path.basename(page.filepath),
+            updated=page.updated.isoformat() if page.updated else None,
+            attachments=attachments,
+            page_output_path=page_output_path,
+        )
+
+    def has_same_inputs(self, other: PageRecord) -> bool:
+        return (
+            self.revision == other.revision
+            and self.updated == other.updated
+            and self.attachments == other.attachments
+            and self.page_output_path == other.page_output_path
+        )
+
+    def mark_failed(self) -> PageRecord:
+        """Keep outputs but make this record never match the inputs."""
+        return attr.evolve(self, revision="")
+
+
+@attr.define
+class SiteManifest:
+    """Record of converted pages stored in the output directory."""
+
+    pages: dict[str, PageRecord] = attr.ib(factory=dict)
+    # outputs not owned by a page (e.g. attachment store)
+    shared_outputs: list[str] = attr.ib(factory=list)
+
+    @property
+    def outputs(self) -> set[str]:
+        ret: set[str] = set(self.shared_outputs)
+        for record in self.pages.values():
+            ret.update(record.outputs)
+        return ret
+
+    @classmethod
+    def load(cls, dst_dir: str) -> Optional[SiteManifest]:
+        manifest_file = os.path.join(dst_dir, MANIFEST_FILENAME)
+        try:
+            with open(manifest_file, "r") as f:
+                data: dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning("broken manifest file: %s" % manifest_file)
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning("unsupported manifest version: %s" % data.get("version"))
+            return None
+        try:
+            pages = dict(
+                [(name, PageRecord(**record)) for name, record in data.get("pages", {}).items()]
+            )
+        except (TypeError, KeyError, AttributeError):
+            # records with missing or unexpected keys (e.g. edited by hand)
+            logger.warning("broken manifest file: %s" % manifest_file)
+            return None
+        return cls(pages=pages, shared_outputs=data.get("shared_outputs", []))
+
+    def save(self, dst_dir: str):
+        manifest_file = os.path.join(dst_dir, MANIFEST_FILENAME)
+        data = {
+            "version": MANIFEST_VERSION,
+            "pages": dict(
+                [(name, attr.asdict(record)) for name, record in sorted(self.pages.items())]
+            ),
+            "shared_outputs": sorted(self.shared_outputs),
+        }
+        tmp_file = manifest_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_file, manifest_file)
+
+
+def remove_outputs(dst_dir: str, outputs: set[str]):
+    """Remove output files and directories which get empty."""
+    dirs: set[str] = set()
+    for output in sorted(outputs):
+        filepath = safe_path_join(dst_dir, output)
+        logger.info("++ remove: %s" % filepath)
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+        dirpath = os.path.dirname(output)
+        while dirpath:
+            dirs.add(dirpath)
+            dirpath = os.path.dirname(dirpath)
+
+    # remove deeper directories first
+    for dirpath in sorted(dirs, key=lambda d: d.count("/"), reverse=True):
+        try:
+            os.rmdir(safe_path_join(dst_dir, dirpath))
+        except OSError:
+            pass
+
+
+def snapshot_outputs(dst_dir: str) -> OutputSnapshot:
+    """Return size and mtime of files in the output directory, except moin2x metadata."""
+    snapshot: OutputSnapshot = {}
+    for dirpath, _dirnames, filenames in os.walk(dst_dir):
+        reldir = os.path.relpath(dirpath, dst_dir)
+        for filename in filenames:
+            if reldir == "." and filename.startswith(METADATA_PREFIX):
+                continue
+            relpath = filename if reldir == "." else os.path.join(reldir, filename)
+            st = os.stat(os.path.join(dirpath, filename))
+            snapshot[relpath.replace(os.sep, "/")] = (st.st_size, st.st_mtime_ns)
+    return snapshot
+
+
+@attr.define
+class ChangeManifest:
+    """Output paths added, modified and deleted by a run (e.g. for deployment)."""
+
+    added: list[str] = attr.ib(factory=list)
+    modified: list[str] = attr.ib(factory=list)
+    deleted: list[str] = attr.ib(factory=list)
+
+    @classmethod
+    def compare(cls, old: OutputSnapshot, new: OutputSnapshot) -> ChangeManifest:
+        """Compare snapshots by size and mtime, like rsync does by default."""
+        return cls(
+            added=sorted(set(new) - set(old)),
+            modified=sorted([path for path in set(new) & set(old) if new[path] != old[path]]),
+            deleted=sorted(set(old) - set(new)),
+        )
+
+    def save(self, changes_file: str):
+        tmp_file = changes_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(attr.asdict(self), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_file, changes_file)
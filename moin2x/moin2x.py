@@ -1,46 +1,519 @@
+import concurrent.futures
+import copy
 import logging
 import os
-import shutil
-from typing import Optional, Protocol
+import traceback
+from typing import Iterable, Iterator, Optional, Protocol, Tuple
 
-from moin2x.moin_site_scanner import MoinPageInfo, MoinSiteScanner
+import attr
+
+from moin2x.budget import PageBudget, PageBudgetExceeded, PageUsage, page_budget
+from moin2x.journal import JOURNAL_FILENAME, ConversionJournal, output_checksums
+from moin2x.manifest import (
+    ChangeManifest,
+    PageRecord,
+    SiteManifest,
+    remove_outputs,
+    snapshot_outputs,
+)
+from moin2x.moin_site_scanner import (
+    MoinPageInfo,
+    MoinSiteScanner,
+    has_glob_magic,
+    match_pagename,
+)
+from moin2x.moinutils import unquoteWikiname
+from moin2x.revision_cache import RevisionCache
+from moin2x.shard import Shard
+from moin2x.sink import (
+    BufferSink,
+    DirectorySink,
+    OutputSink,
+    SinkOp,
+    TransferStats,
+    replay_ops,
+)
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import MoinSource
+from moin2x.staging import (
+    create_staging_dir,
+    find_staging_dir,
+    leftover_dirs,
+    remove_in_background,
+    swap_into_place,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class Moin2XConverter(Protocol):
-    def convert_page(self, page: MoinPageInfo):
+    sink: OutputSink
+
+    @property
+    def source(self) -> MoinSource: ...
+
+    def page_output_path(self, pagename: str) -> str:
+        """Return the path of converted page file relative to the root of sink."""
+        ...
+
+    def convert_page(self, page: MoinPageInfo) -> list[str]:
+        """Convert page into the sink and return output paths relative to its root."""
+        ...
+
+    def convert_page_raw(self, page: MoinPageInfo) -> list[str]:
+        """Convert page into its source text as it is (e.g. if convert_page is too heavy)."""
+        ...
+
+    def convert_revision(self, page: MoinPageInfo, cache: RevisionCache) -> list[str]:
+        """Convert revision of page like convert_page, reusing conversions of other revisions."""
+        ...
+
+    def convert_attachment_store(self) -> list[str]:
+        """Write attachments shared by pages into the sink and return their output paths."""
+        ...
+
+    def update_site(self, site_index: MoinSiteIndex, pagenames: set[str]) -> set[str]:
+        """Follow changed pages and return other pages whose outputs are affected by them."""
         ...
 
 
+ConversionResult = Tuple[MoinPageInfo, Optional[list[str]]]
+
+
+def _check_dst_dir(dst_dir: str):
+    if os.path.exists(dst_dir) and not os.path.isdir(dst_dir):
+        raise ValueError("dst_dir must be non-existing path or directory path")
+
+
+def _target_pages(
+    site_index: MoinSiteIndex, pagename: Optional[str] = None, shard: Optional[Shard] = None
+) -> Iterator[MoinPageInfo]:
+    if shard is not None:
+        for page in _target_pages(site_index, pagename=pagename):
+            if page.name in shard:
+                yield page
+        return
+    if pagename and has_glob_magic(pagename):
+        for page in site_index:
+            if match_pagename(page.name, [pagename]):
+                yield page
+        return
+    if pagename:
+        page = site_index.get(pagename)
+        if page is not None:
+            yield page
+        return
+    yield from site_index
+
+
 def convert_site(
-    src_dir: str, dst_dir: str, converter: Moin2XConverter, pagename: Optional[str] = None
+    src_dir: str,
+    dst_dir: str,
+    converter: Moin2XConverter,
+    pagename: Optional[str] = None,
+    jobs: int = 1,
+    incremental: bool = False,
+    site_index: Optional[MoinSiteIndex] = None,
+    resume: bool = False,
+    budget: Optional[PageBudget] = None,
+    shard: Optional[Shard] = None,
+    changes_file: Optional[str] = None,
 ):
+    """Convert pages in src_dir into dst_dir.
+
+    With shard, only pages assigned to the shard are converted, and shared outputs (e.g.
+    attachment store) are written by the first shard. Give the same site_index (e.g. loaded
+    by MoinSiteIndex.load) to every shard so that they agree on the site structure.
+
+    With changes_file, output paths added, modified or deleted by this run are saved into it.
+    """
     logger.info("+ Source Moin Dir: %s" % src_dir)
     logger.info("+ Dest Dir: %s" % dst_dir)
+    if shard is not None:
+        logger.info("+ Shard: %s" % shard)
+
+    manifest = None
+    directory_output = isinstance(converter.sink, DirectorySink)
+    if incremental and not directory_output:
+        raise ValueError("incremental conversion needs output directory")
+    if changes_file is not None and not directory_output:
+        raise ValueError("changes file needs output directory")
+    if directory_output:
+        _check_dst_dir(dst_dir)
+    old_snapshot = snapshot_outputs(dst_dir) if changes_file is not None else None
+    if incremental:
+        manifest = SiteManifest.load(dst_dir)
+        if manifest is None:
+            logger.info("++ no valid manifest found: convert all pages")
 
-    if os.path.exists(dst_dir):
-        logger.info("++ destionation path exists")
-        if os.path.isdir(dst_dir):
-            logger.info("++ remove first")
-            shutil.rmtree(dst_dir)
+    # Convert whole site into staging directory and swap it with dst_dir at the end,
+    # so that dst_dir is never empty or half-written during the conversion.
+    # Completed pages are journaled in the staging directory, which is kept on failure
+    # so that the next run can resume the conversion from it.
+    output_sink = converter.sink
+    work_dir = dst_dir
+    staging_dir = None
+    leftovers: list[str] = []
+    journal = None
+    completed: dict[str, list[str]] = {}
+    if manifest is None and isinstance(output_sink, DirectorySink):
+        leftovers = leftover_dirs(dst_dir)
+        if resume:
+            staging_dir = find_staging_dir(dst_dir, JOURNAL_FILENAME)
+            if staging_dir is None:
+                logger.info("++ no interrupted conversion found: convert all pages")
+        if staging_dir is not None:
+            leftovers.remove(staging_dir)
+            logger.info("++ resume staging directory: %s" % staging_dir)
         else:
-            raise ValueError("dst_dir must be non-existing path or directory path")
+            staging_dir = create_staging_dir(dst_dir)
+            logger.info("++ staging directory: %s" % staging_dir)
+        converter.sink = output_sink.relocate(staging_dir)
+        work_dir = staging_dir
+        journal = ConversionJournal(staging_dir)
+        if resume:
+            completed = journal.completed()
+            logger.info("++ %d pages completed by the interrupted run" % len(completed))
     logger.info("")
 
-    moin_site_scanner = MoinSiteScanner(src_dir)
+    try:
+        if site_index is None:
+            site_index = MoinSiteIndex.scan(converter.source)
+        pages = _target_pages(site_index, pagename=pagename, shard=shard)
+        shared_outputs: list[str] = []
+        if shard is None or shard.is_first:
+            shared_outputs = converter.convert_attachment_store()
+        if not incremental:
+            pages = _skip_completed_pages(pages, completed)
+            for _ in _run_conversions(pages, converter, jobs, journal=journal, budget=budget):
+                pass
+        else:
+            _convert_site_incrementally(
+                pages,
+                work_dir,
+                converter,
+                manifest if manifest is not None else SiteManifest(),
+                jobs,
+                partial=bool(pagename),
+                shared_outputs=shared_outputs,
+                journal=journal,
+                completed=completed,
+                budget=budget,
+            )
+    except BaseException:
+        if staging_dir is not None:
+            logger.info("+ Keep staging directory to resume: %s" % staging_dir)
+            converter.sink = output_sink
+        raise
+    finally:
+        if journal is not None:
+            journal.close()
+
+    if staging_dir is not None:
+        assert journal is not None
+        journal.remove()
+        output_sink.stats.merge(converter.sink.stats)
+        converter.sink = output_sink
+        logger.info("+ Swap staging directory into %s" % dst_dir)
+        old_dir = swap_into_place(staging_dir, dst_dir)
+        remove_in_background(leftovers + ([old_dir] if old_dir is not None else []))
+
+    if changes_file is not None:
+        assert old_snapshot is not None
+        changes = ChangeManifest.compare(old_snapshot, snapshot_outputs(dst_dir))
+        changes.save(changes_file)
+        logger.info(
+            "+ Changes: %d added, %d modified, %d deleted (%s)"
+            % (len(changes.added), len(changes.modified), len(changes.deleted), changes_file)
+        )
+
+    stats = converter.sink.stats
+    if stats.written_pages or stats.unchanged_pages:
+        logger.info(
+            "+ Pages: %d files written, %d unchanged files kept"
+            % (stats.written_pages, stats.unchanged_pages)
+        )
+    if stats.copied_files or stats.skipped_files:
+        logger.info(
+            "+ Attachments: %d files (%d bytes) copied, %d identical files (%d bytes) skipped"
+            % (stats.copied_files, stats.copied_bytes, stats.skipped_files, stats.skipped_bytes)
+        )
+
+
+def _convert_site_incrementally(
+    pages: Iterable[MoinPageInfo],
+    dst_dir: str,
+    converter: Moin2XConverter,
+    old_manifest: SiteManifest,
+    jobs: int,
+    partial: bool = False,
+    shared_outputs: Optional[list[str]] = None,
+    removed_pages: Iterable[str] = (),
+    journal: Optional[ConversionJournal] = None,
+    completed: Optional[dict[str, list[str]]] = None,
+    budget: Optional[PageBudget] = None,
+):
+    new_manifest = SiteManifest(shared_outputs=shared_outputs or [])
+    if partial:
+        # pages not targeted in this run are kept as they are
+        new_manifest.pages.update(old_manifest.pages)
+        for name in removed_pages:
+            new_manifest.pages.pop(name, None)
+        new_manifest.shared_outputs = sorted(
+            set(old_manifest.shared_outputs) | set(new_manifest.shared_outputs)
+        )
+
+    pending_records: dict[str, PageRecord] = {}
+
+    def pages_to_convert() -> Iterator[MoinPageInfo]:
+        for page in pages:
+            record = PageRecord.from_page(page, converter.page_output_path(page.name))
+            if completed and page.name in completed:
+                logger.debug("+ Skip Completed Page: %s" % page.name)
+                record.outputs = completed[page.name]
+                new_manifest.pages[page.name] = record
+                continue
+            old_record = old_manifest.pages.get(page.name)
+            if (
+                old_record is not None
+                and old_record.has_same_inputs(record)
+                and all(os.path.exists(os.path.join(dst_dir, p)) for p in old_record.outputs)
+            ):
+                logger.debug("+ Skip Unchanged Page: %s" % page.name)
+                new_manifest.pages[page.name] = old_record
+                continue
+            pending_records[page.name] = record
+            yield page
 
-    for page in moin_site_scanner.scan_pages():
-        if pagename and page.name != pagename:
+    finished = False
+    try:
+        for page, outputs in _run_conversions(
+            pages_to_convert(), converter, jobs, journal=journal, budget=budget
+        ):
+            record = pending_records.pop(page.name)
+            if outputs is None:
+                old_record = old_manifest.pages.get(page.name)
+                if old_record is not None:
+                    new_manifest.pages[page.name] = old_record.mark_failed()
+                continue
+            record.outputs = outputs
+            new_manifest.pages[page.name] = record
+        finished = True
+    finally:
+        if not finished:
+            # keep records of pages which have not been processed yet
+            for name, old_record in old_manifest.pages.items():
+                new_manifest.pages.setdefault(name, old_record)
+        os.makedirs(dst_dir, exist_ok=True)
+        new_manifest.save(dst_dir)
+
+    stale_outputs = old_manifest.outputs - new_manifest.outputs
+    if stale_outputs:
+        logger.info("+ Remove stale outputs")
+        remove_outputs(dst_dir, stale_outputs)
+
+
+def watch_site(
+    dst_dir: str,
+    converter: Moin2XConverter,
+    site_index: MoinSiteIndex,
+    changes: Iterable[set[str]],
+    pagename: Optional[str] = None,
+    jobs: int = 1,
+    budget: Optional[PageBudget] = None,
+):
+    """Reconvert pages changed in the pages directory into the converted site.
+
+    changes yields entrynames (quoted page directory names) changed together, e.g. from
+    moin2x.watcher.SiteWatcher. Outputs are updated in place like incremental conversion.
+    """
+    if not isinstance(converter.sink, DirectorySink):
+        raise ValueError("watch mode needs output directory")
+    scanner = MoinSiteScanner(converter.source)
+    for entrynames in changes:
+        changed: dict[str, Optional[MoinPageInfo]] = {}
+        for entryname in sorted(entrynames):
+            if entryname.startswith("."):
+                continue
+            name = unquoteWikiname(entryname)
+            if pagename and not match_pagename(name, [pagename, pagename + "/*"]):
+                continue
+            changed[name] = scanner.scan_entry(entryname)
+        if not changed:
             continue
+        logger.info("+ Detect Changes: %s" % ", ".join(sorted(changed)))
+
+        site_index = site_index.updated(changed)
+        affected = converter.update_site(site_index, set(changed))
+        pages = [site_index.get(name) for name in sorted(set(changed) | affected)]
+        manifest = SiteManifest.load(dst_dir)
+        _convert_site_incrementally(
+            [page for page in pages if page is not None],
+            dst_dir,
+            converter,
+            manifest if manifest is not None else SiteManifest(),
+            jobs,
+            partial=True,
+            removed_pages=[name for name, page in changed.items() if page is None],
+            budget=budget,
+        )
+        logger.info("+ Wait for Changes")
+
+
+def _run_conversions(
+    pages: Iterable[MoinPageInfo],
+    converter: Moin2XConverter,
+    jobs: int,
+    journal: Optional[ConversionJournal] = None,
+    budget: Optional[PageBudget] = None,
+) -> Iterator[ConversionResult]:
+    """Convert pages and yield output paths (or None if the conversion fails).
+
+    Successfully converted pages are recorded in the journal with checksums of their outputs.
+    """
+    if jobs > 1:
+        results = _convert_pages_parallel(pages, converter, jobs, budget)
+    else:
+        results = _convert_pages(pages, converter, budget)
+    for page, outputs in results:
+        if journal is not None and outputs is not None:
+            journal.record(page.name, output_checksums(converter.sink.root, outputs))
+        yield (page, outputs)
+
+
+def _skip_completed_pages(
+    pages: Iterable[MoinPageInfo], completed: dict[str, list[str]]
+) -> Iterator[MoinPageInfo]:
+    for page in pages:
+        if page.name in completed:
+            logger.debug("+ Skip Completed Page: %s" % page.name)
+            continue
+        yield page
+
+
+def _convert_page_within_budget(
+    converter: Moin2XConverter, page: MoinPageInfo, budget: Optional[PageBudget]
+) -> list[str]:
+    """Convert page, or fall back to its raw source if the budget allows it.
+
+    Raises PageBudgetExceeded if the conversion runs out of the budget without fallback.
+    """
+    if budget is None:
+        return converter.convert_page(page)
+    usage = PageUsage()
+    try:
+        with page_budget(budget, usage):
+            return converter.convert_page(page)
+    except PageBudgetExceeded as e:
+        content = converter.source.read_text(page.filepath)
+        logger.error(
+            "%s: %s (%d bytes, %d lines, %.2f sec cpu time used)"
+            % (e, page.name, len(content.encode("utf-8")), content.count("\n"), usage.cpu_time)
+        )
+        if not budget.raw_fallback:
+            raise
+    logger.warning("++ output raw source instead: %s" % page.name)
+    return converter.convert_page_raw(page)
+
+
+def _convert_pages(
+    pages: Iterable[MoinPageInfo], converter: Moin2XConverter, budget: Optional[PageBudget] = None
+) -> Iterator[ConversionResult]:
+    for page in pages:
         logger.info("+ Convert Page: %s" % page.name)
         try:
-            converter.convert_page(page)
-        except AssertionError as e:
+            outputs = _convert_page_within_budget(converter, page, budget)
+        except (AssertionError, PageBudgetExceeded) as e:
             logger.error("fail to convert: %s." % page.name)
             logger.exception(e)
+            yield (page, None)
             continue
         except Exception:
             logger.error("fail to convert: %s." % page.name)
             raise
         logger.info("++ done.")
+        yield (page, outputs)
+
+
+# Parallel conversion
+#
+# Each worker process holds its own converter, which is passed once through the pool
+# initializer. Converters are expected to be picklable so that the worker can rebuild them
+# (template, path builder, config) when the start method is not fork.
+#
+# If the sink can't be written by workers (e.g. archive), the worker records its writes
+# into BufferSink and the parent process replays them into the sink.
+_worker_converter: Optional[Moin2XConverter] = None
+_worker_budget: Optional[PageBudget] = None
+
+
+def _init_worker(converter: Moin2XConverter, buffered: bool, budget: Optional[PageBudget]):
+    global _worker_converter, _worker_budget
+    if buffered:
+        # keep the given converter (and the archive inherited by fork) untouched
+        converter = copy.copy(converter)
+        converter.sink = BufferSink(converter.sink.root)
+    _worker_converter = converter
+    _worker_budget = budget
+
+
+@attr.define
+class _WorkerResult:
+    outputs: Optional[list[str]]
+    error: Optional[str] = None  # formatted traceback
+    ops: list[SinkOp] = attr.ib(factory=list)  # writes buffered in the worker
+    stats: TransferStats = attr.ib(factory=TransferStats)
+
+
+def _convert_page_in_worker(page: MoinPageInfo) -> _WorkerResult:
+    """Convert a page in worker process.
+
+    Returns output paths, or formatted traceback if the conversion fails with AssertionError
+    or runs out of the budget.
+    Other exceptions are propagated to the parent process.
+    """
+    if _worker_converter is None:
+        raise RuntimeError("worker is not initialized")
+    sink = _worker_converter.sink
+    try:
+        outputs = _convert_page_within_budget(_worker_converter, page, _worker_budget)
+    except (AssertionError, PageBudgetExceeded):
+        if isinstance(sink, BufferSink):
+            sink.pop_ops()
+        return _WorkerResult(outputs=None, error=traceback.format_exc(), stats=sink.pop_stats())
+    ops = sink.pop_ops() if isinstance(sink, BufferSink) else []
+    return _WorkerResult(outputs=outputs, ops=ops, stats=sink.pop_stats())
+
+
+def _convert_pages_parallel(
+    pages: Iterable[MoinPageInfo],
+    converter: Moin2XConverter,
+    jobs: int,
+    budget: Optional[PageBudget] = None,
+) -> Iterator[ConversionResult]:
+    # sort pages so that results (and logs) come in deterministic order
+    target_pages = sorted(pages, key=lambda p: p.name)
+    logger.info("+ Convert %d pages with %d workers" % (len(target_pages), jobs))
+
+    buffered = not converter.sink.concurrent
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(converter, buffered, budget)
+    ) as executor:
+        results = executor.map(_convert_page_in_worker, target_pages)
+        for page in target_pages:
+            logger.info("+ Convert Page: %s" % page.name)
+            try:
+                result = next(results)
+                replay_ops(result.ops, converter.sink, converter.source)
+            except Exception:
+                logger.error("fail to convert: %s." % page.name)
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+            converter.sink.stats.merge(result.stats)
+            if result.error is not None:
+                logger.error("fail to convert: %s." % page.name)
+                logger.error(result.error.rstrip())
+                yield (page, None)
+                continue
+            logger.info("++ done.")
+            yield (page, result.outputs)
@@ -1,7 +1,7 @@
 import logging
 import re
 import shlex
-from typing import Optional, Tuple, TypeVar, cast
+from typing import Callable, Iterator, Mapping, Optional, Tuple, TypeVar, cast
 
 import moin2x.moin_settings as settings
 import moin2x.moinutils as wikiutil
@@ -20,6 +20,29 @@ T = TypeVar("T")
 logger = logging.getLogger(__name__)
 
 
+class MatchGroups(Mapping[str, str]):
+    """Named groups of match computed on demand, instead of match.groupdict().
+
+    Like groupdict(), groups which didn't participate in the match are None.
+    """
+
+    __slots__ = ("_match",)
+
+    def __init__(self, match: re.Match[str]):
+        self._match = match
+
+    def __getitem__(self, name: str) -> str:
+        if name not in self._match.re.groupindex:
+            raise KeyError(name)
+        return self._match.group(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._match.re.groupindex)
+
+    def __len__(self) -> int:
+        return len(self._match.re.groupindex)
+
+
 class MoinParser(object):
     CHILD_PREFIX = wikiutil.CHILD_PREFIX
     PARENT_PREFIX = wikiutil.PARENT_PREFIX
@@ -203,6 +226,8 @@ class MoinParser(object):
     %s\}\}\}\n?  # in parser/pre, we only look for the end of the parser/pre
 )
 """
+    # compiled parser_scan_rule by parser_unique (the delimiter of parser/pre sections)
+    _parser_scan_res: dict[str, re.Pattern[str]] = {}
 
     # the big, fat, less ugly one ;)
     # please be very careful: blanks and # must be escaped with \ !
@@ -347,6 +372,20 @@ class MoinParser(object):
     }
     scan_re = re.compile(scan_rules, re.UNICODE | re.VERBOSE)
 
+    # every match of scan_rules contains one of these, so lines without them are plain text
+    markup_hint_rules = r"""
+    ^\s|^=|^\#\#  # indented lines (lists etc.), headings and comments
+    |''|__|~|--|/\*|\*/|\^|,,|\{\{|`|\[\[|<<|\|\|  # inline markups, links and tables
+    |[:@<>&]  # interwiki, urls, emails and sgml
+    |[%(u)s][%(l)s]+[%(u)s]  # CamelCase
+    |(?:^|(?<=\s))(?:%(smiley)s)(?=\s|\Z)  # smileys
+""" % {
+        "u": settings.chars_upper,
+        "l": settings.chars_lower,
+        "smiley": "|".join([re.escape(s) for s in settings.smileys]),
+    }
+    markup_hint_re = re.compile(markup_hint_rules, re.UNICODE | re.VERBOSE)
+
     def __init__(
         self,
         text: str,
@@ -363,6 +402,16 @@ class MoinParser(object):
         self.page_name = page_name
         self.list_indents: list[int] = []  # holds the nesting level (in chars) of open lists
 
+    @classmethod
+    def _parser_scan_re(cls, parser_unique: str) -> re.Pattern[str]:
+        parser_scan_re = cls._parser_scan_res.get(parser_unique)
+        if parser_scan_re is None:
+            parser_scan_re = re.compile(
+                cls.parser_scan_rule % re.escape(parser_unique), re.VERBOSE | re.UNICODE
+            )
+            cls._parser_scan_res[parser_unique] = parser_scan_re
+        return parser_scan_re
+
     # Public Method ----------------------------------------------------------
     @classmethod
     def parse(
@@ -431,7 +480,10 @@ class MoinParser(object):
                     self.builder.table_end()
 
             # Scan and parse line
-            self._parse_line(line)
+            if self.builder.in_pre or self.markup_hint_re.search(line):
+                self._parse_line(line)
+            else:
+                self._plain_text(line)
 
         # Close code displays, paragraphs, tables and open lists
         self._undent()
@@ -447,10 +499,10 @@ class MoinParser(object):
         line_length = len(line)
 
         while lastpos <= line_length:
-            parser_scan_re = re.compile(
-                self.parser_scan_rule % re.escape(self.parser_unique), re.VERBOSE | re.UNICODE
-            )
-            scan_re = parser_scan_re if self.builder.in_pre else self.scan_re
+            if self.builder.in_pre:
+                scan_re = self._parser_scan_re(self.parser_unique)
+            else:
+                scan_re = self.scan_re
             match = scan_re.search(line, lastpos)
             if not match:
                 remainder = line[lastpos:]
@@ -459,16 +511,7 @@ class MoinParser(object):
                     if not (lastpos > 0 and remainder == ""):
                         self._parser_content(remainder)
                 elif remainder:
-                    if not (
-                        self.builder.in_pre
-                        or self.builder.in_p
-                        or self.builder.in_li_of_current_list
-                        or self.builder.in_dd_of_current_list
-                        or self.builder.in_table
-                        or self.builder.in_remark
-                    ):
-                        self.builder.paragraph_start()
-                    self.builder.text(remainder, source_text=remainder)
+                    self._plain_text(remainder)
                 break
 
             start = match.start()
@@ -496,142 +539,44 @@ class MoinParser(object):
                 # we matched an empty string
                 lastpos += 1  # proceed, we don't want to match this again
 
+    def _plain_text(self, text: str):
+        """Handle text without markups (the rest of line after the last match)."""
+        if not (
+            self.builder.in_p
+            or self.builder.in_li_of_current_list
+            or self.builder.in_dd_of_current_list
+            or self.builder.in_table
+            or self.builder.in_remark
+        ):
+            self.builder.paragraph_start()
+        self.builder.text(text, source_text=text)
+
     def _process_markup(self, match: re.Match[str]):
         """Replace match using type name"""
-        no_new_p_before = (
-            "heading",
-            "rule",
-            "table",
-            "tableZ",
-            "tr",
-            "td",
-            "ul",
-            "ol",
-            "dl",
-            "dt",
-            "dd",
-            "li",
-            "li_none",
-            "indent",
-            "macro",
-            "parser",
-        )
-        dispatcher = {
-            # Moinwiki Special Syntax
-            "macro": self._macro_handler,
-            "macro_name": self._macro_handler,
-            "macro_args": self._macro_handler,
-            "comment": self._comment_handler,
-            "remark": self._remark_handler,
-            "remark_on": self._remark_handler,
-            "remark_off": self._remark_handler,
-            "smiley": self._smiley_handler,
-            # Codeblock
-            "parser": self._parser_handler,
-            "parser_unique": self._parser_handler,
-            "parser_line": self._parser_handler,
-            "parser_name": self._parser_handler,
-            "parser_args": self._parser_handler,
-            "parser_nothing": self._parser_handler,
-            "parser_end": self._parser_end_handler,
-            # Table
-            "tableZ": self._tableZ_handler,
-            "table": self._table_handler,
-            # Heading / Horizontal Rule
-            "heading": self._heading_handler,
-            "heading_text": self._heading_handler,
-            "rule": self._rule_handler,
-            # Decorations
-            "u": self._u_handler,
-            "strike": self._strike_handler,
-            "strike_on": self._strike_handler,
-            "strike_off": self._strike_handler,
-            "small": self._small_handler,
-            "small_on": self._small_handler,
-            "small_off": self._small_handler,
-            "big": self._big_handler,
-            "big_on": self._big_handler,
-            "big_off": self._big_handler,
-            "emph": self._emph_handler,
-            "emph_ibb": self._emph_ibb_handler,
-            "emph_ibi": self._emph_ibi_handler,
-            "emph_ib_or_bi": self._emph_ib_or_bi_handler,
-            "sup": self._sup_handler,
-            "sup_text": self._sup_handler,
-            "sub": self._sub_handler,
-            "sub_text": self._sub_handler,
-            "tt": self._tt_handler,
-            "tt_text": self._tt_handler,
-            "tt_bt": self._tt_bt_handler,
-            "tt_bt_text": self._tt_bt_handler,
-            # Links
-            "interwiki": self._interwiki_handler,
-            "interwiki_wiki": self._interwiki_handler,
-            "interwiki_page": self._interwiki_handler,
-            "word": self._word_handler,
-            "word_bang": self._word_handler,
-            "word_name": self._word_handler,
-            "word_anchor": self._word_handler,
-            "link": self._link_handler,
-            "link_target": self._link_handler,
-            "link_desc": self._link_handler,
-            "link_params": self._link_handler,
-            "url": self._url_handler,
-            "url_target": self._url_handler,
-            "url_schema": self._url_handler,
-            "email": self._email_handler,
-            # SGML entities
-            "sgml_entity": self._sgml_entity_handler,
-            "sgml_special_symbol": self._sgml_special_symbol_handler,
-            # Itemlist
-            "indent": self._indent_handler,
-            "li_none": self._li_handler,
-            "li": self._li_handler,
-            "ol": self._ol_handler,
-            "dl": self._dl_handler,
-            # Transclude (Image Embedding)
-            "transclude": self._transclude_handler,
-            "transclude_target": self._transclude_handler,
-            "transclude_desc": self._transclude_handler,
-            "transclude_params": self._transclude_handler,
-        }
-
-        for _type, hit in match.groupdict().items():
-            if hit is None:
-                continue
-            if self.builder.in_remark and _type not in ["remark"]:
-                # original moin-1.9 parser parses even inside inline comments.
-                # it breaks tree structure, so we avoid it..
-                self.builder.text(hit, source_text=hit)
-                return
-            if _type not in [
-                "hmarker",
-            ]:
-                # Open p for certain types
-                if not (
-                    self.builder.in_p
-                    or self.builder.in_pre
-                    or self.builder.in_table
-                    or (_type in no_new_p_before)
-                ):
-                    self.builder.paragraph_start()
-                dispatcher[_type](hit, match.groupdict())
-                return
-        else:
+        # every alternative of scan_re (and parser_scan_re) is a named group enclosing its
+        # subgroups, so the last closed group is the type of markup
+        _type = match.lastgroup
+        if _type is None or _type not in self.markup_handlers:
             # We should never get here
-            import pprint
-
-            raise Exception(
-                "Can't handle match %r\n%s\n%s"
-                % (
-                    match,
-                    pprint.pformat(match.groupdict()),
-                    pprint.pformat(match.groups()),
-                )
-            )
+            raise Exception("Can't handle match %r (%s)" % (match, _type))
+        hit = match.group(_type)
+        if self.builder.in_remark and _type != "remark":
+            # original moin-1.9 parser parses even inside inline comments.
+            # it breaks tree structure, so we avoid it..
+            self.builder.text(hit, source_text=hit)
+            return
+        # Open p for certain types
+        if not (
+            self.builder.in_p
+            or self.builder.in_pre
+            or self.builder.in_table
+            or (_type in self.no_new_p_before)
+        ):
+            self.builder.paragraph_start()
+        self.markup_handlers[_type](self, hit, MatchGroups(match))
 
     # Private Replace Method ----------------------------------------------------------
-    def _remark_handler(self, word: str, groups: dict[str, str]):
+    def _remark_handler(self, word: str, groups: Mapping[str, str]):
         """Handle remarks: /* ... */"""
         on = groups.get("remark_on")
         off = groups.get("remark_off")
@@ -640,11 +585,11 @@ class MoinParser(object):
             return
         self.builder.remark_toggle(source_text=word)
 
-    def _u_handler(self, word: str, groups: dict[str, str]):
+    def _u_handler(self, word: str, groups: Mapping[str, str]):
         """Handle underline."""
         self.builder.underline_toggle(source_text=word)
 
-    def _strike_handler(self, word: str, groups: dict[str, str]):
+    def _strike_handler(self, word: str, groups: Mapping[str, str]):
         """Handle strikethrough."""
         on = groups.get("strike_on")
         off = groups.get("strike_off")
@@ -653,7 +598,7 @@ class MoinParser(object):
             return
         self.builder.strike_toggle(source_text=word)
 
-    def _small_handler(self, word: str, groups: dict[str, str]):
+    def _small_handler(self, word: str, groups: Mapping[str, str]):
         """Handle small."""
         on = groups.get("small_on")
         off = groups.get("small_off")
@@ -662,7 +607,7 @@ class MoinParser(object):
             return
         self.builder.small_toggle(source_text=word)
 
-    def _big_handler(self, word: str, groups: dict[str, str]):
+    def _big_handler(self, word: str, groups: Mapping[str, str]):
         """Handle big."""
         on = groups.get("big_on")
         off = groups.get("big_off")
@@ -671,24 +616,24 @@ class MoinParser(object):
             return
         self.builder.big_toggle(source_text=word)
 
-    def _emph_handler(self, word: str, groups: dict[str, str]):
+    def _emph_handler(self, word: str, groups: Mapping[str, str]):
         """Handle emphasis, i.e. ''(em) and '''(b)."""
         if len(word) == 3:
             self.builder.strong_toggle(source_text=word)
         else:
             self.builder.emphasis_toggle(source_text=word)
 
-    def _emph_ibb_handler(self, word: str, groups: dict[str, str]):
+    def _emph_ibb_handler(self, word: str, groups: Mapping[str, str]):
         """Handle mixed emphasis, i.e. ''''' followed by '''."""
         self.builder.emphasis_toggle(source_text="''")
         self.builder.strong_toggle(source_text="'''")
 
-    def _emph_ibi_handler(self, word: str, groups: dict[str, str]):
+    def _emph_ibi_handler(self, word: str, groups: Mapping[str, str]):
         """Handle mixed emphasis, i.e. ''''' followed by ''."""
         self.builder.strong_toggle(source_text="'''")
         self.builder.emphasis_toggle(source_text="''")
 
-    def _emph_ib_or_bi_handler(self, word: str, groups: dict[str, str]):
+    def _emph_ib_or_bi_handler(self, word: str, groups: Mapping[str, str]):
         """Handle mixed emphasis, exactly five '''''."""
         if (
             self.builder.in_emphasis
@@ -701,27 +646,27 @@ class MoinParser(object):
             self.builder.emphasis_toggle(source_text="''")
             self.builder.strong_toggle(source_text="'''")
 
-    def _sup_handler(self, word: str, groups: dict[str, str]):
+    def _sup_handler(self, word: str, groups: Mapping[str, str]):
         """Handle superscript."""
         text = groups.get("sup_text", "")
         self.builder.sup(text, source_text=word)
 
-    def _sub_handler(self, word: str, groups: dict[str, str]):
+    def _sub_handler(self, word: str, groups: Mapping[str, str]):
         """Handle subscript."""
         text = groups.get("sub_text", "")
         self.builder.sub(text, source_text=word)
 
-    def _tt_handler(self, word: str, groups: dict[str, str]):
+    def _tt_handler(self, word: str, groups: Mapping[str, str]):
         """Handle inline code."""
         tt_text = groups.get("tt_text", "")
         self.builder.code(tt_text, source_text=word)
 
-    def _tt_bt_handler(self, word: str, groups: dict[str, str]):
+    def _tt_bt_handler(self, word: str, groups: Mapping[str, str]):
         """Handle backticked inline code."""
         tt_bt_text = groups.get("tt_bt_text", "")
         self.builder.code(tt_bt_text, source_text=word)
 
-    def _interwiki_handler(self, word: str, groups: dict[str, str]):
+    def _interwiki_handler(self, word: str, groups: Mapping[str, str]):
         """Handle InterWiki links."""
         wikiname = groups.get("interwiki_wiki", "")
         pagename = groups.get("interwiki_page", "")
@@ -732,7 +677,7 @@ class MoinParser(object):
         self.builder.text(word, source_text=word)
         self.builder.interwikilink_end()
 
-    def _word_handler(self, word: str, groups: dict[str, str]):
+    def _word_handler(self, word: str, groups: Mapping[str, str]):
         """Handle WikiNames."""
         word_bang = groups.get("word_bang")
         if word_bang is not None:
@@ -750,7 +695,7 @@ class MoinParser(object):
         self.builder.text(word, source_text=word)
         self.builder.pagelink_end()
 
-    def _url_handler(self, word: str, groups: dict[str, str]):
+    def _url_handler(self, word: str, groups: Mapping[str, str]):
         """Handle literal URLs."""
         target = groups.get("url_target", "")
         self.builder.url(target, source_text=word)
@@ -774,7 +719,7 @@ class MoinParser(object):
             desc = m.group("transclude")
             self._transclude_handler(desc, groupdict)
 
-    def _link_handler(self, word: str, groups: dict[str, str]):
+    def _link_handler(self, word: str, groups: Mapping[str, str]):
         """Handle [[target|text]] links."""
         target = groups.get("link_target", "")
         desc = groups.get("link_desc", "") or ""
@@ -852,36 +797,36 @@ class MoinParser(object):
                 desc = "|" + desc
             self.builder.text("[[%s%s]]" % (target, desc), source_text=word)
 
-    def _email_handler(self, word: str, groups: dict[str, str]):
+    def _email_handler(self, word: str, groups: Mapping[str, str]):
         """Handle email addresses (without a leading mailto:)."""
         self.builder.url(word, source_text=word)
 
-    def _sgml_entity_handler(self, word: str, groups: dict[str, str]):
+    def _sgml_entity_handler(self, word: str, groups: Mapping[str, str]):
         """Handle numeric (decimal and hexadecimal) and symbolic SGML entities."""
         self.builder.sgml_entity(word, source_text=word)
 
-    def _sgml_special_symbol_handler(self, word: str, groups: dict[str, str]):
+    def _sgml_special_symbol_handler(self, word: str, groups: Mapping[str, str]):
         """Handle SGML entities: [<>&]"""
         self.builder.text(word, source_text=word)
 
-    def _indent_handler(self, word: str, groups: dict[str, str]):
+    def _indent_handler(self, word: str, groups: Mapping[str, str]):
         """Handle pure indentation (no - * 1. markup)."""
         if not (self.builder.in_li_of_current_list or self.builder.in_dd_of_current_list):
             self._close_item()
             self.builder.listitem_start()
         self.builder.feed_src(word)
 
-    def _li_handler(self, word: str, groups: dict[str, str]):
+    def _li_handler(self, word: str, groups: Mapping[str, str]):
         """Handle bullet (" *") lists."""
         self._close_item()
         self.builder.listitem_start()
         self.builder.feed_src(word)
 
-    def _ol_handler(self, word: str, groups: dict[str, str]):
+    def _ol_handler(self, word: str, groups: Mapping[str, str]):
         """Handle numbered lists."""
         self._li_handler(word, groups)
 
-    def _dl_handler(self, word: str, groups: dict[str, str]):
+    def _dl_handler(self, word: str, groups: Mapping[str, str]):
         """Handle definition lists."""
         self._close_item()
         self.builder.definition_term_start(source_text=word, freeze_source=True)
@@ -896,7 +841,7 @@ class MoinParser(object):
             return None
         return m.group("simple_text")
 
-    def _transclude_handler(self, word: str, groups: dict[str, str]):
+    def _transclude_handler(self, word: str, groups: Mapping[str, str]):
         """Handles transcluding content, usually embedding images.: {{}}"""
         target = groups.get("transclude_target", "")
         target = wikiutil.url_unquote(target)
@@ -1007,7 +952,7 @@ class MoinParser(object):
                 trans_desc = target
             self.builder.text("{{%s|%s|%s}}" % (target, trans_desc, params), source_text=word)
 
-    def _tableZ_handler(self, word: str, groups: dict[str, str]):
+    def _tableZ_handler(self, word: str, groups: Mapping[str, str]):
         """Handle table row end."""
         if self.builder.in_table:
             self.builder.feed_src(word)
@@ -1018,7 +963,7 @@ class MoinParser(object):
         else:
             self.builder.text(word, source_text=word)
 
-    def _table_handler(self, word: str, groups: dict[str, str]):
+    def _table_handler(self, word: str, groups: Mapping[str, str]):
         """Handle table cell separator."""
         if self.builder.in_table:
             attrs = _getTableAttrs(word)
@@ -1047,20 +992,20 @@ class MoinParser(object):
             self.builder.text(word, source_text=word)
 
     # Heading / Horizontal Rule
-    def _heading_handler(self, word: str, groups: dict[str, str]):
+    def _heading_handler(self, word: str, groups: Mapping[str, str]):
         """Handle section headings.: == =="""
         heading_text = groups.get("heading_text", "")
         depth = min(len(groups.get("hmarker", "")), 5)
         self._close_paragraph()
         self.builder.heading(depth, heading_text, source_text=word)
 
-    def _rule_handler(self, word: str, groups: dict[str, str]):
+    def _rule_handler(self, word: str, groups: Mapping[str, str]):
         """Handle sequences of dashes (Horizontal Rule)."""
         self._undent()
         self._close_paragraph()
         self.builder.rule(source_text=word)
 
-    def _parser_handler(self, word: str, groups: dict[str, str]):
+    def _parser_handler(self, word: str, groups: Mapping[str, str]):
         """Handle parsed code displays."""
         parser_name = groups.get("parser_name", None)
         parser_args = groups.get("parser_args", None)
@@ -1108,7 +1053,7 @@ class MoinParser(object):
             if not bang_line:
                 self.builder.add_parsed_text(line)
 
-    def _parser_end_handler(self, word: str, groups: dict[str, str]):
+    def _parser_end_handler(self, word: str, groups: Mapping[str, str]):
         """when we reach the end of a parser/pre section,
         we call the parser with the lines we collected
         """
@@ -1116,15 +1061,15 @@ class MoinParser(object):
             self.builder.parsed_text_parser("text")
         self.builder.parsed_text_end(source_text=word)
 
-    def _smiley_handler(self, word: str, _groups: dict[str, str]):
+    def _smiley_handler(self, word: str, _groups: Mapping[str, str]):
         self.builder.smiley(word, source_text=word)
 
-    def _comment_handler(self, word: str, _groups: dict[str, str]):
+    def _comment_handler(self, word: str, _groups: Mapping[str, str]):
         if self.builder.in_p:
             self.builder.paragraph_end()
         self.builder.comment(word, source_text=word)
 
-    def _macro_handler(self, word: str, groups: dict[str, str]):
+    def _macro_handler(self, word: str, groups: Mapping[str, str]):
         """Handle macros."""
         macro_name = groups.get("macro_name", "")
         macro_args = groups.get("macro_args")
@@ -1132,6 +1077,74 @@ class MoinParser(object):
             macro_name, macro_args, markup=groups.get("macro", ""), source_text=word
         )
 
+    # handlers by the top-level group of match, built once for the class
+    markup_handlers: dict[str, Callable[["MoinParser", str, Mapping[str, str]], None]] = {
+        # Moinwiki Special Syntax
+        "macro": _macro_handler,
+        "comment": _comment_handler,
+        "remark": _remark_handler,
+        "smiley": _smiley_handler,
+        # Codeblock
+        "parser": _parser_handler,
+        "parser_end": _parser_end_handler,
+        # Table
+        "tableZ": _tableZ_handler,
+        "table": _table_handler,
+        # Heading / Horizontal Rule
+        "heading": _heading_handler,
+        "rule": _rule_handler,
+        # Decorations
+        "u": _u_handler,
+        "strike": _strike_handler,
+        "small": _small_handler,
+        "big": _big_handler,
+        "emph": _emph_handler,
+        "emph_ibb": _emph_ibb_handler,
+        "emph_ibi": _emph_ibi_handler,
+        "emph_ib_or_bi": _emph_ib_or_bi_handler,
+        "sup": _sup_handler,
+        "sub": _sub_handler,
+        "tt": _tt_handler,
+        "tt_bt": _tt_bt_handler,
+        # Links
+        "interwiki": _interwiki_handler,
+        "word": _word_handler,
+        "link": _link_handler,
+        "url": _url_handler,
+        "email": _email_handler,
+        # SGML entities
+        "sgml_entity": _sgml_entity_handler,
+        "sgml_special_symbol": _sgml_special_symbol_handler,
+        # Itemlist
+        "indent": _indent_handler,
+        "li_none": _li_handler,
+        "li": _li_handler,
+        "ol": _ol_handler,
+        "dl": _dl_handler,
+        # Transclude (Image Embedding)
+        "transclude": _transclude_handler,
+    }
+    no_new_p_before = frozenset(
+        [
+            "heading",
+            "rule",
+            "table",
+            "tableZ",
+            "tr",
+            "td",
+            "ul",
+            "ol",
+            "dl",
+            "dt",
+            "dd",
+            "li",
+            "li_none",
+            "indent",
+            "macro",
+            "parser",
+        ]
+    )
+
     # Private helpers ------------------------------------------------------------
     def _parse_indentinfo(self, line: str) -> Tuple[int, str, Optional[str], Optional[int]]:
         indent = self.indent_re.match(line)
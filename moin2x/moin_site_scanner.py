@@ -1,11 +1,17 @@
+from __future__ import annotations
+
+import concurrent.futures
+import fnmatch
 import logging
 import os
+import re
 from datetime import datetime
-from typing import Iterator, Optional
+from typing import IO, Iterator, Optional
 
 import attr
 
-from .moinutils import unquoteWikiname
+from .moinutils import quoteWikinameFS, unquoteWikiname
+from .source import MoinSource, open_source
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +20,30 @@ logger = logging.getLogger(__name__)
 class MoinAttachment:
     filepath: str = attr.ib()
     name: str = attr.ib()
+    size: Optional[int] = attr.ib(default=None, eq=False)
+    mtime_ns: Optional[int] = attr.ib(default=None, eq=False)
+
+
+@attr.s(frozen=True)
+class MoinEditLogEntry:
+    timestamp: datetime = attr.ib()
+    revision: str = attr.ib()
+    action: str = attr.ib()
+    author_id: Optional[str] = attr.ib(default=None)
+
+    @classmethod
+    def from_fields(
+        cls, timestamp_us: int, revision: str, action: str, author_id: Optional[str] = None
+    ) -> MoinEditLogEntry:
+        timestamp = datetime.fromtimestamp(timestamp_us / 1000**2).astimezone()
+        return cls(timestamp=timestamp, revision=revision, action=action, author_id=author_id)
+
+    @classmethod
+    def from_line(cls, line: str) -> MoinEditLogEntry:
+        # timestamp, revision, action, pagename, addr, hostname, userid, extra, comment
+        fields = line.rstrip("\r\n").split("\t")
+        author_id = fields[6] if len(fields) > 6 and fields[6] else None
+        return cls.from_fields(int(fields[0]), fields[1], fields[2], author_id=author_id)
 
 
 @attr.s(frozen=True)
@@ -22,67 +52,179 @@ class MoinPageInfo:
     name: str = attr.ib()
     attachments: set[MoinAttachment] = attr.ib()
     updated: Optional[datetime] = attr.ib(default=None)
+    last_edit: Optional[MoinEditLogEntry] = attr.ib(default=None)
 
 
-class MoinSiteScanner(object):
-    def __init__(self, page_dir: str):
-        self.page_dir = page_dir
+def read_last_line(filepath: str, chunk_size: int = 4096) -> bytes:
+    """Read the last non-empty line of file by seeking from the end."""
+    with open(filepath, "rb") as f:
+        return _read_last_line(f, chunk_size=chunk_size)
+
+
+def _read_last_line(f: IO[bytes], chunk_size: int = 4096) -> bytes:
+    pos = f.seek(0, os.SEEK_END)
+    buf = b""
+    while pos > 0:
+        read_size = min(chunk_size, pos)
+        pos -= read_size
+        f.seek(pos)
+        buf = f.read(read_size) + buf
+        stripped = buf.rstrip(b"\r\n")
+        idx = max(stripped.rfind(b"\n"), stripped.rfind(b"\r"))
+        if idx >= 0:
+            return stripped[idx + 1 :]
+    return buf.rstrip(b"\r\n")
+
+
+def has_glob_magic(pattern: str) -> bool:
+    return re.search(r"[*?\[]", pattern) is not None
+
 
-    def _scan_page(self, entryname: str, page_dir: str) -> Optional[MoinPageInfo]:
+def match_pagename(pagename: str, patterns: list[str]) -> bool:
+    """Check if pagename matches any of glob patterns (e.g. Team/*)."""
+    return any(fnmatch.fnmatchcase(pagename, pattern) for pattern in patterns)
+
+
+def quoted_prefix(pattern: str) -> str:
+    """Return the prefix of quoted directory names of pages which can match the pattern."""
+    literal = re.split(r"[*?\[]", pattern, maxsplit=1)[0]
+    prefix = quoteWikinameFS(literal)
+    if prefix.endswith(")"):
+        # following unsafe chars are quoted into the same group
+        prefix = prefix[:-1]
+    return prefix
+
+
+class MoinSiteScanner(object):
+    def __init__(self, page_dir: str | MoinSource, workers: int = 1):
+        """Scanner of MoinMoin pages directory.
+
+        page_dir is the pages directory, tar/zip archive of it, or a MoinSource.
+        If workers is more than 1, pages are scanned by a thread pool to overlap file I/O
+        on high-latency filesystems. Pages are yielded in the same order anyway.
+        """
+        if isinstance(page_dir, MoinSource):
+            self.source = page_dir
+        else:
+            self.source = open_source(page_dir)
+        self.page_dir = self.source.root
+        self.workers = workers
+
+    def _scan_page(self, entryname: str) -> Optional[MoinPageInfo]:
         ignorable_pages = ["BadContent", "SideBar"]
 
         pagename = unquoteWikiname(entryname)
+        logger.debug("+ Page Found: %s" % pagename)
         if pagename in ignorable_pages:
             return None
 
-        pagedir = os.path.join(page_dir, entryname)
-        current_file = os.path.join(pagedir, "current")
+        source = self.source
+        pagedir = source.join(entryname)
+        current_file = source.join(entryname, "current")
         try:
-            with open(current_file, "r") as f:
-                current_revision = f.read().rstrip()
+            current_revision = source.read_text(current_file).rstrip()
         except FileNotFoundError:
             logger.debug("++ not content page")
             return None
 
-        edit_log = os.path.join(pagedir, "edit-log")
-        with open(edit_log, "r") as f:
-            edit_log_content = f.read()
-        if not edit_log_content:
+        edit_log = source.join(entryname, "edit-log")
+        with source.open(edit_log) as f:
+            last_edit_log = _read_last_line(f)
+        if not last_edit_log:
             logger.debug("++ skip built-in page having no edit history")
             return None
-        last_edit_log = edit_log_content.splitlines()[-1]
-        updated_us = int(last_edit_log.split()[0])
-        updated = datetime.fromtimestamp(updated_us / 1000**2).astimezone()
+        last_edit = MoinEditLogEntry.from_line(last_edit_log.decode("utf-8", errors="replace"))
 
-        content_file = os.path.join(pagedir, "revisions", current_revision)
-        if not os.path.isfile(content_file):
+        content_file = source.join(entryname, "revisions", current_revision)
+        if not source.isfile(content_file):
             logger.debug("++ not found: %s/revisions/%s" % (entryname, current_revision))
             logger.debug("++ already deleted")
             return None
 
         attachments: set[MoinAttachment] = set()
         attachments_dir = os.path.join(pagedir, "attachments")
-        if os.path.isdir(attachments_dir):
-            for attachment_entry in os.scandir(attachments_dir):
-                if attachment_entry.name.startswith(".") or attachment_entry.is_dir():
+        if source.isdir(attachments_dir):
+            for attachment_name in source.listdir(attachments_dir):
+                attachment_file = os.path.join(attachments_dir, attachment_name)
+                if attachment_name.startswith(".") or source.isdir(attachment_file):
                     return None
-                attachment_file = os.path.join(attachments_dir, attachment_entry.name)
-                attachment = MoinAttachment(filepath=attachment_file, name=attachment_entry.name)
+                st = source.stat(attachment_file)
+                attachment = MoinAttachment(
+                    filepath=attachment_file,
+                    name=attachment_name,
+                    size=st.size,
+                    mtime_ns=st.mtime_ns,
+                )
                 attachments.add(attachment)
 
         page = MoinPageInfo(
-            filepath=content_file, name=pagename, updated=updated, attachments=attachments
+            filepath=content_file,
+            name=pagename,
+            updated=last_edit.timestamp,
+            last_edit=last_edit,
+            attachments=attachments,
         )
         return page
 
-    def scan_pages(self) -> Iterator[MoinPageInfo]:
-        for entry in os.scandir(self.page_dir):
-            if not entry.is_dir():
-                continue
-            if entry.name.startswith("."):
-                continue
+    def page_entrynames(self, patterns: Optional[list[str]] = None) -> list[str]:
+        """Return quoted directory names of pages in stable order.
+
+        If patterns are given, select pages by pagename or glob pattern (e.g. Team/*).
+        Pagenames are looked up directly and directory entries are pruned by the quoted
+        prefix of patterns, so that non-matching entries are never accessed.
+        """
+        entrynames: set[str] = set()
+        if patterns is None:
+            globs = ["*"]
+        else:
+            globs = [p for p in patterns if has_glob_magic(p)]
+            for pagename in [p for p in patterns if not has_glob_magic(p)]:
+                entryname = quoteWikinameFS(pagename)
+                if self.source.isdir(self.source.join(entryname)):
+                    entrynames.add(entryname)
+
+        if globs:
+            prefixes = tuple([quoted_prefix(p) for p in globs])
+            for name in self.source.subdirs(self.page_dir):
+                if not name.startswith(prefixes):
+                    continue
+                if name.startswith("."):
+                    continue
+                if patterns is not None and not match_pagename(unquoteWikiname(name), globs):
+                    continue
+                entrynames.add(name)
+        # sort entries to scan pages in stable order
+        return sorted(entrynames)
+
+    def scan_entry(self, entryname: str) -> Optional[MoinPageInfo]:
+        """Scan a page directory specified by quoted directory name."""
+        return self._scan_page(entryname)
+
+    def scan_page(self, pagename: str) -> Optional[MoinPageInfo]:
+        """Scan a page without scanning other pages."""
+        entryname = quoteWikinameFS(pagename)
+        if not self.source.isdir(self.source.join(entryname)):
+            return None
+        return self.scan_entry(entryname)
+
+    def scan_pages(self, patterns: Optional[list[str]] = None) -> Iterator[MoinPageInfo]:
+        entrynames = self.page_entrynames(patterns)
+        if self.workers > 1:
+            yield from self._scan_pages_concurrently(entrynames)
+            return
 
-            logger.debug("+ Page Found: %s" % unquoteWikiname(entry.name))
-            page = self._scan_page(entry.name, self.page_dir)
+        for entryname in entrynames:
+            page = self._scan_page(entryname)
             if page is not None:
                 yield page
+
+    def _scan_pages_concurrently(self, entrynames: list[str]) -> Iterator[MoinPageInfo]:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            # map() returns results in the order of entries
+            results = executor.map(self._scan_page, entrynames)
+            for page in results:
+                if page is not None:
+                    yield page
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -113,6 +113,22 @@ def unquoteWikiname(filename: str) -> str:
     return wikiname
 
 
+def quoteWikinameFS(wikiname: str) -> str:
+    """Quote wikiname into directory name (inverse of unquoteWikiname)."""
+    UNSAFE = re.compile(r"[^a-zA-Z0-9_]+")
+
+    parts: list[str] = []
+    start = 0
+    for needle in UNSAFE.finditer(wikiname):
+        parts.append(wikiname[start : needle.start()])
+        start = needle.end()
+        parts.append("(%s)" % needle.group().encode("utf-8").hex())
+
+    # append rest of string
+    parts.append(wikiname[start : len(wikiname)])
+    return "".join(parts)
+
+
 def resolve_interwiki(wikiname: str, pagename: str) -> bool:
     """Not implemented."""
     return False
@@ -1,3 +1,4 @@
+import collections
 from typing import Optional, Type
 
 from .page_tree import (
@@ -58,11 +59,37 @@ class PageBuilder(object):
         self.page_root: PageRoot = PageRoot()
         self.cur: PageElement = self.page_root
         self.verify_doc_structure = verify_doc_structure
+        # depths of open elements (cur and its parents) by their classes and base classes,
+        # so that status queries don't walk up the tree
+        self._depth = 0
+        self._open_depths: collections.defaultdict[type, list[int]] = collections.defaultdict(list)
+        self._push_open(self.page_root)
 
     # Page Bulding Status
+    def _push_open(self, e: PageElement):
+        for cls in type(e).__mro__:
+            self._open_depths[cls].append(self._depth)
+
+    def _pop_open(self, e: PageElement):
+        for cls in type(e).__mro__:
+            self._open_depths[cls].pop()
+
+    def _in_x(self, x: Type[PageElement]) -> bool:
+        """Same as self.cur.in_x([x])"""
+        return bool(self._open_depths[x])
+
+    def _innermost_depth(self, *x: Type[PageElement]) -> int:
+        """Depth of the innermost open element of the classes, or -1 if none."""
+        depth = -1
+        for cls in x:
+            depths = self._open_depths[cls]
+            if depths and depths[-1] > depth:
+                depth = depths[-1]
+        return depth
+
     @property
     def in_p(self) -> bool:
-        return self.cur.in_x([Paragraph])
+        return self._in_x(Paragraph)
 
     @property
     def in_pre(self) -> bool:
@@ -74,7 +101,7 @@ class PageBuilder(object):
 
     @property
     def in_table(self) -> bool:
-        return self.cur.in_x([Table])
+        return self._in_x(Table)
 
     @property
     def is_found_parser(self) -> bool:
@@ -83,85 +110,65 @@ class PageBuilder(object):
 
     @property
     def in_underline(self) -> bool:
-        return self.cur.in_x([Underline])
+        return self._in_x(Underline)
 
     @property
     def in_strike(self) -> bool:
-        return self.cur.in_x([Strike])
+        return self._in_x(Strike)
 
     @property
     def in_small(self) -> bool:
-        return self.cur.in_x([Small])
+        return self._in_x(Small)
 
     @property
     def in_strong(self) -> bool:
-        return self.cur.in_x([Strong])
+        return self._in_x(Strong)
 
     @property
     def in_emphasis(self) -> bool:
-        return self.cur.in_x([Emphasis])
+        return self._in_x(Emphasis)
 
     @property
     def is_emphasis_before_strong(self) -> bool:
         assert self.in_strong
         assert self.in_emphasis
-        found_strong = False
-        found_emphasis = False
-
-        above_me = [self.cur] + self.cur.parents
-        for e in above_me:
-            if isinstance(e, Strong):
-                if found_emphasis:
-                    return False
-                found_strong = True
-            if isinstance(e, Emphasis):
-                if found_strong:
-                    return True
-                found_emphasis = True
-        else:
-            raise AssertionError("This mustn't be reached")
+        return self._innermost_depth(Strong) > self._innermost_depth(Emphasis)
 
     @property
     def in_big(self) -> bool:
-        return self.cur.in_x([Big])
+        return self._in_x(Big)
 
     @property
     def in_table_row(self) -> bool:
-        return self.cur.in_x([TableRow])
+        return self._in_x(TableRow)
 
     @property
     def in_li_of_current_list(self) -> bool:
-        return self.cur.in_x([Listitem], upper_bound=[BulletList, NumberList, DefinitionList])
+        li_depth = self._innermost_depth(Listitem)
+        return li_depth > self._innermost_depth(BulletList, NumberList, DefinitionList)
 
     @property
     def in_dd_of_current_list(self) -> bool:
-        return self.cur.in_x(
-            [DefinitionDesc], upper_bound=[BulletList, NumberList, DefinitionList]
-        )
+        dd_depth = self._innermost_depth(DefinitionDesc)
+        return dd_depth > self._innermost_depth(BulletList, NumberList, DefinitionList)
 
     @property
     def in_list(self) -> bool:
-        return self.cur.in_x([BulletList, NumberList, DefinitionList])
+        return self._in_x(BulletList) or self._in_x(NumberList) or self._in_x(DefinitionList)
 
     @property
     def list_types(self) -> list[str]:
-        list_types: list[str] = []
-        above_me = [self.cur] + self.cur.parents
-        for e in reversed(above_me):
-            if isinstance(e, BulletList):
-                list_types.append("ul")
-            elif isinstance(e, NumberList):
-                list_types.append("ol")
-            elif isinstance(e, DefinitionList):
-                list_types.append("dl")
-        return list_types
+        lists: list[tuple[int, str]] = []
+        for cls, list_type in [(BulletList, "ul"), (NumberList, "ol"), (DefinitionList, "dl")]:
+            lists.extend([(depth, list_type) for depth in self._open_depths[cls]])
+        return [list_type for _depth, list_type in sorted(lists)]
 
     # Helpers
     def _ensure_cur_elem(self, x: Type[PageElement]):
         if isinstance(self.cur, x):
             return
 
-        if not self.verify_doc_structure and self.cur.in_x([x]):
+        if not self.verify_doc_structure and self._in_x(x):
             while not isinstance(self.cur, x):
                 self._end_current_elem()
         else:
@@ -175,13 +182,17 @@ class PageBuilder(object):
     def _start_new_elem(self, e: PageElement):
         self.cur.add_child(e)
         self.cur = e
+        self._depth += 1
+        self._push_open(e)
 
     def _end_current_elem(self):
         assert self.cur.parent is not None
+        self._pop_open(self.cur)
+        self._depth -= 1
         self.cur = self.cur.parent
 
     def _toggle_elem(self, cls: Type[PageElement], source_text: str = ""):
-        if not self.cur.in_x([cls]):
+        if not self._in_x(cls):
             self._start_new_elem(cls(source_text=source_text))
         else:
             self._ensure_cur_elem(cls)
@@ -1,12 +1,106 @@
 from __future__ import annotations
 
+import bisect
 import textwrap
-from typing import Any, Dict, List, Literal, Optional, Type, TypeVar
+from typing import Any, Dict, Hashable, List, Literal, Optional, Type, TypeVar, Union
 
 import attr
 import cssutils  # type: ignore
 
 
+class SourceBuffer(object):
+    """Append-only buffer of source texts propagated in a page tree.
+
+    Ancestors of an element refer to its source text by offsets in the buffer instead of
+    copying it (see SourceSpans). Appended texts are joined into chunks, so the buffer takes
+    about as much memory as the texts themselves.
+    """
+
+    chunk_size = 8192
+
+    __slots__ = ("chunks", "chunk_starts", "pending", "pending_size", "size")
+
+    def __init__(self) -> None:
+        self.chunks: list[str] = []
+        self.chunk_starts: list[int] = []
+        self.pending: list[str] = []  # texts not joined into a chunk yet
+        self.pending_size = 0
+        self.size = 0
+
+    def append(self, text: str) -> int:
+        """Append the text and return its offset."""
+        offset = self.size
+        self.pending.append(text)
+        self.pending_size += len(text)
+        self.size += len(text)
+        if self.pending_size >= self.chunk_size:
+            self._flush()
+        return offset
+
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+        self.chunk_starts.append(self.size - self.pending_size)
+        self.chunks.append("".join(self.pending))
+        self.pending = []
+        self.pending_size = 0
+
+    def text(self, start: int, end: int) -> str:
+        self._flush()
+        texts: list[str] = []
+        i = bisect.bisect_right(self.chunk_starts, start) - 1
+        while start < end:
+            chunk_start = self.chunk_starts[i]
+            chunk = self.chunks[i]
+            texts.append(chunk[start - chunk_start : end - chunk_start])
+            start = chunk_start + len(chunk)
+            i += 1
+        return "".join(texts)
+
+
+class SourceSpans(object):
+    """Source text of an element as spans of SourceBuffer, which is materialized on access.
+
+    The text given on construction (head) is followed by the spans which the texts of
+    descendants and the texts added later are propagated into. Usually the spans are
+    contiguous, so the first span is kept in start and end.
+    """
+
+    __slots__ = ("head", "buffer", "start", "end", "more_spans")
+
+    def __init__(self, head: str, buffer: SourceBuffer, offset: int):
+        self.head = head
+        self.buffer = buffer
+        self.start = offset
+        self.end = offset
+        self.more_spans: Optional[list[int]] = None  # flattened [start, end) pairs
+
+    def add(self, buffer: SourceBuffer, start: int, end: int) -> None:
+        if buffer is not self.buffer:
+            # the element has been moved into another page tree
+            self.head = str(self)
+            self.buffer = buffer
+            self.start = self.end = start
+            self.more_spans = None
+        if self.more_spans is None:
+            if self.end == start:
+                self.end = end
+            else:
+                self.more_spans = [start, end]
+        elif self.more_spans[-1] == start:
+            self.more_spans[-1] = end
+        else:
+            self.more_spans += [start, end]
+
+    def __str__(self) -> str:
+        texts = [self.head, self.buffer.text(self.start, self.end)]
+        if self.more_spans is not None:
+            spans = self.more_spans
+            for i in range(0, len(spans), 2):
+                texts.append(self.buffer.text(spans[i], spans[i + 1]))
+        return "".join(texts)
+
+
 @attr.define
 class PageElement(object):
     content: str = attr.ib(default="")
@@ -15,18 +109,32 @@ class PageElement(object):
         default=None, init=False, repr=False, eq=False, metadata={"exclude_content": True}
     )
     children: List[PageElement] = attr.field(factory=list, init=False)
-    source_text: str = attr.field(default="", repr=False, metadata={"exclude_content": True})
+    # source texts longer than this are kept as SourceSpans instead of str, since a copied
+    # short text costs less memory than spans
+    source_spans_threshold = 128
+
+    _source: Union[str, SourceSpans] = attr.field(
+        default="", alias="source_text", eq=str, repr=False, metadata={"exclude_content": True}
+    )
     source_frozen: bool = attr.field(default=False, repr=False, metadata={"exclude_content": True})
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> PageElement:
-        initable_fields = dict([(k, v) for k, v in attr.fields_dict(cls).items() if v.init])
+        initable_fields = dict([(v.alias, v) for v in attr.fields(cls) if v.init])
         init_args = dict([(k, v) for k, v in data.items() if k in initable_fields])
         obj = cls(**init_args)
         for _class, c_init_data in data.get("children", []):
             obj.add_child(_class.from_dict(c_init_data), propagate_source_text=False)
         return obj
 
+    @property
+    def source_text(self) -> str:
+        return str(self._source)
+
+    @source_text.setter
+    def source_text(self, source_text: str) -> None:
+        self._source = source_text
+
     @property
     def content_hash(self) -> int:
         def get_hash(obj: Any) -> int:
@@ -53,6 +161,29 @@ class PageElement(object):
                 hash_value += hash((field.name, value))
         return hash((self.__class__.__name__, hash_value))
 
+    @property
+    def structure_key(self) -> Hashable:
+        """Return key which is equal between subtrees with the same contents and source texts.
+
+        Unlike content_hash, the key can be compared exactly and the order of children matters.
+        """
+
+        def get_key(obj: Any) -> Hashable:
+            if attr.has(obj.__class__):
+                return attr.astuple(obj)
+            elif isinstance(obj, dict):
+                return tuple(obj.items())  # type: ignore
+            return obj
+
+        values: list[Hashable] = [self.__class__.__name__, self.source_text]
+        for field in attr.fields(self.__class__):  # type: ignore
+            assert isinstance(field, attr.Attribute)
+            if field.metadata.get("exclude_content", False) or field.name == "children":
+                continue
+            values.append(get_key(self.__getattribute__(field.name)))
+        values.append(tuple([c.structure_key for c in self.children]))
+        return tuple(values)
+
     @property
     def parents(self) -> List[PageElement]:
         ret: List[PageElement] = []
@@ -125,16 +256,44 @@ class PageElement(object):
         return new
 
     def add_source_text(self, source_text: str, freeze: bool = False) -> None:
-        self.source_text += source_text
-        self.propagate_source_text(source_text)
+        self._add_source_spans(source_text, include_self=True)
         if freeze:
             self.source_frozen = True
 
     def propagate_source_text(self, source_text: str) -> None:
-        for p in self.parents:
-            if p.source_frozen:
-                break
-            p.source_text += source_text
+        self._add_source_spans(source_text, include_self=False)
+
+    def _add_source_spans(self, source_text: str, include_self: bool) -> None:
+        """Add the text to self (if include_self) and parents up to the first frozen one.
+
+        The text is appended to the source buffer of the tree once, and the elements with long
+        source texts refer to it by the span.
+        """
+        if not source_text:
+            return
+        receivers: list[PageElement] = [self] if include_self else []
+        root = self
+        frozen = False
+        while root.parent is not None:
+            root = root.parent
+            frozen = frozen or root.source_frozen
+            if not frozen:
+                receivers.append(root)
+        if not receivers:
+            return
+        if not isinstance(root._source, SourceSpans):
+            root._source = SourceSpans(root._source, SourceBuffer(), 0)
+        buffer = root._source.buffer
+        start = buffer.append(source_text)
+        end = start + len(source_text)
+        for e in receivers:
+            if isinstance(e._source, SourceSpans):
+                e._source.add(buffer, start, end)
+            elif len(e._source) + len(source_text) <= self.source_spans_threshold:
+                e._source += source_text
+            else:
+                e._source = SourceSpans(e._source, buffer, start)
+                e._source.add(buffer, start, end)
 
     def tree_repr(self, include_src: bool = False) -> str:
         def _shorten(text: str, width: int = 40) -> str:
@@ -1,17 +1,24 @@
 import unicodedata
 import urllib.parse
 from abc import ABCMeta, abstractmethod
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from moin2x.moinutils import (
     CHILD_PREFIX,
+    abs_page,
     is_relative_pagename_to_curdir,
     is_relative_pagename_to_parent,
 )
 from moin2x.utils import safe_path_join
 
+if TYPE_CHECKING:
+    from moin2x.attachment_store import AttachmentStore
+
 
 class PathBuilder(metaclass=ABCMeta):
+    # attachments in the store are referred by the shared path instead of page bundle
+    attachment_store: Optional["AttachmentStore"] = None
+
     @abstractmethod
     def _sanitize_pagename(self, pagename: str) -> str:
         pass
@@ -111,9 +118,28 @@ class MarkdownPathBuilder(PathBuilder):
         url = self._sanitize_path(url)
         return url
 
+    def _attachment_store_url(
+        self, pagename: Optional[str], filename: str, relative_base: Optional[str] = None
+    ) -> Optional[str]:
+        if self.attachment_store is None:
+            return None
+        if pagename is None:
+            pagename = relative_base
+        elif relative_base is not None:
+            pagename = abs_page(relative_base, pagename)
+        if pagename is None:
+            return None
+        store_path = self.attachment_store.filepath(pagename, filename)
+        if store_path is None:
+            return None
+        return self._sanitize_path(urllib.parse.urljoin(self.root_path + "/", store_path))
+
     def attachment_url(
         self, pagename: Optional[str], filename: str, relative_base: Optional[str] = None
     ) -> str:
+        store_url = self._attachment_store_url(pagename, filename, relative_base)
+        if store_url is not None:
+            return store_url
         filename = self._sanitize_attachment_filename(filename)
         if pagename is not None:
             pagename = self._sanitize_pagename(pagename)
@@ -0,0 +1,40 @@
+import collections
+import hashlib
+from typing import Callable
+
+from moin2x.formatter.base import BlockCache
+
+
+class RevisionCache(object):
+    """Converted contents of page revisions keyed by content hash of revision files.
+
+    Identical revisions (e.g. reverts) are converted once, and top-level blocks formatted for
+    the previous revision of the same page are reused to convert near-identical revisions.
+    """
+
+    def __init__(self, max_revisions: int = 1024):
+        self.max_revisions = max_revisions
+        self._converted: collections.OrderedDict[tuple[str, bytes], str] = (
+            collections.OrderedDict()
+        )
+        self._blocks: dict[str, BlockCache] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def convert(
+        self, pagename: str, content: str, convert: Callable[[str, BlockCache], str]
+    ) -> str:
+        """Return converted content, calling convert(content, block_cache) unless cached."""
+        key = (pagename, hashlib.sha256(content.encode("utf-8")).digest())
+        converted = self._converted.get(key)
+        if converted is not None:
+            self._converted.move_to_end(key)
+            self.hits += 1
+            return converted
+
+        self.misses += 1
+        converted = convert(content, self._blocks.setdefault(pagename, {}))
+        self._converted[key] = converted
+        if len(self._converted) > self.max_revisions:
+            self._converted.popitem(last=False)
+        return converted
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import hashlib
+import re
+
+import attr
+
+
+def shard_of(pagename: str, count: int) -> int:
+    """Return 1-based shard number of the page, stable across machines and runs."""
+    digest = hashlib.sha256(pagename.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+@attr.s(frozen=True)
+class Shard:
+    """I-th of N shards of the site (1 <= I <= N), which pages are assigned by pagename."""
+
+    index: int = attr.ib()
+    count: int = attr.ib()
+
+    def __attrs_post_init__(self):
+        if self.count < 1:
+            raise ValueError("number of shards must be positive: %d" % self.count)
+        if not 1 <= self.index <= self.count:
+            raise ValueError("shard must be between 1 and %d: %d" % (self.count, self.index))
+
+    @classmethod
+    def parse(cls, spec: str) -> Shard:
+        """Parse shard spec like '2/4'."""
+        m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec)
+        if m is None:
+            raise ValueError("shard must be I/N (e.g. 2/4): %s" % spec)
+        return cls(index=int(m.group(1)), count=int(m.group(2)))
+
+    def __contains__(self, pagename: str) -> bool:
+        return shard_of(pagename, self.count) == self.index
+
+    @property
+    def is_first(self) -> bool:
+        return self.index == 1
+
+    def __str__(self) -> str:
+        return "%d/%d" % (self.index, self.count)
@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import errno
+import io
+import logging
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from abc import ABCMeta, abstractmethod
+from typing import IO, Any, Literal, Optional, Tuple
+
+import attr
+
+from moin2x.source import DirectorySource, MoinSource
+from moin2x.utils import file_sha256, safe_path_join
+
+logger = logging.getLogger(__name__)
+
+# ("text", path, content) or ("copy", path, source path)
+SinkOp = Tuple[str, str, str]
+
+TransferMode = Literal["copy", "hardlink", "reflink"]
+TRANSFER_MODES: list[TransferMode] = ["copy", "hardlink", "reflink"]
+
+# ioctl to share extents between files (linux/fs.h)
+FICLONE = 0x40049409
+
+
+@attr.define
+class TransferStats:
+    """Statistics of files written into the sink."""
+
+    copied_files: int = 0
+    copied_bytes: int = 0
+    skipped_files: int = 0
+    skipped_bytes: int = 0
+    written_pages: int = 0
+    unchanged_pages: int = 0
+
+    def copied(self, size: int):
+        self.copied_files += 1
+        self.copied_bytes += size
+
+    def skipped(self, size: int):
+        self.skipped_files += 1
+        self.skipped_bytes += size
+
+    def merge(self, other: TransferStats):
+        self.copied_files += other.copied_files
+        self.copied_bytes += other.copied_bytes
+        self.skipped_files += other.skipped_files
+        self.skipped_bytes += other.skipped_bytes
+        self.written_pages += other.written_pages
+        self.unchanged_pages += other.unchanged_pages
+
+
+class OutputSink(metaclass=ABCMeta):
+    """Destination of converted pages and attachments.
+
+    Paths are relative to the root (the output directory or the archive file).
+    """
+
+    # whether worker processes can write into the sink by themselves
+    concurrent: bool = True
+
+    def __init__(self, root: str):
+        self.root = root
+        self.stats = TransferStats()
+
+    def pop_stats(self) -> TransferStats:
+        stats, self.stats = self.stats, TransferStats()
+        return stats
+
+    def join(self, path: str) -> str:
+        return safe_path_join(self.root, path)
+
+    @abstractmethod
+    def write_text(self, path: str, content: str):
+        pass
+
+    @abstractmethod
+    def copy_file(self, source: MoinSource, src_path: str, path: str):
+        """Copy a file of the source into the sink."""
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> OutputSink:
+        return self
+
+    def __exit__(self, *args: object):
+        self.close()
+
+    def __str__(self) -> str:
+        return self.root
+
+
+def _reflink(src_path: str, dst_path: str):
+    """Clone src_path, or copy it in kernel if the filesystem doesn't support cloning."""
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            import fcntl  # not available on Windows
+
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except ImportError:
+            pass
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY):
+                raise
+        size = os.fstat(src.fileno()).st_size
+        copy_file_range = getattr(os, "copy_file_range", None)
+        try:
+            if copy_file_range is None:
+                raise OSError(errno.ENOSYS, "copy_file_range is not available")
+            copied = 0
+            while copied < size:
+                n = copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst)
+    shutil.copymode(src_path, dst_path)
+
+
+def _read_text(filepath: str) -> Optional[str]:
+    try:
+        with open(filepath, "r") as f:
+            return f.read()
+    except (FileNotFoundError, IsADirectoryError, UnicodeDecodeError):
+        return None
+
+
+class DirectorySink(OutputSink):
+    """Write outputs into directory.
+
+    Pages are written only if the content differs from the existing file, so that unchanged
+    pages keep their mtime. If baseline_dir is given (e.g. the previous outputs when writing
+    into a staging directory), unchanged pages are copied from there with their mtime, and
+    identical attachments are hardlinked (or copied) from there.
+
+    Attachments are transferred by the mode (copy, hardlink or reflink) unless an identical
+    file already exists: same size and mtime, or same content if verify_hash is True.
+    Hardlink and reflink fall back to copy if the source or the filesystem doesn't support it.
+    """
+
+    def __init__(
+        self,
+        dst_dir: str,
+        transfer: TransferMode = "copy",
+        verify_hash: bool = False,
+        baseline_dir: Optional[str] = None,
+    ):
+        super().__init__(dst_dir)
+        if transfer not in TRANSFER_MODES:
+            raise ValueError("unknown transfer mode: %s" % transfer)
+        self.transfer: TransferMode = transfer
+        self.verify_hash = verify_hash
+        self.baseline_dir = baseline_dir
+
+    def relocate(self, dst_dir: str) -> DirectorySink:
+        """Return the sink writing into another directory with the same options.
+
+        Outputs of this sink are used as the baseline of unchanged pages.
+        """
+        return self.__class__(
+            dst_dir, transfer=self.transfer, verify_hash=self.verify_hash, baseline_dir=self.root
+        )
+
+    def write_text(self, path: str, content: str):
+        filepath = self.join(path)
+        previous = filepath
+        if self.baseline_dir is not None and not os.path.exists(filepath):
+            previous = safe_path_join(self.baseline_dir, path)
+        if _read_text(previous) == content:
+            logger.debug("++ unchanged: %s" % path)
+            if previous != filepath:
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                shutil.copy2(previous, filepath)
+            self.stats.unchanged_pages += 1
+            return
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, "w") as f:
+            f.write(content)
+        self.stats.written_pages += 1
+
+    def _is_identical(
+        self, source: MoinSource, src_path: str, size: int, mtime_ns: int, filepath: str
+    ) -> bool:
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            return False
+        if st.st_size != size:
+            return False
+        if not self.verify_hash:
+            return st.st_mtime_ns == mtime_ns
+        with source.open(src_path) as src, open(filepath, "rb") as dst:
+            return file_sha256(src) == file_sha256(dst)
+
+    def copy_file(self, source: MoinSource, src_path: str, path: str):
+        filepath = self.join(path)
+        st = source.stat(src_path)
+        if self._is_identical(source, src_path, st.size, st.mtime_ns, filepath):
+            logger.debug("++ skip identical file: %s" % path)
+            self.stats.skipped(st.size)
+            return
+        if self.baseline_dir is not None and not os.path.lexists(filepath):
+            previous = safe_path_join(self.baseline_dir, path)
+            if self._is_identical(source, src_path, st.size, st.mtime_ns, previous):
+                logger.debug("++ skip identical file: %s (carried over)" % path)
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                try:
+                    os.link(previous, filepath)
+                except OSError:
+                    shutil.copy2(previous, filepath)
+                self.stats.skipped(st.size)
+                return
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # write into temporary file and replace, not to write through existing hardlinks
+        tmp_path = filepath + ".moin2x-tmp"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            self._transfer(source, src_path, tmp_path)
+            os.utime(tmp_path, ns=(st.mtime_ns, st.mtime_ns))
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+        self.stats.copied(st.size)
+
+    def _transfer(self, source: MoinSource, src_path: str, dst_path: str):
+        if isinstance(source, DirectorySource):
+            if self.transfer == "hardlink":
+                try:
+                    os.link(src_path, dst_path)
+                    return
+                except OSError as e:
+                    logger.debug("++ fail to hardlink (%s): fall back to copy" % e)
+            elif self.transfer == "reflink":
+                _reflink(src_path, dst_path)
+                return
+        source.copy_file(src_path, dst_path)
+
+    def __reduce__(self):
+        return (self.__class__, (self.root, self.transfer, self.verify_hash, self.baseline_dir))
+
+
+class NullSink(OutputSink):
+    """Discard outputs (dry run). Only counts of files and bytes are kept."""
+
+    def __init__(self, root: str = os.devnull):
+        super().__init__(root)
+        self.files = 0
+        self.bytes = 0
+
+    def write_text(self, path: str, content: str):
+        self.join(path)
+        self.files += 1
+        self.bytes += len(content.encode("utf-8"))
+
+    def copy_file(self, source: MoinSource, src_path: str, path: str):
+        self.join(path)
+        size = source.stat(src_path).size
+        self.files += 1
+        self.bytes += size
+        self.stats.copied(size)
+
+    def __reduce__(self):
+        return (self.__class__, (self.root,))
+
+
+class BufferSink(OutputSink):
+    """Record writes to replay them into another sink, e.g. in the parent process."""
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.ops: list[SinkOp] = []
+
+    def write_text(self, path: str, content: str):
+        self.join(path)
+        self.ops.append(("text", path, content))
+
+    def copy_file(self, source: MoinSource, src_path: str, path: str):
+        self.join(path)
+        self.ops.append(("copy", path, src_path))
+
+    def pop_ops(self) -> list[SinkOp]:
+        ops, self.ops = self.ops, []
+        return ops
+
+
+def replay_ops(ops: list[SinkOp], sink: OutputSink, source: MoinSource):
+    for op, path, arg in ops:
+        if op == "text":
+            sink.write_text(path, arg)
+        elif op == "copy":
+            sink.copy_file(source, arg, path)
+        else:
+            raise ValueError("unknown sink operation: %s" % op)
+
+
+# Archive sinks
+#
+# Archives are written sequentially by the process which opened the sink. Copies of the
+# sink in other processes are detached from the archive, and writes are forwarded through
+# BufferSink instead (see moin2x.moin2x).
+class ArchiveSink(OutputSink):
+    concurrent = False
+
+    def __init__(self, archive_path: str):
+        super().__init__(archive_path)
+        self._archive: Optional[Any] = self._open_archive()
+
+    @abstractmethod
+    def _open_archive(self) -> Any:
+        pass
+
+    def _writable_archive(self) -> Any:
+        if self._archive is None:
+            raise RuntimeError("archive is not opened in this process: %s" % self.root)
+        return self._archive
+
+    def _arcname(self, path: str) -> str:
+        # validate path not to escape from the root
+        return os.path.relpath(self.join(path), self.root).replace(os.sep, "/")
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_archive"] = None
+        return state
+
+
+class TarSink(ArchiveSink):
+    """Write outputs into tar archive in stream mode (compressed by the suffix of path)."""
+
+    COMPRESSIONS = [
+        (".tar.gz", "gz"),
+        (".tgz", "gz"),
+        (".tar.bz2", "bz2"),
+        (".tar.xz", "xz"),
+        (".tar", ""),
+    ]
+
+    def _open_archive(self) -> tarfile.TarFile:
+        compression = ""
+        for suffix, name in self.COMPRESSIONS:
+            if self.root.endswith(suffix):
+                compression = name
+                break
+        return tarfile.open(self.root, "w|" + compression)  # type: ignore
+
+    def _add(self, path: str, size: int, mtime: float, f: IO[bytes]):
+        tarinfo = tarfile.TarInfo(self._arcname(path))
+        tarinfo.size = size
+        tarinfo.mtime = int(mtime)
+        tarinfo.mode = 0o644
+        self._writable_archive().addfile(tarinfo, f)
+
+    def write_text(self, path: str, content: str):
+        data = content.encode("utf-8")
+        self._add(path, len(data), time.time(), io.BytesIO(data))
+        self.stats.written_pages += 1
+
+    def copy_file(self, source: MoinSource, src_path: str, path: str):
+        st = source.stat(src_path)
+        with source.open(src_path) as f:
+            self._add(path, st.size, st.mtime_ns / 1000**3, f)
+        self.stats.copied(st.size)
+
+
+class ZipSink(ArchiveSink):
+    """Write outputs into zip archive."""
+
+    def _open_archive(self) -> zipfile.ZipFile:
+        return zipfile.ZipFile(self.root, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def write_text(self, path: str, content: str):
+        self._writable_archive().writestr(self._arcname(path), content.encode("utf-8"))
+        self.stats.written_pages += 1
+
+    def copy_file(self, source: MoinSource, src_path: str, path: str):
+        archive: zipfile.ZipFile = self._writable_archive()
+        st = source.stat(src_path)
+        # zip can't hold timestamps before 1980
+        date_time = max(time.localtime(st.mtime_ns / 1000**3)[:6], (1980, 1, 1, 0, 0, 0))
+        zinfo = zipfile.ZipInfo(self._arcname(path), date_time=date_time)
+        zinfo.compress_type = archive.compression
+        zinfo.external_attr = 0o644 << 16
+        # the size known in advance lets the archive use zip64 extensions for large files
+        zinfo.file_size = st.size
+        with source.open(src_path) as src, archive.open(zinfo, "w") as dst:
+            shutil.copyfileobj(src, dst)
+        self.stats.copied(st.size)
+
+
+def open_sink(dst: str, transfer: TransferMode = "copy", verify_hash: bool = False) -> OutputSink:
+    """Open output directory, or tar/zip archive if dst has the archive suffix.
+
+    transfer and verify_hash are used only for output directory.
+    """
+    if dst.endswith(".zip"):
+        return ZipSink(dst)
+    for suffix, _compression in TarSink.COMPRESSIONS:
+        if dst.endswith(suffix):
+            return TarSink(dst)
+    return DirectorySink(dst, transfer=transfer, verify_hash=verify_hash)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Iterator, Optional
+
+import attr
+
+from moin2x.moin_site_scanner import (
+    MoinAttachment,
+    MoinEditLogEntry,
+    MoinPageInfo,
+    MoinSiteScanner,
+)
+from moin2x.site_index_db import MoinSiteIndexDB
+from moin2x.source import MoinSource
+
+logger = logging.getLogger(__name__)
+
+SITE_STRUCTURE_VERSION = 1
+
+
+def _relpath(root: str, path: str) -> str:
+    if not path.startswith(root + os.sep):
+        raise ValueError("path not in the source: %s" % path)
+    return path[len(root) + len(os.sep) :].replace(os.sep, "/")
+
+
+def _page_to_dict(page: MoinPageInfo, root: str) -> dict[str, Any]:
+    last_edit = None
+    if page.last_edit is not None:
+        edit = page.last_edit
+        last_edit = [edit.timestamp.isoformat(), edit.revision, edit.action, edit.author_id]
+    return {
+        "name": page.name,
+        "file": _relpath(root, page.filepath),
+        "updated": page.updated.isoformat() if page.updated is not None else None,
+        "last_edit": last_edit,
+        "attachments": [
+            [a.name, a.size, a.mtime_ns] for a in sorted(page.attachments, key=lambda a: a.name)
+        ],
+    }
+
+
+def _page_from_dict(data: dict[str, Any], source: MoinSource) -> MoinPageInfo:
+    filepath = source.join(*data["file"].split("/"))
+    attachments_dir = os.path.join(os.path.dirname(os.path.dirname(filepath)), "attachments")
+    last_edit = None
+    if data["last_edit"] is not None:
+        timestamp, revision, action, author_id = data["last_edit"]
+        last_edit = MoinEditLogEntry(
+            timestamp=datetime.fromisoformat(timestamp),
+            revision=revision,
+            action=action,
+            author_id=author_id,
+        )
+    return MoinPageInfo(
+        filepath=filepath,
+        name=data["name"],
+        updated=datetime.fromisoformat(data["updated"]) if data["updated"] is not None else None,
+        last_edit=last_edit,
+        attachments=set(
+            [
+                MoinAttachment(
+                    filepath=os.path.join(attachments_dir, name),
+                    name=name,
+                    size=size,
+                    mtime_ns=mtime,
+                )
+                for name, size, mtime in data["attachments"]
+            ]
+        ),
+    )
+
+
+@attr.s(frozen=True)
+class MoinSiteIndex:
+    """Materialized result of site scan.
+
+    Scan the site once and share it between converters and the conversion loop.
+    """
+
+    pages: tuple[MoinPageInfo, ...] = attr.ib(converter=tuple)
+    _pages_by_name: dict[str, MoinPageInfo] = attr.ib(init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        pages_by_name = dict([(page.name, page) for page in self.pages])
+        object.__setattr__(self, "_pages_by_name", pages_by_name)
+
+    @classmethod
+    def scan(
+        cls,
+        page_dir: str | MoinSource,
+        workers: int = 1,
+        index_file: Optional[str] = None,
+        patterns: Optional[list[str]] = None,
+    ) -> MoinSiteIndex:
+        """Scan pages directory (or tar/zip archive of it).
+
+        If index_file is given, refresh the on-disk index first and read pages from it.
+        If patterns are given, only pages matching any of them (pagename or glob) are scanned.
+        """
+        logger.info("+ Scan Moin Site: %s" % page_dir)
+        if index_file is not None:
+            with MoinSiteIndexDB(index_file, page_dir, workers=workers) as index_db:
+                index_db.refresh(patterns)
+                pages = list(index_db.scan_pages(patterns))
+        else:
+            scanner = MoinSiteScanner(page_dir, workers=workers)
+            pages = list(scanner.scan_pages(patterns))
+        logger.info("++ found %d pages" % len(pages))
+        return cls(pages=pages)
+
+    @classmethod
+    def load(cls, structure_file: str, source: MoinSource) -> MoinSiteIndex:
+        """Load site index saved by save() instead of scanning the site.
+
+        Paths are resolved against the given source, which may be another copy of the site.
+        """
+        logger.info("+ Load Site Structure: %s" % structure_file)
+        with open(structure_file, "r") as f:
+            data: dict[str, Any] = json.load(f)
+        if data.get("version") != SITE_STRUCTURE_VERSION:
+            raise ValueError("unsupported site structure version: %s" % data.get("version"))
+        pages = [_page_from_dict(page_data, source) for page_data in data["pages"]]
+        logger.info("++ found %d pages" % len(pages))
+        return cls(pages=pages)
+
+    def save(self, structure_file: str, source: MoinSource):
+        """Save site index into JSON file, with paths relative to the source."""
+        logger.info("+ Save Site Structure: %s" % structure_file)
+        data = {
+            "version": SITE_STRUCTURE_VERSION,
+            "pages": [_page_to_dict(page, source.root) for page in self.pages],
+        }
+        tmp_file = structure_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_file, structure_file)
+
+    def updated(self, changes: dict[str, Optional[MoinPageInfo]]) -> MoinSiteIndex:
+        """Return new index with pages replaced, added or removed (None) by pagename."""
+        pages: list[MoinPageInfo] = []
+        for page in self.pages:
+            new_page = changes.get(page.name, page)
+            if new_page is not None:
+                pages.append(new_page)
+        for pagename, new_page in sorted(changes.items()):
+            if new_page is not None and pagename not in self._pages_by_name:
+                pages.append(new_page)
+        return self.__class__(pages=pages)
+
+    def __iter__(self) -> Iterator[MoinPageInfo]:
+        return iter(self.pages)
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __contains__(self, pagename: str) -> bool:
+        return pagename in self._pages_by_name
+
+    def get(self, pagename: str) -> Optional[MoinPageInfo]:
+        return self._pages_by_name.get(pagename)
+
+    @property
+    def pagenames(self) -> list[str]:
+        return [page.name for page in self.pages]
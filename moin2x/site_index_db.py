@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import concurrent.futures
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import attr
+
+from moin2x.moin_site_scanner import (
+    MoinAttachment,
+    MoinEditLogEntry,
+    MoinPageInfo,
+    MoinSiteScanner,
+    match_pagename,
+)
+from moin2x.moinutils import unquoteWikiname
+from moin2x.source import MoinSource
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = "1"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    entryname TEXT PRIMARY KEY,  -- quoted directory name
+    signature TEXT NOT NULL,  -- mtimes of the directory and its metadata files
+    name TEXT NOT NULL,
+    revision TEXT,  -- NULL if the entry is not a content page
+    last_edit_us INTEGER,
+    last_edit_revision TEXT,
+    last_edit_action TEXT,
+    last_edit_author_id TEXT
+);
+CREATE TABLE IF NOT EXISTS revisions (
+    entryname TEXT NOT NULL REFERENCES entries(entryname) ON DELETE CASCADE,
+    revision TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (entryname, revision)
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    entryname TEXT NOT NULL REFERENCES entries(entryname) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (entryname, name)
+);
+"""
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _datetime_to_us(value: datetime) -> int:
+    return (value - EPOCH) // (datetime.resolution)
+
+
+@attr.s(frozen=True)
+class _ScannedEntry:
+    entryname: str = attr.ib()
+    signature: str = attr.ib()
+    page: Optional[MoinPageInfo] = attr.ib()
+    revisions: list[tuple[str, int]] = attr.ib(factory=list)
+    attachments: list[tuple[str, int, int]] = attr.ib(factory=list)
+
+
+class MoinSiteIndexDB(object):
+    """On-disk SQLite index of MoinMoin pages directory.
+
+    Entries are keyed by quoted directory name and rescanned only when the mtime of the page
+    directory or its metadata (current, edit-log, revisions/, attachments/) changes.
+    The index provides scan_pages() compatible with MoinSiteScanner, and sizes of revisions
+    and attachments (used by estimate_site) without stat-ing the pages directory.
+    """
+
+    def __init__(self, index_file: str, page_dir: str | MoinSource, workers: int = 1):
+        self.index_file = index_file
+        self.scanner = MoinSiteScanner(page_dir, workers=workers)
+        self.source = self.scanner.source
+        self.page_dir = self.source.root
+
+        self.conn = sqlite3.connect(index_file)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'page_dir'").fetchone()
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        abs_page_dir = os.path.abspath(self.page_dir)
+        if row is None or row[0] != abs_page_dir or version != (SCHEMA_VERSION,):
+            with self.conn:
+                self.conn.execute("DELETE FROM entries")
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    [("page_dir", abs_page_dir), ("version", SCHEMA_VERSION)],
+                )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> MoinSiteIndexDB:
+        return self
+
+    def __exit__(self, *args: object):
+        self.close()
+
+    def _mtime_ns(self, path: str) -> int:
+        try:
+            return self.source.stat(path).mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _signature(self, entryname: str) -> str:
+        paths = [
+            self.source.join(entryname),
+            self.source.join(entryname, "current"),
+            self.source.join(entryname, "edit-log"),
+            self.source.join(entryname, "revisions"),
+            self.source.join(entryname, "attachments"),
+        ]
+        return ":".join([str(self._mtime_ns(p)) for p in paths])
+
+    def _scan_entry(
+        self, entryname: str, known_signature: Optional[str]
+    ) -> Optional[_ScannedEntry]:
+        """Scan entry if it is changed since the last refresh."""
+        signature = self._signature(entryname)
+        if signature == known_signature:
+            return None
+
+        page = self.scanner.scan_entry(entryname)
+        if page is None:
+            return _ScannedEntry(entryname=entryname, signature=signature, page=None)
+
+        revisions: list[tuple[str, int]] = []
+        revisions_dir = self.source.join(entryname, "revisions")
+        for name in self.source.listdir(revisions_dir):
+            revision_file = os.path.join(revisions_dir, name)
+            if self.source.isfile(revision_file):
+                revisions.append((name, self.source.stat(revision_file).size))
+
+        attachments: list[tuple[str, int, int]] = []
+        for attachment in page.attachments:
+            st = self.source.stat(attachment.filepath)
+            attachments.append((attachment.name, st.size, st.mtime_ns))
+
+        return _ScannedEntry(
+            entryname=entryname,
+            signature=signature,
+            page=page,
+            revisions=revisions,
+            attachments=attachments,
+        )
+
+    def refresh(self, patterns: Optional[list[str]] = None) -> int:
+        """Update the index to match pages directory. Returns the number of rescanned entries.
+
+        If patterns are given, only entries of matching pages are refreshed.
+        """
+        logger.info("+ Refresh Site Index: %s" % self.index_file)
+        entrynames = self.scanner.page_entrynames(patterns)
+        signatures: dict[str, str] = dict(
+            self.conn.execute("SELECT entryname, signature FROM entries")
+        )
+        if patterns is not None:
+            signatures = dict(
+                [
+                    (entryname, signature)
+                    for entryname, signature in signatures.items()
+                    if match_pagename(unquoteWikiname(entryname), patterns)
+                ]
+            )
+
+        def scan_entry(entryname: str) -> Optional[_ScannedEntry]:
+            return self._scan_entry(entryname, signatures.get(entryname))
+
+        if self.scanner.workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.scanner.workers) as ex:
+                results = list(ex.map(scan_entry, entrynames))
+        else:
+            results = [scan_entry(entryname) for entryname in entrynames]
+        scanned = [entry for entry in results if entry is not None]
+
+        removed = sorted(set(signatures) - set(entrynames))
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM entries WHERE entryname = ?", [(e,) for e in removed]
+            )
+            for entry in scanned:
+                self._store_entry(entry)
+        logger.info("++ rescanned: %d, removed: %d" % (len(scanned), len(removed)))
+        return len(scanned)
+
+    def _store_entry(self, entry: _ScannedEntry):
+        self.conn.execute("DELETE FROM entries WHERE entryname = ?", (entry.entryname,))
+        page = entry.page
+        last_edit = page.last_edit if page is not None else None
+        self.conn.execute(
+            "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry.entryname,
+                entry.signature,
+                page.name if page is not None else "",
+                os.path.basename(page.filepath) if page is not None else None,
+                _datetime_to_us(last_edit.timestamp) if last_edit is not None else None,
+                last_edit.revision if last_edit is not None else None,
+                last_edit.action if last_edit is not None else None,
+                last_edit.author_id if last_edit is not None else None,
+            ),
+        )
+        self.conn.executemany(
+            "INSERT INTO revisions VALUES (?, ?, ?)",
+            [(entry.entryname, rev, size) for rev, size in entry.revisions],
+        )
+        self.conn.executemany(
+            "INSERT INTO attachments VALUES (?, ?, ?, ?)",
+            [(entry.entryname, name, size, mtime) for name, size, mtime in entry.attachments],
+        )
+
+    def scan_pages(self, patterns: Optional[list[str]] = None) -> Iterator[MoinPageInfo]:
+        attachments: dict[str, set[MoinAttachment]] = {}
+        rows = self.conn.execute("SELECT entryname, name, size, mtime_ns FROM attachments")
+        for entryname, name, size, mtime_ns in rows:
+            attachment_file = self.source.join(entryname, "attachments", name)
+            attachments.setdefault(entryname, set()).add(
+                MoinAttachment(filepath=attachment_file, name=name, size=size, mtime_ns=mtime_ns)
+            )
+
+        rows = self.conn.execute(
+            "SELECT * FROM entries WHERE revision IS NOT NULL ORDER BY entryname"
+        )
+        for entryname, _sig, name, revision, us, edit_rev, action, author_id in rows:
+            if patterns is not None and not match_pagename(name, patterns):
+                continue
+            last_edit = None
+            if us is not None:
+                last_edit = MoinEditLogEntry.from_fields(us, edit_rev, action, author_id)
+            yield MoinPageInfo(
+                filepath=self.source.join(entryname, "revisions", revision),
+                name=name,
+                updated=last_edit.timestamp if last_edit is not None else None,
+                last_edit=last_edit,
+                attachments=attachments.get(entryname, set()),
+            )
+
+    def revision_sizes(self) -> dict[str, dict[str, int]]:
+        """Return sizes of all revision files by page name."""
+        ret: dict[str, dict[str, int]] = {}
+        rows = self.conn.execute(
+            "SELECT e.name, r.revision, r.size FROM revisions r"
+            " JOIN entries e ON e.entryname = r.entryname WHERE e.revision IS NOT NULL"
+        )
+        for name, revision, size in rows:
+            ret.setdefault(name, {})[revision] = size
+        return ret
+
+    def attachment_stats(self) -> dict[str, dict[str, tuple[int, int]]]:
+        """Return (size, mtime_ns) of all attachments by page name."""
+        ret: dict[str, dict[str, tuple[int, int]]] = {}
+        rows = self.conn.execute(
+            "SELECT e.name, a.name, a.size, a.mtime_ns FROM attachments a"
+            " JOIN entries e ON e.entryname = a.entryname"
+        )
+        for pagename, name, size, mtime_ns in rows:
+            ret.setdefault(pagename, {})[name] = (size, mtime_ns)
+        return ret
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import bz2
+import collections
+import gzip
+import io
+import logging
+import lzma
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+from abc import ABCMeta, abstractmethod
+from typing import IO, Any, Iterator, Tuple
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(frozen=True)
+class MoinSourceStat:
+    size: int = attr.ib()
+    mtime_ns: int = attr.ib()
+
+
+class MoinSource(metaclass=ABCMeta):
+    """Read-only access to MoinMoin pages directory.
+
+    Paths are built by join() and look like paths under the root (the pages directory or
+    the archive file), so that MoinPageInfo.filepath keeps identifying the file.
+    """
+
+    root: str
+
+    def join(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    @abstractmethod
+    def listdir(self, path: str) -> list[str]:
+        pass
+
+    def subdirs(self, path: str) -> list[str]:
+        return [name for name in self.listdir(path) if self.isdir(os.path.join(path, name))]
+
+    @abstractmethod
+    def isdir(self, path: str) -> bool:
+        pass
+
+    @abstractmethod
+    def isfile(self, path: str) -> bool:
+        pass
+
+    @abstractmethod
+    def stat(self, path: str) -> MoinSourceStat:
+        """Return size and mtime of the file. Raises FileNotFoundError if missing."""
+        pass
+
+    @abstractmethod
+    def open(self, path: str) -> IO[bytes]:
+        """Open the file in binary mode. Raises FileNotFoundError if missing."""
+        pass
+
+    def read_text(self, path: str) -> str:
+        with self.open(path) as f:
+            return io.TextIOWrapper(f).read()
+
+    def copy_file(self, path: str, dst_path: str):
+        with self.open(path) as src, open(dst_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> MoinSource:
+        return self
+
+    def __exit__(self, *args: object):
+        self.close()
+
+    def __str__(self) -> str:
+        return self.root
+
+
+class DirectorySource(MoinSource):
+    def __init__(self, page_dir: str):
+        self.root = page_dir
+
+    def listdir(self, path: str) -> list[str]:
+        return os.listdir(path)
+
+    def subdirs(self, path: str) -> list[str]:
+        # use d_type of directory entries not to stat each entry
+        return [entry.name for entry in os.scandir(path) if entry.is_dir()]
+
+    def isdir(self, path: str) -> bool:
+        return os.path.isdir(path)
+
+    def isfile(self, path: str) -> bool:
+        return os.path.isfile(path)
+
+    def stat(self, path: str) -> MoinSourceStat:
+        st = os.stat(path)
+        return MoinSourceStat(size=st.st_size, mtime_ns=st.st_mtime_ns)
+
+    def open(self, path: str) -> IO[bytes]:
+        return open(path, "rb")
+
+    def read_text(self, path: str) -> str:
+        with open(path, "r") as f:
+            return f.read()
+
+    def copy_file(self, path: str, dst_path: str):
+        shutil.copy(path, dst_path)
+
+    def __reduce__(self):
+        return (self.__class__, (self.root,))
+
+
+# Archive sources
+#
+# Members are indexed once when the archive is opened. The archive handle is opened lazily
+# per thread and per process, so that the source can be shared by the scanner threads and
+# pickled into worker processes.
+ArchiveMember = Tuple[Any, int, int]  # (key to open the member, size, mtime_ns)
+
+
+class ArchiveSource(MoinSource):
+    def __init__(self, archive_path: str):
+        self.root = archive_path
+        self.archive_path = archive_path
+        self._handles_lock = threading.Lock()
+        self._local = threading.local()
+        self._handles: list[Any] = []
+
+        members = dict([(name, member) for name, member in self._read_members()])
+        self.pages_prefix = self._find_pages_prefix(list(members))
+        logger.debug("+ Pages Directory in Archive: '%s'" % self.pages_prefix)
+
+        self._files: dict[str, ArchiveMember] = {}
+        self._dirs: dict[str, set[str]] = {"": set()}
+        for name, member in members.items():
+            if self.pages_prefix and not name.startswith(self.pages_prefix + "/"):
+                continue
+            relpath = name[len(self.pages_prefix) :].lstrip("/")
+            if not relpath:
+                continue
+            if member is not None:
+                self._files[relpath] = member
+            # register all parent directories even if the archive has no entry of them
+            child = relpath
+            parent = os.path.dirname(relpath)
+            while True:
+                self._dirs.setdefault(parent, set()).add(os.path.basename(child))
+                if not parent:
+                    break
+                child, parent = parent, os.path.dirname(parent)
+            if member is None:
+                self._dirs.setdefault(relpath, set())
+
+    @staticmethod
+    def _find_pages_prefix(names: list[str]) -> str:
+        # pages directory is the parent of page directories having "current" file
+        counter = collections.Counter(
+            [
+                os.path.dirname(os.path.dirname(name))
+                for name in names
+                if os.path.basename(name) == "current"
+            ]
+        )
+        if not counter:
+            return ""
+        return counter.most_common(1)[0][0]
+
+    @staticmethod
+    def _normalize_name(name: str) -> str:
+        name = name.strip("/")
+        while name.startswith("./"):
+            name = name[2:]
+        return "" if name == "." else name
+
+    @abstractmethod
+    def _read_members(self) -> Iterator[Tuple[str, ArchiveMember | None]]:
+        """Yield normalized member names and members (None for directories)."""
+        pass
+
+    @abstractmethod
+    def _open_archive(self) -> Any:
+        pass
+
+    @abstractmethod
+    def _open_member(self, archive: Any, key: Any) -> IO[bytes]:
+        pass
+
+    def _archive(self) -> Any:
+        archive = getattr(self._local, "archive", None)
+        if archive is None or self._local.pid != os.getpid():
+            archive = self._open_archive()
+            self._local.archive = archive
+            self._local.pid = os.getpid()
+            with self._handles_lock:
+                self._handles.append(archive)
+        return archive
+
+    def _relpath(self, path: str) -> str:
+        if path == self.root:
+            return ""
+        if not path.startswith(self.root + os.sep):
+            raise FileNotFoundError(path)
+        return path[len(self.root) + len(os.sep) :].replace(os.sep, "/")
+
+    def listdir(self, path: str) -> list[str]:
+        children = self._dirs.get(self._relpath(path))
+        if children is None:
+            raise FileNotFoundError(path)
+        return list(children)
+
+    def isdir(self, path: str) -> bool:
+        try:
+            return self._relpath(path) in self._dirs
+        except FileNotFoundError:
+            return False
+
+    def isfile(self, path: str) -> bool:
+        try:
+            return self._relpath(path) in self._files
+        except FileNotFoundError:
+            return False
+
+    def stat(self, path: str) -> MoinSourceStat:
+        relpath = self._relpath(path)
+        member = self._files.get(relpath)
+        if member is not None:
+            _key, size, mtime_ns = member
+            return MoinSourceStat(size=size, mtime_ns=mtime_ns)
+        if relpath in self._dirs:
+            # directories in archives never change
+            return MoinSourceStat(size=0, mtime_ns=0)
+        raise FileNotFoundError(path)
+
+    def open(self, path: str) -> IO[bytes]:
+        member = self._files.get(self._relpath(path))
+        if member is None:
+            raise FileNotFoundError(path)
+        key, _size, _mtime_ns = member
+        return self._open_member(self._archive(), key)
+
+    def close(self):
+        with self._handles_lock:
+            for archive in self._handles:
+                archive.close()
+            self._handles = []
+        self._local = threading.local()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        # archive handles are opened again on the other side
+        del state["_handles_lock"]
+        del state["_local"]
+        del state["_handles"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        vars(self).update(state)
+        self._handles_lock = threading.Lock()
+        self._local = threading.local()
+        self._handles = []
+
+
+def _remove_spool_file(path: str, owner_pid: int):
+    if os.getpid() != owner_pid:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class TarSource(ArchiveSource):
+    """MoinMoin pages directory in tar archive.
+
+    Compressed archives are decompressed once into a temporary tar file, because seeking
+    backward in compressed stream means decompressing it from the beginning again.
+    """
+
+    DECOMPRESSORS = [
+        (b"\x1f\x8b", gzip.open),
+        (b"BZh", bz2.open),
+        (b"\xfd7zXZ\x00", lzma.open),
+    ]
+
+    def __init__(self, archive_path: str):
+        self.tar_path = archive_path
+        with open(archive_path, "rb") as f:
+            magic = f.read(6)
+        for prefix, decompressor in self.DECOMPRESSORS:
+            if magic.startswith(prefix):
+                self.tar_path = self._spool(archive_path, decompressor)
+                weakref.finalize(self, _remove_spool_file, self.tar_path, os.getpid())
+                break
+        super().__init__(archive_path)
+
+    @staticmethod
+    def _spool(archive_path: str, decompressor: Any) -> str:
+        logger.info("+ Decompress Archive: %s" % archive_path)
+        fd, spool_path = tempfile.mkstemp(prefix="moin2x-", suffix=".tar")
+        with os.fdopen(fd, "wb") as dst, decompressor(archive_path, "rb") as src:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return spool_path
+
+    def _read_members(self) -> Iterator[Tuple[str, ArchiveMember | None]]:
+        with tarfile.open(self.tar_path, "r:") as tar:
+            for tarinfo in tar:
+                name = self._normalize_name(tarinfo.name)
+                if tarinfo.isdir():
+                    yield (name, None)
+                elif tarinfo.isfile():
+                    yield (name, (tarinfo, tarinfo.size, int(tarinfo.mtime * 1000**3)))
+                # links and special files are not part of MoinMoin data
+
+    def _open_archive(self) -> tarfile.TarFile:
+        return tarfile.open(self.tar_path, "r:")
+
+    def _open_member(self, archive: tarfile.TarFile, key: tarfile.TarInfo) -> IO[bytes]:
+        f = archive.extractfile(key)
+        assert f is not None
+        return f
+
+
+class ZipSource(ArchiveSource):
+    """MoinMoin pages directory in zip archive."""
+
+    def _read_members(self) -> Iterator[Tuple[str, ArchiveMember | None]]:
+        with zipfile.ZipFile(self.archive_path) as archive:
+            for zipinfo in archive.infolist():
+                name = self._normalize_name(zipinfo.filename)
+                if zipinfo.is_dir():
+                    yield (name, None)
+                    continue
+                # zip archives store local time
+                mtime = time.mktime(zipinfo.date_time + (0, 0, -1))
+                yield (name, (zipinfo.filename, zipinfo.file_size, int(mtime) * 1000**3))
+
+    def _open_archive(self) -> zipfile.ZipFile:
+        return zipfile.ZipFile(self.archive_path)
+
+    def _open_member(self, archive: zipfile.ZipFile, key: str) -> IO[bytes]:
+        return archive.open(key)
+
+
+def open_source(path: str) -> MoinSource:
+    """Open pages directory, or tar/zip archive of it."""
+    if os.path.isdir(path) or not os.path.exists(path):
+        return DirectorySource(path)
+    if tarfile.is_tarfile(path):
+        return TarSource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path)
+    raise ValueError("source must be pages directory or tar/zip archive: %s" % path)
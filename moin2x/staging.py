@@ -0,0 +1,122 @@
+import ctypes
+import errno
+import glob
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# renameat2(2) flag to exchange two paths atomically (linux/fs.h)
+RENAME_EXCHANGE = 2
+AT_FDCWD = -100
+
+CLEANUP_THREAD_NAME = "moin2x-cleanup"
+
+
+def _sibling_prefix(dst_dir: str) -> str:
+    dst_dir = os.path.abspath(dst_dir)
+    return os.path.join(os.path.dirname(dst_dir), ".%s.moin2x-" % os.path.basename(dst_dir))
+
+
+def create_staging_dir(dst_dir: str) -> str:
+    """Create a hidden sibling directory of dst_dir to write outputs into.
+
+    It lives on the same filesystem as dst_dir, so that it can be renamed into place.
+    Its mode is the same as directories created by os.makedirs (not 0700 of mkdtemp),
+    since it becomes dst_dir.
+    """
+    prefix = _sibling_prefix(dst_dir)
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    staging_dir = tempfile.mkdtemp(
+        prefix=os.path.basename(prefix) + "staging-", dir=os.path.dirname(prefix)
+    )
+    os.chmod(staging_dir, 0o777 & ~_umask())
+    return staging_dir
+
+
+def _umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def leftover_dirs(dst_dir: str) -> list[str]:
+    """Return staging or old directories left by interrupted runs."""
+    return sorted(glob.glob(glob.escape(_sibling_prefix(dst_dir)) + "*"))
+
+
+def find_staging_dir(dst_dir: str, marker: str) -> Optional[str]:
+    """Return the latest staging directory left by interrupted runs, having marker file."""
+    staging_prefix = _sibling_prefix(dst_dir) + "staging-"
+    candidates: list[Tuple[float, str]] = []
+    for path in leftover_dirs(dst_dir):
+        if not path.startswith(staging_prefix):
+            continue
+        try:
+            candidates.append((os.stat(os.path.join(path, marker)).st_mtime, path))
+        except FileNotFoundError:
+            continue
+    if not candidates:
+        return None
+    return max(candidates)[1]
+
+
+def _exchange(path1: str, path2: str) -> bool:
+    """Exchange two paths atomically. Returns False if not supported."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    renameat2.argtypes = [
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_uint,
+    ]
+    ret = renameat2(AT_FDCWD, os.fsencode(path1), AT_FDCWD, os.fsencode(path2), RENAME_EXCHANGE)
+    if ret == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+        return False
+    raise OSError(err, os.strerror(err), path1, None, path2)
+
+
+def swap_into_place(staging_dir: str, dst_dir: str) -> Optional[str]:
+    """Move staging_dir to dst_dir, and return where the previous dst_dir is moved to."""
+    if not os.path.lexists(dst_dir):
+        os.rename(staging_dir, dst_dir)
+        return None
+    if _exchange(staging_dir, dst_dir):
+        return staging_dir
+    # dst_dir is missing only between two renames
+    old_dir = tempfile.mkdtemp(
+        prefix=os.path.basename(_sibling_prefix(dst_dir)) + "old-",
+        dir=os.path.dirname(os.path.abspath(dst_dir)),
+    )
+    os.rename(dst_dir, os.path.join(old_dir, "content"))
+    os.rename(staging_dir, dst_dir)
+    return old_dir
+
+
+def remove_in_background(paths: list[str]) -> Optional[threading.Thread]:
+    """Remove directories in a thread. The interpreter waits for it before exiting."""
+    if not paths:
+        return None
+
+    def remove():
+        for path in paths:
+            logger.debug("++ remove: %s" % path)
+            shutil.rmtree(path, ignore_errors=True)
+
+    thread = threading.Thread(target=remove, name=CLEANUP_THREAD_NAME)
+    thread.start()
+    return thread
@@ -0,0 +1,81 @@
+import hashlib
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from moin2x.attachment_store import AttachmentHashCache, AttachmentStore
+from moin2x.path_builder import MarkdownPathBuilder
+from moin2x.sink import DirectorySink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import open_source
+
+from .conftest import MoinSitedirFixture
+
+
+def test_build(moin_sitedir: MoinSitedirFixture):
+    source = open_source(moin_sitedir)
+    store = AttachmentStore.build(MoinSiteIndex.scan(source), source)
+    jpg = store.filepath("テスト", "file_example_JPG_100kB.jpg")
+    png = store.filepath("テスト/attachments_test", "file_example_PNG_500kB.png")
+    assert jpg == store.filepath("テスト/attachments_test", "file_example_JPG_100kB.jpg")
+    assert jpg is not None and png is not None
+    with open(
+        os.path.join(
+            moin_sitedir, "(e38386e382b9e38388)", "attachments", "file_example_JPG_100kB.jpg"
+        ),
+        "rb",
+    ) as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    assert jpg == "_attachments/%s/%s.jpg" % (digest[:2], digest)
+    assert store.filepath("テスト", "missing.jpg") is None
+    assert len(store.files) == 2
+
+
+def test_hash_cache(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    source = open_source(moin_sitedir)
+    site_index = MoinSiteIndex.scan(source)
+    cache_file = str(tmp_path / "hashes.json")
+    cache = AttachmentHashCache(cache_file)
+    expected = AttachmentStore.build(site_index, source, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    cache = AttachmentHashCache(cache_file)
+    with patch("moin2x.attachment_store.file_sha256", side_effect=RuntimeError("rehash")):
+        store = AttachmentStore.build(site_index, source, cache=cache)
+    assert (cache.hits, cache.misses) == (3, 0)
+    assert store == expected
+
+
+def test_write(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    source = open_source(moin_sitedir)
+    store = AttachmentStore.build(MoinSiteIndex.scan(source), source)
+    sink = DirectorySink(str(tmp_path / "output"))
+    outputs = store.write(sink, source)
+    assert outputs == sorted(store.files)
+    assert sink.stats.copied_files == 2
+    for output in outputs:
+        assert (tmp_path / "output" / output).exists()
+
+
+def test_attachment_url(moin_sitedir: MoinSitedirFixture):
+    source = open_source(moin_sitedir)
+    store = AttachmentStore.build(MoinSiteIndex.scan(source), source)
+    path_builder = MarkdownPathBuilder(root_path="/wiki")
+    path_builder.attachment_store = store
+    jpg = store.filepath("テスト", "file_example_JPG_100kB.jpg")
+    expected = "/wiki/%s" % jpg
+    assert path_builder.attachment_url(None, "file_example_JPG_100kB.jpg", "テスト") == expected
+    assert (
+        path_builder.attachment_url(
+            "../attachments_test", "file_example_JPG_100kB.jpg", "テスト/page_test"
+        )
+        == expected
+    )
+    assert (
+        path_builder.attachment_url(
+            "テスト/attachments_test", "file_example_JPG_100kB.jpg", "FrontPage"
+        )
+        == expected
+    )
+    # attachments not in the store are referred as before
+    assert path_builder.attachment_url(None, "missing.jpg", "テスト") == "./missing.jpg"
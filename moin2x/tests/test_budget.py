@@ -0,0 +1,58 @@
+import signal
+import sys
+import time
+
+import pytest
+
+from moin2x.budget import PageBudget, PageBudgetExceeded, PageUsage, page_budget
+
+
+def busy_loop(seconds: float):
+    start = time.process_time()
+    while time.process_time() - start < seconds:
+        pass
+
+
+def test_within_budget():
+    with page_budget(PageBudget(cpu_time=10, memory=1024 * 1024 * 1024)) as usage:
+        busy_loop(0.01)
+        data = bytearray(1024 * 1024)
+    assert len(data) == 1024 * 1024
+    assert usage.cpu_time >= 0.01
+    assert signal.getitimer(signal.ITIMER_PROF) == (0.0, 0.0)
+
+
+def test_cpu_time_exceeded():
+    usage = PageUsage()
+    with pytest.raises(PageBudgetExceeded) as excinfo:
+        with page_budget(PageBudget(cpu_time=0.05), usage):
+            busy_loop(10)
+    assert excinfo.value.resource_name == "cpu time"
+    assert 0.05 <= usage.cpu_time < 10
+    assert signal.getsignal(signal.SIGPROF) == signal.SIG_DFL
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc/self/statm")
+def test_memory_exceeded():
+    with pytest.raises(PageBudgetExceeded) as excinfo:
+        with page_budget(PageBudget(memory=64 * 1024 * 1024)):
+            bytearray(1024 * 1024 * 1024)
+    assert excinfo.value.resource_name == "memory"
+    # the limit is lifted after the context
+    assert len(bytearray(256 * 1024 * 1024)) == 256 * 1024 * 1024
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc/self/statm")
+def test_limits_lifted_when_timer_fires_early():
+    import resource
+
+    old_memory_limit = resource.getrlimit(resource.RLIMIT_AS)
+    for _ in range(20):
+        # the timer may fire while the limits are being armed
+        usage = PageUsage()
+        with pytest.raises(PageBudgetExceeded):
+            with page_budget(PageBudget(cpu_time=0.000001, memory=1024 * 1024 * 1024), usage):
+                busy_loop(10)
+        assert resource.getrlimit(resource.RLIMIT_AS) == old_memory_limit
+        assert signal.getsignal(signal.SIGPROF) == signal.SIG_DFL
+        assert usage.cpu_time < 10
@@ -0,0 +1,58 @@
+from pathlib import Path
+from typing import Any, Optional
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from moin2x.attachment_store import AttachmentStore
+from moin2x.cli import convert_site_options, run_convert_site
+from moin2x.moin2x import Moin2XConverter
+from moin2x.sink import OutputSink
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import MoinSource
+
+from .conftest import MoinSitedirFixture
+
+
+def make_converter(
+    source: MoinSource,
+    sink: OutputSink,
+    site_index: MoinSiteIndex,
+    attachment_store: Optional[AttachmentStore],
+) -> Moin2XConverter:
+    raise AssertionError("not converted")
+
+
+@click.command()
+@convert_site_options
+def convert_site(configfile: Optional[str], verbose: bool, debug: bool, **options: Any):
+    run_convert_site(make_converter, **options)
+
+
+@pytest.mark.parametrize(
+    ("args", "message"),
+    [
+        (["--raw-fallback"], "--raw-fallback needs --page-time-limit"),
+        (["--history", "--watch"], "--history can't be used with"),
+        (["--history", "--dry-run"], "--history can't be used with"),
+        (["--watch", "--dry-run"], "--watch can't be used with --dry-run"),
+        (["--watch", "--shard", "1/2"], "--watch can't be used with --shard"),
+        (["--shard", "3/2"], "shard must be between 1 and 2"),
+    ],
+)
+def test_convert_site_usage_error(
+    moin_sitedir: MoinSitedirFixture, tmp_path: Path, args: list[str], message: str
+):
+    result = CliRunner().invoke(convert_site, [moin_sitedir, str(tmp_path / "out")] + args)
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+def test_export_site_structure(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    structure = tmp_path / "site.json"
+    args = [moin_sitedir, str(tmp_path / "out"), "--export-site-structure", str(structure)]
+    result = CliRunner().invoke(convert_site, args)
+    assert result.exit_code == 0, result.output
+    assert structure.exists()
+    assert not (tmp_path / "out").exists()
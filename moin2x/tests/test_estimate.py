@@ -0,0 +1,31 @@
+from moin2x.estimate import PageSize, SiteEstimate
+
+
+def test_site_estimate():
+    estimate = SiteEstimate(
+        pages=[
+            PageSize(name="A", current_bytes=3000, revisions=3, revision_bytes=6000),
+            PageSize(name="B", current_bytes=1000, revisions=1, revision_bytes=1000),
+            PageSize(name="C", current_bytes=5 * 1024 * 1024, revisions=2, revision_bytes=0),
+        ],
+        attachments=2,
+        attachment_bytes=2048,
+        sampled_pages=2,
+        sampled_bytes=4000,
+        sampled_seconds=2.0,
+    )
+    assert [p.name for p in estimate.largest_pages(2)] == ["C", "A"]
+    assert estimate.projected_seconds == 2.0 / 4000 * (4000 + 5 * 1024 * 1024)
+    assert estimate.report(jobs=2, largest=1).splitlines() == [
+        "pages: 3",
+        "revisions: 6 (6.8 KiB)",
+        "current revisions: 5.0 MiB",
+        "attachments: 2 (2.0 KiB)",
+        "largest pages:",
+        "  C: 5.0 MiB",
+        "sampled conversion: 2 pages (3.9 KiB) in 2.00 sec",
+        "projected conversion time: 0:43:43 (0:21:52 with 2 jobs)",
+    ]
+
+    # no page has been converted
+    assert SiteEstimate(pages=estimate.pages).projected_seconds == 0.0
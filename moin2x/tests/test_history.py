@@ -0,0 +1,79 @@
+import io
+import os
+from pathlib import Path
+
+from moin2x.history import (
+    FastImportWriter,
+    MoinUserDirectory,
+    RevisionEvent,
+    read_revision_events,
+)
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import open_source
+
+from .conftest import MoinSitedirFixture
+
+
+def test_read_revision_events(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    page = site_index.get("テスト/attachments_test")
+    assert page is not None
+    with open_source(moin_sitedir) as source:
+        events = list(read_revision_events(source, page))
+    # edit-log entries of attachments are skipped
+    assert [(e.edit.action, e.edit.revision) for e in events] == [
+        ("SAVENEW", "00000001"),
+        ("SAVE", "00000002"),
+    ]
+    assert events[0].page.filepath == os.path.join(os.path.dirname(page.filepath), "00000001")
+    assert events[0].page.updated == events[0].edit.timestamp
+    assert events[0].hostname == "192.0.2.217"
+    assert not any(e.deleted for e in events)
+
+
+def test_fast_import_writer():
+    stream = io.BytesIO()
+    writer = FastImportWriter(stream)
+    mark = writer.blob(b"hello")
+    assert writer.blob(b"hello") == mark
+    writer.commit(
+        "refs/heads/main",
+        author="User <user@example.com>",
+        timestamp=1000,
+        message="Update Page\n",
+        modified={"a b/index.md": mark},
+        deleted=['"quoted".md'],
+    )
+    writer.close()
+    assert stream.getvalue() == (
+        b"feature done\n"
+        b"blob\nmark :1\ndata 5\nhello\n"
+        b"commit refs/heads/main\nmark :2\n"
+        b"author User <user@example.com> 1000 +0000\n"
+        b"committer User <user@example.com> 1000 +0000\n"
+        b"data 12\nUpdate Page\n\n"
+        b'D "\\"quoted\\".md"\n'
+        b"M 100644 :1 a b/index.md\n"
+        b"\n"
+        b"done\n"
+    )
+
+
+def test_user_directory(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    user_dir = tmp_path / "user"
+    user_dir.mkdir()
+    (user_dir / "1234567890.1.12345").write_text("aliasname=\nemail=taro@example.com\nname=Taro\n")
+    (tmp_path / "pages").mkdir()
+    users = MoinUserDirectory.find(str(tmp_path / "pages"))
+    assert users.user_dir == str(user_dir)
+
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    with open_source(moin_sitedir) as source:
+        events: list[RevisionEvent] = []
+        for pagename in ["テスト", "FrontPage"]:
+            page = site_index.get(pagename)
+            assert page is not None
+            events.append(list(read_revision_events(source, page))[-1])
+    assert users.author(events[0]) == "Taro <taro@example.com>"
+    assert users.author(events[1]) == "1234567890.11.35326 <>"
+    assert MoinUserDirectory.find(moin_sitedir).user_dir is None
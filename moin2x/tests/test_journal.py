@@ -0,0 +1,50 @@
+import os
+from pathlib import Path
+
+from moin2x.journal import JOURNAL_FILENAME, ConversionJournal, output_checksums
+
+
+def write_outputs(root: Path, outputs: dict[str, str]):
+    for output, content in outputs.items():
+        os.makedirs(os.path.dirname(root / output), exist_ok=True)
+        with open(root / output, "w") as f:
+            f.write(content)
+
+
+def test_journal(tmp_path: Path):
+    write_outputs(tmp_path, {"a/index.md": "a", "a/a.png": "png", "b.md": "b"})
+    journal = ConversionJournal(str(tmp_path))
+    assert journal.completed() == {}
+    journal.record("A", output_checksums(str(tmp_path), ["a/index.md", "a/a.png"]))
+    journal.record("B", output_checksums(str(tmp_path), ["b.md"]))
+    journal.close()
+
+    journal = ConversionJournal(str(tmp_path))
+    assert journal.completed() == {"A": ["a/a.png", "a/index.md"], "B": ["b.md"]}
+
+    # outputs changed or removed after recorded
+    write_outputs(tmp_path, {"a/a.png": "changed"})
+    os.remove(tmp_path / "b.md")
+    assert journal.completed() == {}
+
+    journal.remove()
+    assert not os.path.exists(tmp_path / JOURNAL_FILENAME)
+
+
+def test_journal_interrupted(tmp_path: Path):
+    write_outputs(tmp_path, {"a.md": "a", "b.md": "b", "c.md": "c"})
+    journal = ConversionJournal(str(tmp_path))
+    journal.record("A", output_checksums(str(tmp_path), ["a.md"]))
+    journal.record("B", output_checksums(str(tmp_path), ["b.md"]))
+    journal.close()
+
+    # last line is cut by the interruption
+    with open(tmp_path / JOURNAL_FILENAME, "r+") as f:
+        f.truncate(os.path.getsize(tmp_path / JOURNAL_FILENAME) - 10)
+    journal = ConversionJournal(str(tmp_path))
+    assert journal.completed() == {"A": ["a.md"]}
+
+    # resumed run appends after the broken line
+    journal.record("C", output_checksums(str(tmp_path), ["c.md"]))
+    journal.close()
+    assert journal.completed() == {"A": ["a.md"], "C": ["c.md"]}
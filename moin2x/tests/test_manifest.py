@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+
+import attr
+
+from moin2x.manifest import (
+    MANIFEST_FILENAME,
+    MANIFEST_VERSION,
+    ChangeManifest,
+    PageRecord,
+    SiteManifest,
+    remove_outputs,
+    snapshot_outputs,
+)
+from moin2x.moin_site_scanner import MoinSiteScanner
+
+from .conftest import MoinSitedirFixture
+
+
+def test_save_and_load(moin_sitedir: MoinSitedirFixture):
+    manifest = SiteManifest()
+    for page in MoinSiteScanner(moin_sitedir).scan_pages():
+        record = PageRecord.from_page(page, page.name + "/index.md")
+        record.outputs = [record.page_output_path]
+        manifest.pages[page.name] = record
+
+    with tempfile.TemporaryDirectory() as d:
+        manifest.save(d)
+        loaded = SiteManifest.load(d)
+    assert loaded is not None
+    assert loaded == manifest
+    assert loaded.pages["FrontPage"].revision == "00000002"
+
+
+def test_load_missing_or_broken():
+    with tempfile.TemporaryDirectory() as d:
+        assert SiteManifest.load(d) is None
+        with open(os.path.join(d, ".moin2x-manifest.json"), "w") as f:
+            f.write("{broken")
+        assert SiteManifest.load(d) is None
+        for pages in [
+            {"FrontPage": {"revision": "00000001"}},
+            {"FrontPage": {"revision": "00000001", "unknown": 1}},
+            {"FrontPage": ["00000001"]},
+            ["FrontPage"],
+        ]:
+            with open(os.path.join(d, ".moin2x-manifest.json"), "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "pages": pages}, f)
+            assert SiteManifest.load(d) is None
+
+
+def test_has_same_inputs():
+    record = PageRecord(
+        revision="00000002", updated=None, attachments={}, page_output_path="a/index.md"
+    )
+    assert record.has_same_inputs(attr.evolve(record))
+    assert not record.has_same_inputs(record.mark_failed())
+
+
+def test_remove_outputs():
+    with tempfile.TemporaryDirectory() as d:
+        os.makedirs(os.path.join(d, "a/b"))
+        os.makedirs(os.path.join(d, "c"))
+        for path in ["a/b/index.md", "a/b/image.png", "c/index.md", "c/other.md"]:
+            open(os.path.join(d, path), "w").close()
+
+        remove_outputs(d, {"a/b/index.md", "a/b/image.png", "c/index.md"})
+        assert os.listdir(d) == ["c"]
+        assert os.listdir(os.path.join(d, "c")) == ["other.md"]
+
+
+def test_change_manifest():
+    with tempfile.TemporaryDirectory() as d:
+        os.makedirs(os.path.join(d, "a"))
+        for path in ["a/index.md", "a/image.png", "b.md", MANIFEST_FILENAME]:
+            with open(os.path.join(d, path), "w") as f:
+                f.write(path)
+        old = snapshot_outputs(d)
+        assert sorted(old) == ["a/image.png", "a/index.md", "b.md"]
+
+        with open(os.path.join(d, "a/index.md"), "w") as f:
+            f.write("modified")
+        os.remove(os.path.join(d, "b.md"))
+        with open(os.path.join(d, "c.md"), "w") as f:
+            f.write("added")
+        changes = ChangeManifest.compare(old, snapshot_outputs(d))
+        assert changes == ChangeManifest(added=["c.md"], modified=["a/index.md"], deleted=["b.md"])
+
+        changes_file = os.path.join(d, "changes.json")
+        changes.save(changes_file)
+        with open(changes_file) as f:
+            assert json.load(f) == {
+                "added": ["c.md"],
+                "modified": ["a/index.md"],
+                "deleted": ["b.md"],
+            }
@@ -1,3 +1,4 @@
+import random
 import textwrap
 from typing import Tuple
 
@@ -96,3 +97,42 @@ def test_get_params(data: str, expected: Tuple[dict[str, str], dict[str, str]]):
 def test_getTableAttrs(data: str, expected: dict[str, str]):
     ret = moin2x.moin_parser._getTableAttrs(data)  # type: ignore
     assert ret == expected
+
+
+@pytest.mark.parametrize(
+    ("parser_unique", "line", "expected"),
+    [
+        ("", "code }}}\n", "}}}\n"),
+        ("}", "code }}} }}}}", "}}}}"),
+        ("end", "code }}} end}}}", "end}}}"),
+    ],
+)
+def test_parser_scan_re(parser_unique: str, line: str, expected: str):
+    MoinParser = moin2x.moin_parser.MoinParser
+    parser_scan_re = MoinParser._parser_scan_re(parser_unique)  # type: ignore
+    assert MoinParser._parser_scan_re(parser_unique) is parser_scan_re  # type: ignore
+    match = parser_scan_re.search(line)
+    assert match is not None and match.group(0) == expected
+
+
+def test_match_groups():
+    match = moin2x.moin_parser.MoinParser.scan_re.search("see [[SomePage]]")
+    assert match is not None and match.lastgroup == "link"
+    groups = moin2x.moin_parser.MatchGroups(match)
+    assert groups.get("link_target", "") == "SomePage"
+    # like groupdict(), groups not participating in the match are None
+    assert groups.get("link_desc", "") is None
+    assert groups.get("no_such_group", "") == ""
+    assert dict(groups) == match.groupdict()
+
+
+def test_markup_hint_re():
+    MoinParser = moin2x.moin_parser.MoinParser
+    assert MoinParser.markup_hint_re.search("plain text, without any markup.\n") is None
+    # lines without hints of markup are never matched by scan_re
+    chars = list("aZbB ('_~-+)*/^,{}`:[]|@<>&=#!.;?\\XDo123\n") + ["é", "É"]
+    rand = random.Random(0)
+    for _ in range(20000):
+        line = "".join([rand.choice(chars) for _ in range(rand.randint(1, 12))])
+        if MoinParser.markup_hint_re.search(line) is None:
+            assert MoinParser.scan_re.search(line) is None, line
@@ -1,9 +1,17 @@
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import TypeAlias
 
 import pytest
 
-from moin2x.moin_site_scanner import MoinAttachment, MoinPageInfo, MoinSiteScanner
+from moin2x.moin_site_scanner import (
+    MoinAttachment,
+    MoinEditLogEntry,
+    MoinPageInfo,
+    MoinSiteScanner,
+    quoted_prefix,
+    read_last_line,
+)
 
 from .conftest import MoinAbspathFixture, MoinSitedirFixture
 
@@ -22,6 +30,12 @@ def moin_pages(
             name="FrontPage",
             filepath=moin_abspath("FrontPage/revisions/00000002"),
             updated=datetime(2019, 5, 22, 13, 16, 17, 699187, tzinfo=tokyo_tz),
+            last_edit=MoinEditLogEntry(
+                timestamp=datetime(2019, 5, 22, 13, 16, 17, 699187, tzinfo=tokyo_tz),
+                revision="00000002",
+                action="SAVE",
+                author_id="1234567890.11.35326",
+            ),
             attachments=set([]),
         )
     )
@@ -31,6 +45,12 @@ def moin_pages(
             name="テスト",
             filepath=moin_abspath("(e38386e382b9e38388)/revisions/00000002"),
             updated=datetime(2019, 5, 22, 13, 54, 54, 621428, tzinfo=tokyo_tz),
+            last_edit=MoinEditLogEntry(
+                timestamp=datetime(2019, 5, 22, 13, 54, 54, 621428, tzinfo=tokyo_tz),
+                revision="00000002",
+                action="SAVE",
+                author_id="1234567890.1.12345",
+            ),
             attachments=set(
                 [
                     MoinAttachment(
@@ -48,6 +68,12 @@ def moin_pages(
         MoinPageInfo(
             name="テスト/page_test/ページ",
             updated=datetime(2012, 2, 2, 18, 34, 47, tzinfo=tokyo_tz),
+            last_edit=MoinEditLogEntry(
+                timestamp=datetime(2012, 2, 2, 18, 34, 47, tzinfo=tokyo_tz),
+                revision="00000003",
+                action="SAVE",
+                author_id="1234567890.1.12345",
+            ),
             filepath=moin_abspath(
                 "(e38386e382b9e383882f)page_test(2fe3839ae383bce382b8)/revisions/00000003"
             ),  # NOQA
@@ -59,6 +85,12 @@ def moin_pages(
         MoinPageInfo(
             name="テスト/attachments_test",
             updated=datetime(2019, 5, 22, 13, 54, 54, 621428, tzinfo=tokyo_tz),
+            last_edit=MoinEditLogEntry(
+                timestamp=datetime(2019, 5, 22, 13, 54, 54, 621428, tzinfo=tokyo_tz),
+                revision="00000002",
+                action="SAVE",
+                author_id="1234567890.1.12345",
+            ),
             filepath=moin_abspath("(e38386e382b9e383882f)attachments_test/revisions/00000002"),
             attachments=set(
                 [
@@ -95,3 +127,76 @@ def test_scan_pages(moin_sitedir: MoinSitedirFixture, moin_pages: MoinPagesFixtu
 
     if expected:
         raise AssertionError("expected elems are missing: %r" % expected)
+
+
+@pytest.mark.parametrize("workers", [2, 8])
+def test_scan_pages_concurrently(moin_sitedir: MoinSitedirFixture, workers: int):
+    expected = list(MoinSiteScanner(moin_sitedir).scan_pages())
+    scanner = MoinSiteScanner(moin_sitedir, workers=workers)
+    assert list(scanner.scan_pages()) == expected
+
+
+@pytest.mark.parametrize(
+    ("patterns", "expected"),
+    [
+        (["FrontPage"], ["FrontPage"]),
+        (["NotExistingPage"], []),
+        (["テスト/*"], ["テスト/attachments_test", "テスト/page_test/ページ"]),
+        (["テスト", "テスト/page_*"], ["テスト", "テスト/page_test/ページ"]),
+        (["*Page"], ["FrontPage"]),
+    ],
+)
+def test_scan_pages_with_patterns(
+    moin_sitedir: MoinSitedirFixture, patterns: list[str], expected: list[str]
+):
+    scanner = MoinSiteScanner(moin_sitedir)
+    assert sorted([page.name for page in scanner.scan_pages(patterns)]) == sorted(expected)
+
+
+def test_scan_page(moin_sitedir: MoinSitedirFixture):
+    scanner = MoinSiteScanner(moin_sitedir)
+    page = scanner.scan_page("テスト/page_test/ページ")
+    assert page is not None
+    assert page.name == "テスト/page_test/ページ"
+    assert scanner.scan_page("NotExistingPage") is None
+
+
+@pytest.mark.parametrize(
+    ("pattern", "expected"),
+    [
+        ("Team*", "Team"),
+        ("Team/*", "Team(2f"),
+        ("テスト/page_*", "(e38386e382b9e383882f)page_"),
+        ("*", ""),
+    ],
+)
+def test_quoted_prefix(pattern: str, expected: str):
+    assert quoted_prefix(pattern) == expected
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        (b"", b""),
+        (b"\n", b""),
+        (b"first\n", b"first"),
+        (b"first\nsecond", b"second"),
+        (b"first\nsecond\n", b"second"),
+        (b"first\r\nsecond\r\n\r\n", b"second"),
+        (b"x" * 10 + b"\n" + b"y" * 10 + b"\n", b"y" * 10),
+        (b"y" * 10, b"y" * 10),
+    ],
+)
+def test_read_last_line(tmp_path: Path, data: bytes, expected: bytes):
+    filepath = tmp_path / "edit-log"
+    filepath.write_bytes(data)
+    assert read_last_line(str(filepath), chunk_size=3) == expected
+
+
+def test_edit_log_entry_from_line():
+    line = "1328175287000000\t00000003\tSAVE\tPage\t192.0.2.226\t192.0.2.226\t\t\t\n"
+    entry = MoinEditLogEntry.from_line(line)
+    assert entry.revision == "00000003"
+    assert entry.action == "SAVE"
+    assert entry.author_id is None
+    assert entry.timestamp == datetime(2012, 2, 2, 9, 34, 47, tzinfo=timezone.utc)
@@ -42,3 +42,17 @@ def test_parse_quoted_separated_ext(data: str, expected: list[Tuple[str, str] |
 def test_url_unquote(data: str, expected: str):
     ret = moin2x.moinutils.url_unquote(data)
     assert ret == expected
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        ("FrontPage", "FrontPage"),
+        ("テスト", "(e38386e382b9e38388)"),
+        ("テスト/page_test/ページ", "(e38386e382b9e383882f)page_test(2fe3839ae383bce382b8)"),
+    ],
+)
+def test_quote_wikiname_fs(data: str, expected: str):
+    ret = moin2x.moinutils.quoteWikinameFS(data)
+    assert ret == expected
+    assert moin2x.moinutils.unquoteWikiname(ret) == data
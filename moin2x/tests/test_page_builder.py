@@ -0,0 +1,111 @@
+import glob
+import os
+import textwrap
+
+import pytest
+
+import moin2x.page_builder
+from moin2x.moin_parser import MoinParser
+from moin2x.page_builder import PageBuilder
+from moin2x.page_tree import (
+    Big,
+    BulletList,
+    DefinitionDesc,
+    DefinitionList,
+    Emphasis,
+    Listitem,
+    NumberList,
+    PageElement,
+    Paragraph,
+    Small,
+    Strike,
+    Strong,
+    Table,
+    TableRow,
+    Underline,
+)
+
+from .conftest import MoinSitedirFixture
+
+LISTS: list[type[PageElement]] = [BulletList, NumberList, DefinitionList]
+
+
+def walk_status(cur: PageElement) -> dict[str, object]:
+    """Status computed by walking up the tree from the current element."""
+    status: dict[str, object] = {
+        "in_p": cur.in_x([Paragraph]),
+        "in_table": cur.in_x([Table]),
+        "in_table_row": cur.in_x([TableRow]),
+        "in_underline": cur.in_x([Underline]),
+        "in_strike": cur.in_x([Strike]),
+        "in_small": cur.in_x([Small]),
+        "in_big": cur.in_x([Big]),
+        "in_strong": cur.in_x([Strong]),
+        "in_emphasis": cur.in_x([Emphasis]),
+        "in_li_of_current_list": cur.in_x([Listitem], upper_bound=LISTS),
+        "in_dd_of_current_list": cur.in_x([DefinitionDesc], upper_bound=LISTS),
+        "in_list": cur.in_x(LISTS),
+    }
+    list_types: list[str] = []
+    for e in reversed([cur] + cur.parents):
+        for cls, list_type in zip(LISTS, ["ul", "ol", "dl"]):
+            if isinstance(e, cls):
+                list_types.append(list_type)
+    status["list_types"] = list_types
+    if status["in_strong"] and status["in_emphasis"]:
+        for e in [cur] + cur.parents:
+            if isinstance(e, (Strong, Emphasis)):
+                status["is_emphasis_before_strong"] = isinstance(e, Strong)
+                break
+    return status
+
+
+class CheckedPageBuilder(PageBuilder):
+    checked = 0
+
+    def check_status(self):
+        for name, expected in walk_status(self.cur).items():
+            assert getattr(self, name) == expected, (name, self.page_root.tree_repr())
+        CheckedPageBuilder.checked += 1
+
+    def _start_new_elem(self, e: PageElement):
+        super()._start_new_elem(e)
+        self.check_status()
+
+    def _end_current_elem(self):
+        super()._end_current_elem()
+        self.check_status()
+
+
+NESTED_TEXT = """\
+ * item '''strong ''emphasis'' strong'''
+  1. nested ''emphasis '''strong''' ''
+   term:: desc with __underline --(strike ~-small-~ ~+big+~)--__
+    * deeper
+ second:: list
+||<rowspan="2">'''cell'''||''cell''||
+||`code`||[[Link|''link'']]||
+ * ''' unclosed strong
+   * ''mixed''' order''
+"""
+
+
+@pytest.fixture
+def checked_builder(monkeypatch: pytest.MonkeyPatch):
+    CheckedPageBuilder.checked = 0
+    monkeypatch.setattr(moin2x.page_builder, "PageBuilder", CheckedPageBuilder)
+
+
+@pytest.mark.usefixtures("checked_builder")
+def test_status_of_nested_elements():
+    page = MoinParser.parse(textwrap.dedent(NESTED_TEXT), "PageName")
+    assert CheckedPageBuilder.checked > 0
+    assert page.source_text == NESTED_TEXT
+
+
+@pytest.mark.usefixtures("checked_builder")
+def test_status_of_site_pages(moin_sitedir: MoinSitedirFixture):
+    for revision in glob.glob(os.path.join(moin_sitedir, "*", "revisions", "*")):
+        with open(revision, "r") as f:
+            MoinParser.parse(f.read(), "PageName")
+    assert CheckedPageBuilder.checked > 0
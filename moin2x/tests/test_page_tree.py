@@ -1,4 +1,15 @@
-from moin2x.page_tree import Link, PageRoot, Paragraph, Text
+import pytest
+
+from moin2x.page_tree import (
+    Link,
+    LinkAttr,
+    PageElement,
+    PageRoot,
+    Paragraph,
+    SourceBuffer,
+    SourceSpans,
+    Text,
+)
 
 
 def test_initialize_page_elements():
@@ -54,3 +65,95 @@ def test_content_hash():
     page3 = Paragraph()
     page3.add_child(Text(content="text modified"))
     assert page1.content_hash != page3.content_hash
+
+
+def test_structure_key():
+    page1 = Paragraph()
+    page1.add_child(Text(content="a", source_text="a"))
+    page1.add_child(Text(content="b", source_text="b"))
+    page2 = Paragraph()
+    page2.add_child(Text(content="a", source_text="a"))
+    page2.add_child(Text(content="b", source_text="b"))
+    assert page1.structure_key == page2.structure_key
+
+    # unlike content_hash, the order of children matters
+    page3 = Paragraph()
+    page3.add_child(Text(content="b", source_text="b"))
+    page3.add_child(Text(content="a", source_text="a"))
+    assert page1.content_hash == page3.content_hash
+    assert page1.structure_key != page3.structure_key
+
+    # source text also matters since it can be output as it is
+    assert Text(content="a", source_text="a").structure_key != Text(content="a").structure_key
+
+    link1 = Link(url="http://example.com", attrs=LinkAttr(title="1"))
+    link2 = Link(url="http://example.com", attrs=LinkAttr(title="2"))
+    assert link1.structure_key != link2.structure_key
+
+
+def test_source_text():
+    page = PageRoot()
+    p = Paragraph()
+    page.add_child(p)
+    p.add_child(Text(content="a", source_text="a"))
+    link = Link(url="b", source_text="[[b]]", source_frozen=True)
+    p.add_child(link)
+    link.add_child(Text(content="b", source_text="b"))
+    p.add_source_text("\n")
+    assert page.source_text == p.source_text == "a[[b]]\n"
+    assert link.source_text == "[[b]]"
+
+    # long source texts refer to the buffer shared in the tree instead of copies
+    long_text = "x" * PageElement.source_spans_threshold
+    p.add_child(Text(content=long_text, source_text=long_text))
+    assert isinstance(page._source, SourceSpans)  # type: ignore
+    assert isinstance(p._source, SourceSpans)  # type: ignore
+    assert p._source.buffer is page._source.buffer  # type: ignore
+    assert page.source_text == p.source_text == "a[[b]]\n" + long_text
+    assert page == PageRoot.from_dict(
+        {
+            "source_text": "a[[b]]\n" + long_text,
+            "children": [
+                (
+                    Paragraph,
+                    {
+                        "source_text": "a[[b]]\n" + long_text,
+                        "children": [
+                            (Text, {"content": "a", "source_text": "a"}),
+                            (
+                                Link,
+                                {
+                                    "url": "b",
+                                    "source_text": "[[b]]",
+                                    "source_frozen": True,
+                                    "children": [(Text, {"content": "b", "source_text": "b"})],
+                                },
+                            ),
+                            (Text, {"content": long_text, "source_text": long_text}),
+                        ],
+                    },
+                )
+            ],
+        }
+    )
+
+    # elements moved into another tree keep their source texts
+    other = PageRoot()
+    other.add_child(Text(content="c", source_text="c"))
+    other.add_child(p)
+    p.add_source_text("d")
+    assert other.source_text == "c" + "a[[b]]\n" + long_text + "d"
+    assert p.source_text == "a[[b]]\n" + long_text + "d"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 8192])
+def test_source_buffer(chunk_size: int, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(SourceBuffer, "chunk_size", chunk_size)
+    buffer = SourceBuffer()
+    assert buffer.append("ab") == 0
+    assert buffer.append("") == 2
+    assert buffer.append("cde") == 2
+    assert buffer.text(1, 4) == "bcd"
+    assert buffer.append("f") == 5
+    assert buffer.text(0, 6) == "abcdef"
+    assert buffer.text(3, 3) == ""
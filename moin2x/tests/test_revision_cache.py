@@ -0,0 +1,26 @@
+from moin2x.formatter.base import BlockCache
+from moin2x.revision_cache import RevisionCache
+
+
+def test_revision_cache():
+    converted: list[str] = []
+
+    def convert(content: str, block_cache: BlockCache) -> str:
+        converted.append(content)
+        block_cache[content] = content.upper()
+        return content.upper()
+
+    cache = RevisionCache(max_revisions=2)
+    assert cache.convert("A", "rev1", convert) == "REV1"
+    assert cache.convert("A", "rev2", convert) == "REV2"
+    # reverted revision
+    assert cache.convert("A", "rev1", convert) == "REV1"
+    # same content of other pages is converted for the page
+    assert cache.convert("B", "rev1", convert) == "REV1"
+    assert converted == ["rev1", "rev2", "rev1"]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    # least recently used revision ("A", "rev2") is evicted
+    cache.convert("A", "rev1", convert)
+    cache.convert("A", "rev2", convert)
+    assert converted == ["rev1", "rev2", "rev1", "rev2"]
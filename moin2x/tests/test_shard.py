@@ -0,0 +1,25 @@
+import pytest
+
+from moin2x.shard import Shard, shard_of
+
+
+def test_parse():
+    assert Shard.parse("2/4") == Shard(index=2, count=4)
+    assert Shard.parse(" 1 / 1 ") == Shard(index=1, count=1)
+    assert str(Shard.parse("2/4")) == "2/4"
+    for spec in ["", "2", "2/", "a/4", "0/4", "5/4", "1/0"]:
+        with pytest.raises(ValueError):
+            Shard.parse(spec)
+
+
+def test_shard_of():
+    # must be stable across processes, machines and python versions
+    assert shard_of("FrontPage", 3) == 3
+    assert shard_of("テスト", 3) == 2
+    assert shard_of("テスト/page_test/ページ", 2) == 1
+
+    pagenames = ["Page%d" % i for i in range(100)]
+    shards = [Shard(index=i, count=4) for i in range(1, 5)]
+    for pagename in pagenames:
+        assert len([shard for shard in shards if pagename in shard]) == 1
+    assert all(any(pagename in shard for pagename in pagenames) for shard in shards)
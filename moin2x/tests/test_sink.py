@@ -0,0 +1,232 @@
+import os
+import pickle
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from moin2x.sink import (
+    BufferSink,
+    DirectorySink,
+    NullSink,
+    TarSink,
+    TransferMode,
+    TransferStats,
+    ZipSink,
+    open_sink,
+    replay_ops,
+)
+from moin2x.source import open_source
+
+from .conftest import MoinSitedirFixture
+
+
+def read_archive(archive_path: str) -> dict[str, bytes]:
+    if archive_path.endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as f:
+            return dict([(name, f.read(name)) for name in f.namelist()])
+    with tarfile.open(archive_path) as f:
+        ret: dict[str, bytes] = {}
+        for tarinfo in f:
+            member = f.extractfile(tarinfo)
+            assert member is not None
+            ret[tarinfo.name] = member.read()
+        return ret
+
+
+@pytest.mark.parametrize(
+    ("dst", "expected"),
+    [
+        ("output", DirectorySink),
+        ("output.tar", TarSink),
+        ("output.tar.gz", TarSink),
+        ("output.tgz", TarSink),
+        ("output.zip", ZipSink),
+    ],
+)
+def test_open_sink(tmp_path: Path, dst: str, expected: type):
+    with open_sink(str(tmp_path / dst)) as sink:
+        assert isinstance(sink, expected)
+
+
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tar.xz", ".zip"])
+def test_archive_sink(moin_sitedir: MoinSitedirFixture, tmp_path: Path, suffix: str):
+    archive_path = str(tmp_path / ("output" + suffix))
+    source = open_source(moin_sitedir)
+    src_path = source.join("FrontPage", "revisions", "00000001")
+    with open_sink(archive_path) as sink:
+        sink.write_text("テスト/index.md", "テスト\n")
+        sink.copy_file(source, src_path, "FrontPage/00000001")
+        with pytest.raises(ValueError):
+            sink.write_text("../escaped.md", "")
+        stats = sink.pop_stats()
+        assert (stats.written_pages, stats.copied_files) == (1, 1)
+
+    with open(src_path, "rb") as f:
+        expected = {"テスト/index.md": "テスト\n".encode("utf-8"), "FrontPage/00000001": f.read()}
+    assert read_archive(archive_path) == expected
+    # attachments keep mtime of the source
+    mtime = int(os.stat(src_path).st_mtime)
+    if suffix == ".zip":
+        with zipfile.ZipFile(archive_path) as f:
+            date_time = f.getinfo("FrontPage/00000001").date_time
+        assert date_time == time.localtime(mtime)[:5] + (time.localtime(mtime)[5] // 2 * 2,)
+    else:
+        with tarfile.open(archive_path) as f:
+            assert f.getmember("FrontPage/00000001").mtime == mtime
+
+
+def test_zip_sink_large_file(
+    moin_sitedir: MoinSitedirFixture, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    # files over ZIP64_LIMIT need zip64 extensions
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 16)
+    archive_path = str(tmp_path / "output.zip")
+    source = open_source(moin_sitedir)
+    src_path = source.join("FrontPage", "revisions", "00000001")
+    with open_sink(archive_path) as sink:
+        sink.copy_file(source, src_path, "FrontPage/00000001")
+
+    with open(src_path, "rb") as f:
+        assert read_archive(archive_path) == {"FrontPage/00000001": f.read()}
+
+
+def test_archive_sink_in_other_process(tmp_path: Path):
+    with TarSink(str(tmp_path / "output.tar")) as sink:
+        restored = pickle.loads(pickle.dumps(sink))
+        with pytest.raises(RuntimeError):
+            restored.write_text("index.md", "")
+
+
+def test_buffer_sink(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    source = open_source(moin_sitedir)
+    buffer = BufferSink(str(tmp_path / "output"))
+    buffer.write_text("index.md", "content")
+    buffer.copy_file(source, source.join("FrontPage", "current"), "current")
+    ops = buffer.pop_ops()
+    assert buffer.pop_ops() == []
+
+    sink = DirectorySink(str(tmp_path / "output"))
+    replay_ops(ops, sink, source)
+    assert (tmp_path / "output" / "index.md").read_text() == "content"
+    assert (tmp_path / "output" / "current").read_text() == "00000002\n"
+
+
+def test_null_sink(moin_sitedir: MoinSitedirFixture):
+    source = open_source(moin_sitedir)
+    sink = NullSink()
+    sink.write_text("index.md", "テスト")
+    sink.copy_file(source, source.join("FrontPage", "current"), "current")
+    assert sink.files == 2
+    assert sink.bytes == len("テスト".encode("utf-8")) + len("00000002\n")
+    assert not os.path.exists("index.md")
+
+
+@pytest.mark.parametrize("transfer", ["copy", "hardlink", "reflink"])
+def test_directory_sink_transfer(tmp_path: Path, transfer: TransferMode):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "image.png").write_bytes(b"x" * 100)
+    source = open_source(str(src_dir))
+    src_path = source.join("image.png")
+
+    sink = DirectorySink(str(tmp_path / "output"), transfer=transfer)
+    sink.copy_file(source, src_path, "page/image.png")
+    dst_path = tmp_path / "output" / "page" / "image.png"
+    assert dst_path.read_bytes() == b"x" * 100
+    assert dst_path.stat().st_mtime_ns == os.stat(src_path).st_mtime_ns
+    if transfer == "hardlink":
+        assert dst_path.stat().st_ino == os.stat(src_path).st_ino
+    assert sink.pop_stats() == TransferStats(copied_files=1, copied_bytes=100)
+
+    sink.copy_file(source, src_path, "page/image.png")
+    assert sink.pop_stats() == TransferStats(skipped_files=1, skipped_bytes=100)
+
+    # replace the source, not to modify hardlinked output
+    (src_dir / "image.png.new").write_bytes(b"y" * 100)
+    os.replace(src_dir / "image.png.new", src_path)
+    os.utime(src_path, ns=(0, 1000**3))
+    sink.copy_file(source, src_path, "page/image.png")
+    assert dst_path.read_bytes() == b"y" * 100
+    assert sink.pop_stats() == TransferStats(copied_files=1, copied_bytes=100)
+
+
+def test_directory_sink_verify_hash(tmp_path: Path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "doc.pdf").write_bytes(b"x" * 10)
+    source = open_source(str(src_dir))
+    src_path = source.join("doc.pdf")
+    sink = DirectorySink(str(tmp_path / "output"), verify_hash=True)
+    sink.copy_file(source, src_path, "doc.pdf")
+
+    # same content with different mtime
+    os.utime(src_path, ns=(0, 1000**3))
+    sink.copy_file(source, src_path, "doc.pdf")
+    assert sink.stats.skipped_files == 1
+
+    # different content with the same size and mtime
+    (src_dir / "doc.pdf").write_bytes(b"y" * 10)
+    os.utime(src_path, ns=(0, 1000**3))
+    sink.copy_file(source, src_path, "doc.pdf")
+    assert (tmp_path / "output" / "doc.pdf").read_bytes() == b"y" * 10
+    assert sink.stats.copied_files == 2
+
+
+def test_directory_sink_hardlink_from_archive(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    archive_path = str(tmp_path / "pages.zip")
+    with zipfile.ZipFile(archive_path, "w") as f:
+        f.write(os.path.join(moin_sitedir, "FrontPage", "current"), "FrontPage/current")
+    with open_source(archive_path) as source:
+        sink = DirectorySink(str(tmp_path / "output"), transfer="hardlink")
+        sink.copy_file(source, source.join("FrontPage", "current"), "current")
+    assert (tmp_path / "output" / "current").read_text() == "00000002\n"
+
+
+def test_directory_sink_write_if_changed(tmp_path: Path):
+    sink = DirectorySink(str(tmp_path / "output"))
+    sink.write_text("a/index.md", "a")
+    filepath = tmp_path / "output" / "a" / "index.md"
+    os.utime(filepath, ns=(0, 1000**3))
+
+    sink.write_text("a/index.md", "a")
+    assert filepath.stat().st_mtime_ns == 1000**3
+    sink.write_text("a/index.md", "b")
+    assert filepath.read_text() == "b"
+    assert filepath.stat().st_mtime_ns != 1000**3
+    assert sink.pop_stats() == TransferStats(written_pages=2, unchanged_pages=1)
+
+    # unchanged pages are carried over from the baseline with their mtime
+    os.utime(filepath, ns=(0, 1000**3))
+    staging = sink.relocate(str(tmp_path / "staging"))
+    staging.write_text("a/index.md", "b")
+    staging.write_text("c/index.md", "c")
+    assert (tmp_path / "staging" / "a" / "index.md").stat().st_mtime_ns == 1000**3
+    assert (tmp_path / "staging" / "c" / "index.md").read_text() == "c"
+    assert staging.pop_stats() == TransferStats(written_pages=1, unchanged_pages=1)
+    assert pickle.loads(pickle.dumps(staging)).baseline_dir == str(tmp_path / "output")
+
+
+def test_directory_sink_carry_over_identical_files(tmp_path: Path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "image.png").write_bytes(b"x" * 100)
+    source = open_source(str(src_dir))
+    src_path = source.join("image.png")
+    sink = DirectorySink(str(tmp_path / "output"))
+    sink.copy_file(source, src_path, "page/image.png")
+
+    # identical files are carried over from the baseline instead of copied from the source
+    staging = sink.relocate(str(tmp_path / "staging"))
+    staging.copy_file(source, src_path, "page/image.png")
+    dst_path = tmp_path / "staging" / "page" / "image.png"
+    assert dst_path.read_bytes() == b"x" * 100
+    assert dst_path.stat().st_mtime_ns == os.stat(src_path).st_mtime_ns
+    assert staging.pop_stats() == TransferStats(skipped_files=1, skipped_bytes=100)
+
+    os.utime(src_path, ns=(0, 1000**3))
+    staging = sink.relocate(str(tmp_path / "staging2"))
+    staging.copy_file(source, src_path, "page/image.png")
+    assert staging.pop_stats() == TransferStats(copied_files=1, copied_bytes=100)
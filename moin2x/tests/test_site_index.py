@@ -0,0 +1,75 @@
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import attr
+
+from moin2x.moin_site_scanner import MoinSiteScanner
+from moin2x.site_index import MoinSiteIndex
+from moin2x.source import open_source
+
+from .conftest import MoinSitedirFixture
+
+
+def test_scan(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    assert list(site_index) == list(MoinSiteScanner(moin_sitedir).scan_pages())
+    assert len(site_index) == 4
+    assert "テスト/attachments_test" in site_index
+    assert "BadContent" not in site_index
+
+
+def test_get(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    page = site_index.get("テスト")
+    assert page is not None
+    assert page.name == "テスト"
+    assert site_index.get("NotExistingPage") is None
+
+
+def test_scan_with_patterns(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir, patterns=["テスト", "テスト/*"])
+    assert "FrontPage" not in site_index
+    assert site_index.pagenames == [
+        "テスト",
+        "テスト/attachments_test",
+        "テスト/page_test/ページ",
+    ]
+
+
+def test_pickle(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    restored = pickle.loads(pickle.dumps(site_index))
+    assert restored == site_index
+    assert restored.get("FrontPage") == site_index.get("FrontPage")
+
+
+def test_updated(moin_sitedir: MoinSitedirFixture):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    front_page = site_index.get("FrontPage")
+    assert front_page is not None
+    new_page = attr.evolve(front_page, name="テスト/New")
+    updated = site_index.updated({"テスト": None, "テスト/New": new_page})
+    assert updated.pagenames == [page.name for page in site_index if page.name != "テスト"] + [
+        "テスト/New"
+    ]
+    assert updated.get("テスト/New") == new_page
+    assert "テスト" in site_index
+
+
+def test_save_and_load(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    site_index = MoinSiteIndex.scan(moin_sitedir)
+    structure_file = str(tmp_path / "structure.json")
+    with open_source(moin_sitedir) as source:
+        site_index.save(structure_file, source)
+
+    # paths are resolved against another copy of the site
+    page_dir = str(tmp_path / "pages")
+    shutil.copytree(moin_sitedir, page_dir)
+    with open_source(page_dir) as source:
+        loaded = MoinSiteIndex.load(structure_file, source)
+    assert loaded == MoinSiteIndex.scan(page_dir)
+    page = loaded.get("テスト")
+    assert page is not None and page.filepath.startswith(page_dir + os.sep)
+    assert all(os.path.exists(attachment.filepath) for attachment in page.attachments)
@@ -0,0 +1,67 @@
+import os
+import shutil
+from pathlib import Path
+
+from moin2x.moin_site_scanner import MoinSiteScanner
+from moin2x.site_index import MoinSiteIndex
+from moin2x.site_index_db import MoinSiteIndexDB
+
+from .conftest import MoinSitedirFixture
+
+
+def test_refresh_and_scan_pages(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    index_file = str(tmp_path / "index.db")
+    with MoinSiteIndexDB(index_file, moin_sitedir) as index_db:
+        assert index_db.refresh() == 4
+        pages = list(index_db.scan_pages())
+    assert pages == list(MoinSiteScanner(moin_sitedir).scan_pages())
+
+    with MoinSiteIndexDB(index_file, moin_sitedir) as index_db:
+        assert index_db.refresh() == 0
+        assert list(index_db.scan_pages()) == pages
+        assert index_db.revision_sizes()["FrontPage"].keys() == {"00000001", "00000002"}
+        assert index_db.attachment_stats()["テスト"]["file_example_JPG_100kB.jpg"][0] > 0
+
+
+def test_refresh_changed_pages(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    page_dir = str(tmp_path / "pages")
+    shutil.copytree(moin_sitedir, page_dir)
+    index_file = str(tmp_path / "index.db")
+    with MoinSiteIndexDB(index_file, page_dir, workers=2) as index_db:
+        index_db.refresh()
+
+        edit_log = os.path.join(page_dir, "FrontPage", "edit-log")
+        with open(edit_log, "a") as f:
+            f.write("1558498600000000\t00000002\tSAVE\tFrontPage\t192.0.2.1\t192.0.2.1\t\t\t\n")
+        st = os.stat(edit_log)
+        os.utime(edit_log, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        shutil.rmtree(os.path.join(page_dir, "(e38386e382b9e383882f)attachments_test"))
+
+        assert index_db.refresh() == 1
+        pages = dict([(page.name, page) for page in index_db.scan_pages()])
+    assert "テスト/attachments_test" not in pages
+    last_edit = pages["FrontPage"].last_edit
+    assert last_edit is not None
+    assert last_edit.author_id is None
+    assert list(pages.values()) == list(MoinSiteScanner(page_dir).scan_pages())
+
+
+def test_refresh_with_patterns(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    index_file = str(tmp_path / "index.db")
+    with MoinSiteIndexDB(index_file, moin_sitedir) as index_db:
+        assert index_db.refresh() == 4
+        assert index_db.refresh(["テスト/*"]) == 0
+        pages = list(index_db.scan_pages(["テスト/*"]))
+        assert [page.name for page in pages] == [
+            "テスト/attachments_test",
+            "テスト/page_test/ページ",
+        ]
+        # entries not matching patterns are kept
+        assert len(list(index_db.scan_pages())) == 4
+
+
+def test_site_index_with_index_file(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    index_file = str(tmp_path / "index.db")
+    site_index = MoinSiteIndex.scan(moin_sitedir, index_file=index_file)
+    assert site_index == MoinSiteIndex.scan(moin_sitedir)
+    assert os.path.exists(index_file)
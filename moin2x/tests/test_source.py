@@ -0,0 +1,82 @@
+import os
+import pickle
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Callable, TypeAlias
+
+import attr
+import pytest
+
+from moin2x.moin_site_scanner import MoinSiteScanner
+from moin2x.source import DirectorySource, TarSource, ZipSource, open_source
+
+from .conftest import MoinSitedirFixture
+
+ArchiveFactory: TypeAlias = Callable[[str], str]
+
+
+@pytest.fixture(params=["tar", "tar.gz", "tar.xz", "zip"])
+def moin_archive(request: pytest.FixtureRequest, tmp_path: Path) -> ArchiveFactory:
+    def archive(page_dir: str) -> str:
+        archive_path = str(tmp_path / ("pages." + request.param))
+        if request.param == "zip":
+            with zipfile.ZipFile(archive_path, "w") as f:
+                for dirpath, _dirnames, filenames in os.walk(page_dir):
+                    for filename in filenames:
+                        filepath = os.path.join(dirpath, filename)
+                        arcname = os.path.join("data/pages", os.path.relpath(filepath, page_dir))
+                        f.write(filepath, arcname)
+        else:
+            mode = "w:" + request.param.removeprefix("tar").lstrip(".")
+            with tarfile.open(archive_path, mode) as f:  # type: ignore
+                f.add(page_dir, arcname="./data/pages")
+        return archive_path
+
+    return archive
+
+
+def test_open_source(moin_sitedir: MoinSitedirFixture, tmp_path: Path):
+    assert isinstance(open_source(moin_sitedir), DirectorySource)
+    not_archive = tmp_path / "pages.txt"
+    not_archive.write_text("FrontPage")
+    with pytest.raises(ValueError):
+        open_source(str(not_archive))
+
+
+def test_scan_archive(moin_sitedir: MoinSitedirFixture, moin_archive: ArchiveFactory):
+    archive_path = moin_archive(moin_sitedir)
+    expected = list(MoinSiteScanner(moin_sitedir).scan_pages())
+
+    def in_archive(filepath: str) -> str:
+        return os.path.join(archive_path, os.path.relpath(filepath, moin_sitedir))
+
+    with open_source(archive_path) as source:
+        assert isinstance(source, (TarSource, ZipSource))
+        pages = list(MoinSiteScanner(source, workers=2).scan_pages())
+        assert [p.name for p in pages] == [p.name for p in expected]
+        for page, expected_page in zip(pages, expected):
+            assert page.filepath == in_archive(expected_page.filepath)
+            assert page.last_edit == expected_page.last_edit
+            assert page.attachments == set(
+                [
+                    attr.evolve(a, filepath=in_archive(a.filepath))
+                    for a in expected_page.attachments
+                ]
+            )
+            with open(expected_page.filepath, "r") as f:
+                assert source.read_text(page.filepath) == f.read()
+
+
+def test_archive_source_pickle(moin_sitedir: MoinSitedirFixture, moin_archive: ArchiveFactory):
+    archive_path = moin_archive(moin_sitedir)
+    with open_source(archive_path) as source:
+        filepath = source.join("FrontPage", "current")
+        assert source.read_text(filepath) == "00000002\n"
+        restored = pickle.loads(pickle.dumps(source))
+        assert restored.read_text(filepath) == "00000002\n"
+        assert restored.isdir(source.join("FrontPage", "revisions"))
+        assert not restored.isfile(source.join("FrontPage", "revisions"))
+        with pytest.raises(FileNotFoundError):
+            restored.open(source.join("NotExistingPage", "current"))
+        restored.close()
@@ -0,0 +1,68 @@
+import os
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from moin2x import staging
+from moin2x.staging import (
+    CLEANUP_THREAD_NAME,
+    create_staging_dir,
+    leftover_dirs,
+    remove_in_background,
+    swap_into_place,
+)
+
+
+def join_cleanup_threads():
+    for thread in threading.enumerate():
+        if thread.name == CLEANUP_THREAD_NAME:
+            thread.join()
+
+
+@pytest.mark.parametrize("exchange", [True, False])
+def test_swap_into_place(tmp_path: Path, exchange: bool):
+    dst_dir = tmp_path / "content"
+    dst_dir.mkdir()
+    (dst_dir / "old.md").write_text("old")
+
+    staging_dir = create_staging_dir(str(dst_dir))
+    assert os.path.dirname(staging_dir) == str(tmp_path)
+    assert leftover_dirs(str(dst_dir)) == [staging_dir]
+    Path(staging_dir, "new.md").write_text("new")
+
+    if exchange:
+        old_dir = swap_into_place(staging_dir, str(dst_dir))
+    else:
+        with patch.object(staging, "_exchange", return_value=False):
+            old_dir = swap_into_place(staging_dir, str(dst_dir))
+    assert os.listdir(dst_dir) == ["new.md"]
+    assert old_dir is not None
+    assert leftover_dirs(str(dst_dir)) == [old_dir]
+
+    remove_in_background([old_dir])
+    join_cleanup_threads()
+    assert sorted(os.listdir(tmp_path)) == ["content"]
+
+
+def test_swap_into_missing_dst(tmp_path: Path):
+    dst_dir = str(tmp_path / "content")
+    staging_dir = create_staging_dir(dst_dir)
+    assert swap_into_place(staging_dir, dst_dir) is None
+    assert os.path.isdir(dst_dir)
+    assert leftover_dirs(dst_dir) == []
+    assert remove_in_background([]) is None
+
+
+@pytest.mark.parametrize("umask", [0o022, 0o077])
+def test_staging_dir_mode(tmp_path: Path, umask: int):
+    old_umask = os.umask(umask)
+    try:
+        os.makedirs(tmp_path / "plain")
+        dst_dir = str(tmp_path / "content")
+        staging_dir = create_staging_dir(dst_dir)
+        swap_into_place(staging_dir, dst_dir)
+    finally:
+        os.umask(old_umask)
+    assert os.stat(dst_dir).st_mode == os.stat(tmp_path / "plain").st_mode
@@ -1,8 +1,10 @@
+import hashlib
+import io
 from typing import Tuple
 
 import pytest
 
-from moin2x.utils import safe_path_join
+from moin2x.utils import file_sha256, safe_path_join
 
 
 @pytest.mark.parametrize(
@@ -33,3 +35,9 @@ def test_safe_path_join(data: Tuple[str, str], expected: str):
 def test_safe_path_join_error(basepath: str, path: str):
     with pytest.raises(ValueError):
         safe_path_join(basepath, path)
+
+
+@pytest.mark.parametrize("size", [0, 3, 4, 10])
+def test_file_sha256(size: int):
+    data = bytes(range(size))
+    assert file_sha256(io.BytesIO(data), chunk_size=4) == hashlib.sha256(data).digest()
@@ -0,0 +1,50 @@
+import os
+import shutil
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from moin2x.moinutils import quoteWikinameFS
+from moin2x.watcher import InotifyWatcher, PollingWatcher, SiteWatcher
+
+from .conftest import MoinSitedirFixture
+
+
+def polling_watcher(page_dir: str) -> SiteWatcher:
+    return PollingWatcher(page_dir, interval=0.01, settle=0.05)
+
+
+def inotify_watcher(page_dir: str) -> SiteWatcher:
+    if not InotifyWatcher.available():
+        pytest.skip("inotify is not available")
+    return InotifyWatcher(page_dir, settle=0.05)
+
+
+@pytest.mark.parametrize("open_watcher", [polling_watcher, inotify_watcher])
+def test_watcher(
+    moin_sitedir: MoinSitedirFixture, tmp_path: Path, open_watcher: Callable[[str], SiteWatcher]
+):
+    page_dir = str(tmp_path / "pages")
+    shutil.copytree(moin_sitedir, page_dir)
+    front_page = os.path.join(page_dir, "FrontPage")
+    test_page = os.path.join(page_dir, quoteWikinameFS("テスト"))
+
+    with open_watcher(page_dir) as watcher:
+        changes = watcher.changes()
+
+        with open(os.path.join(front_page, "current"), "w") as f:
+            f.write("00000001\n")
+        with open(os.path.join(test_page, "attachments", "new.txt"), "w") as f:
+            f.write("new")
+        assert next(changes) == set(["FrontPage", quoteWikinameFS("テスト")])
+
+        # new page, and files not affecting conversion
+        new_page = os.path.join(page_dir, quoteWikinameFS("テスト/New"))
+        shutil.copytree(front_page, new_page)
+        with open(os.path.join(front_page, "revisions", "00000003"), "w") as f:
+            f.write("draft")
+        assert next(changes) == set([quoteWikinameFS("テスト/New")])
+
+        shutil.rmtree(new_page)
+        assert next(changes) == set([quoteWikinameFS("テスト/New")])
@@ -1,8 +1,9 @@
+import hashlib
 import inspect
 import logging
 import os.path
 import sys
-from typing import Optional
+from typing import IO, Optional
 
 
 def safe_path_join(basepath: str, path: str):
@@ -16,6 +17,14 @@ def safe_path_join(basepath: str, path: str):
     return joined
 
 
+def file_sha256(f: IO[bytes], chunk_size: int = 1024 * 1024) -> bytes:
+    """Return SHA-256 digest of the file object, read in chunks."""
+    h = hashlib.sha256()
+    while chunk := f.read(chunk_size):
+        h.update(chunk)
+    return h.digest()
+
+
 class LogLevelFilter(logging.Filter):
     def __init__(self, min_level: Optional[int] = None, max_level: Optional[int] = None):
         self.min_level = min_level
@@ -0,0 +1,247 @@
+import ctypes
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABCMeta, abstractmethod
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# files and directory in page directory which affect conversion
+WATCHED_NAMES = ("current", "edit-log", "attachments")
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+_DIR_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+_FILE_EVENTS = _DIR_EVENTS | IN_CLOSE_WRITE | IN_MODIFY | IN_ATTRIB
+
+
+class SiteWatcher(metaclass=ABCMeta):
+    """Watch MoinMoin pages directory and tell entrynames of changed pages.
+
+    Changes are collected until no more change comes within `settle` seconds, so that
+    files written together (e.g. revision, current and edit-log) make one batch.
+    """
+
+    def __init__(self, page_dir: str, settle: float = 0.5):
+        self.page_dir = page_dir
+        self.settle = settle
+
+    @abstractmethod
+    def _wait(self, timeout: Optional[float]) -> set[str]:
+        """Wait for changes and return changed entrynames (empty if timed out)."""
+        pass
+
+    def changes(self) -> Iterator[set[str]]:
+        while True:
+            entrynames = self._wait(None)
+            while True:
+                more = self._wait(self.settle)
+                if not more:
+                    break
+                entrynames |= more
+            if entrynames:
+                yield entrynames
+
+    def _entrynames(self) -> set[str]:
+        return set([entry.name for entry in os.scandir(self.page_dir) if entry.is_dir()])
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> "SiteWatcher":
+        return self
+
+    def __exit__(self, *args: object):
+        self.close()
+
+
+PageSignature = Tuple[Tuple[str, int, int], ...]  # (name, size, mtime_ns) of watched files
+
+
+class PollingWatcher(SiteWatcher):
+    """Detect changes by comparing size and mtime of watched files every `interval` seconds."""
+
+    def __init__(self, page_dir: str, interval: float = 2.0, settle: float = 0.5):
+        super().__init__(page_dir, settle=settle)
+        self.interval = interval
+        self._snapshot = self._take_snapshot()
+
+    def _page_signature(self, entryname: str) -> PageSignature:
+        signature: list[Tuple[str, int, int]] = []
+        page_path = os.path.join(self.page_dir, entryname)
+        for name in WATCHED_NAMES[:2]:
+            try:
+                st = os.stat(os.path.join(page_path, name))
+            except FileNotFoundError:
+                continue
+            signature.append((name, st.st_size, st.st_mtime_ns))
+        try:
+            with os.scandir(os.path.join(page_path, "attachments")) as it:
+                for entry in it:
+                    st = entry.stat()
+                    signature.append(("attachments/" + entry.name, st.st_size, st.st_mtime_ns))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return tuple(sorted(signature))
+
+    def _take_snapshot(self) -> dict[str, PageSignature]:
+        return dict(
+            [(entryname, self._page_signature(entryname)) for entryname in self._entrynames()]
+        )
+
+    def _wait(self, timeout: Optional[float]) -> set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sleep = self.interval
+            if deadline is not None:
+                sleep = min(sleep, max(deadline - time.monotonic(), 0))
+            time.sleep(sleep)
+            snapshot = self._take_snapshot()
+            changed = set(
+                [
+                    entryname
+                    for entryname in set(snapshot) | set(self._snapshot)
+                    if snapshot.get(entryname) != self._snapshot.get(entryname)
+                ]
+            )
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+
+def _libc_inotify() -> Optional[ctypes.CDLL]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class InotifyWatcher(SiteWatcher):
+    """Detect changes by inotify(7) watches on pages, page and attachments directories."""
+
+    def __init__(self, page_dir: str, settle: float = 0.5):
+        super().__init__(page_dir, settle=settle)
+        libc = _libc_inotify()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # wd -> entryname (None for pages directory), and whether it's attachments directory
+        self._watches: dict[int, Tuple[Optional[str], bool]] = {}
+        self._add_watch(page_dir, None, False, _DIR_EVENTS)
+        for entryname in self._entrynames():
+            self._watch_page(entryname)
+
+    @classmethod
+    def available(cls) -> bool:
+        return _libc_inotify() is not None
+
+    def _add_watch(self, path: str, entryname: Optional[str], attachments: bool, mask: int):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # removed in the meantime
+            raise OSError(err, os.strerror(err), path)
+        self._watches[wd] = (entryname, attachments)
+
+    def _watch_page(self, entryname: str):
+        page_path = os.path.join(self.page_dir, entryname)
+        self._add_watch(page_path, entryname, False, _FILE_EVENTS)
+        attachments_path = os.path.join(page_path, "attachments")
+        if os.path.isdir(attachments_path):
+            self._add_watch(attachments_path, entryname, True, _FILE_EVENTS)
+
+    def _read_events(self) -> set[str]:
+        data = os.read(self._fd, 64 * 1024)
+        changed: set[str] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify event queue overflowed: check all pages")
+                changed.update(self._entrynames())
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            watch = self._watches.get(wd)
+            if watch is None:
+                continue
+            entryname, attachments = watch
+            if entryname is None:
+                # page directory is created, removed or renamed
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._watch_page(name)
+                    changed.add(name)
+            elif attachments:
+                changed.add(entryname)
+            elif name in WATCHED_NAMES:
+                if name == "attachments" and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_watch(
+                        os.path.join(self.page_dir, entryname, name), entryname, True, _FILE_EVENTS
+                    )
+                changed.add(entryname)
+        return changed
+
+    def _wait(self, timeout: Optional[float]) -> set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                return set()
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_watcher(page_dir: str, interval: float = 2.0, settle: float = 0.5) -> SiteWatcher:
+    """Watch pages directory by inotify where available, or by polling otherwise."""
+    if InotifyWatcher.available():
+        try:
+            watcher: SiteWatcher = InotifyWatcher(page_dir, settle=settle)
+            logger.info("+ Watch Moin Site (inotify): %s" % page_dir)
+            return watcher
+        except OSError as e:
+            logger.warning("fail to watch by inotify (%s): fall back to polling" % e)
+    logger.info("+ Watch Moin Site (polling every %s sec): %s" % (interval, page_dir))
+    return PollingWatcher(page_dir, interval=interval, settle=settle)